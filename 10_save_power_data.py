@@ -1,18 +1,17 @@
 
-import pandas as pd
+import storage
 
 # This assumes you already standardized timezone and index
-power_df = pd.read_csv("data/processed/copenhagen_power.csv", index_col=0, parse_dates=True)
+power_df = storage.read_frame("power", "copenhagen")
 
 # If needed, standardize timezone again just to be sure
 if power_df.index.tz is None:
     power_df.index = power_df.index.tz_localize("Europe/Brussels").tz_convert("UTC")
-power_df.index = power_df.index.tz_localize(None)
+power_df.index = power_df.index.tz_convert("UTC").tz_localize(None)
 
-# Save to final processed CSV
-final_path = "data/processed/copenhagen_power.csv"
-power_df.to_csv(final_path, index=True)
+# Save to final processed dataset
+storage.write_frame("power", "copenhagen", power_df, mode="overwrite")
 
-print(f" Power data saved to: {final_path}")
+print(" Power data saved to: power/copenhagen")
 print(" Final preview:")
 print(power_df.head(3))
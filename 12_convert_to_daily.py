@@ -1,18 +1,16 @@
 
-import pandas as pd
+import storage
+from config import RESOLUTION
+from etl_pipeline import resample_frame
 
 # Load your existing hourly power data
-power_df = pd.read_csv("data/processed/stockholm_power.csv", parse_dates=["Unnamed: 0"])
-power_df.set_index("Unnamed: 0", inplace=True)
-power_df.index.name = "datetime"
+power_df = storage.read_frame("power", "stockholm")
 
-# Resample to daily averages
-daily_power_df = power_df.resample("D").mean()
+# Keep only relevant columns (drop hour/day_of_week/etc.) and resample to the
+# native resolution (daily by default) by the per-column rules in config.RESAMPLE_RULES
+daily_power_df = resample_frame(power_df[["Actual Load", "Price"]], RESOLUTION)
 
-# Keep only relevant columns (drop hour/day_of_week/etc.)
-daily_power_df = daily_power_df[["Actual Load", "Price"]]
+# Save to the same dataset, overwriting it
+storage.write_frame("power", "stockholm", daily_power_df, mode="overwrite")
 
-# Save to the same file, overwriting it
-daily_power_df.to_csv("data/processed/stockholm_power.csv")
-
-print(" Overwritten with daily-averaged power data")
+print(f" Overwritten with {RESOLUTION}-resampled power data")
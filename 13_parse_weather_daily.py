@@ -1,11 +1,8 @@
 
-import pandas as pd
+import storage
 
-# Load daily weather file
-weather_df = pd.read_csv("data/weather/stockholm_current_new.csv", parse_dates=["datetime"])
-
-# Set datetime index
-weather_df.set_index("datetime", inplace=True)
+# Load daily weather, projecting only the needed columns
+weather_df = storage.read_frame("weather", "stockholm", columns=["temp", "humidity"])
 weather_df.index.name = "date"
 
 # Rename and select only needed columns
@@ -1,13 +1,14 @@
 
 import pandas as pd
 
+import storage
+from impute import impute, summary
+
 # Load daily power data
-power_df = pd.read_csv("data/processed/copenhagen_power.csv", parse_dates=["datetime"])
-power_df.set_index("datetime", inplace=True)
+power_df = storage.read_frame("power", "copenhagen")
 
 # Load and prepare full weather data
-weather_df = pd.read_csv("data/weather/copenhagen_current_new.csv", parse_dates=["datetime"])
-weather_df.set_index("datetime", inplace=True)
+weather_df = storage.read_frame("weather", "copenhagen")
 
 # Convert temperature and keep all fields
 weather_df["temp_C"] = weather_df["temp"]
@@ -23,7 +24,14 @@ weather_utc_df.index = pd.to_datetime(weather_utc_df.index, utc=True)
 weather_utc_df.index = weather_utc_df.index.tz_convert(None)
 
 # === Step 2: Merge on date ===
-full_df = power_utc_df.join(weather_utc_df, how="inner")
+# Left join: days without weather are kept and filled below instead of dropped
+full_df = power_utc_df.join(weather_utc_df, how="left")
+full_df = full_df[full_df.index >= weather_utc_df.index.min()]
+full_df = full_df[full_df.index <= weather_utc_df.index.max()]
+
+# === Step 2b: Gap filling (see impute.py) ===
+full_df = impute(full_df)
+print(" Imputed:", summary(full_df))
 
 # === Step 3: Validation ===
 print("Columns:", full_df.columns.tolist())
@@ -32,5 +40,5 @@ print(" Date Range:", full_df.index.min(), "→", full_df.index.max())
 print(" Missing values:\n", full_df.isnull().sum())
 
 # === Step 4: Save merged dataset ===
-full_df.to_csv("data/processed/copenhagen_power_with_weather.csv")
-print(" Saved to data/processed/copenhagen_power_with_weather.csv")
+storage.write_frame("processed", "copenhagen", full_df, mode="overwrite")
+print(" Saved to processed/copenhagen")
@@ -1,24 +1,22 @@
-import pandas as pd
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import os
 
+import storage
+
 cities = ["oslo", "stockholm", "copenhagen"]
-data_path = "data/processed"
 plot_path = "plots"
 os.makedirs(plot_path, exist_ok=True)
 
 for city in cities:
     print(f"\nChecking: {city.capitalize()}")
 
-    file_path = os.path.join(data_path, f"{city}_power_with_weather.csv")
-    if not os.path.exists(file_path):
-        print(f"File not found: {file_path}")
+    if not storage.exists("processed", city):
+        print(f"No stored data: processed/{city}")
         continue
 
-    df = pd.read_csv(file_path, parse_dates=["datetime"])
-    df.set_index("datetime", inplace=True)
+    df = storage.read_frame("processed", city)
 
     # Plot the first 48 hours and save to file
     df[['Actual Load', 'Price']].iloc[:48].plot(subplots=True, title=f"{city.capitalize()} - First 2 Days Sample")
@@ -1,23 +1,20 @@
-import pandas as pd
 import matplotlib
 matplotlib.use('Agg')  # No GUI backend
 import matplotlib.pyplot as plt
-import os
 import numpy as np
 
+import storage
+
 cities = ["oslo", "stockholm", "copenhagen"]
-base_path = "data/processed"
 
 for city in cities:
     print(f"\n=== {city.capitalize()} ===")
 
-    file_path = os.path.join(base_path, f"{city}_power_with_weather.csv")
-    if not os.path.exists(file_path):
-        print(f" File not found: {file_path}")
+    if not storage.exists("processed", city):
+        print(f" No stored data: processed/{city}")
         continue
 
-    df = pd.read_csv(file_path, parse_dates=["datetime"])
-    df.set_index("datetime", inplace=True)
+    df = storage.read_frame("processed", city)
 
     # --- Feature Engineering ---
     df['day_of_week'] = df.index.dayofweek
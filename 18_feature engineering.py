@@ -1,52 +1,29 @@
-import pandas as pd
-import os
+import storage
+from config import FORECAST_HORIZON
+from direct import horizon_targets
+from feature_store import feature_chunks
 
-# Define cities and paths
-cities = {
-    "stockholm": "data/processed/stockholm_power_with_weather.csv",
-    "oslo": "data/processed/oslo_power_with_weather.csv",
-    "copenhagen": "data/processed/copenhagen_power_with_weather.csv"
-}
+# Define cities (zones in the "processed" dataset)
+cities = ["stockholm", "oslo", "copenhagen"]
 
-# Output directory
-output_dir = "data/features"
-os.makedirs(output_dir, exist_ok=True)
-
-for city, path in cities.items():
+for city in cities:
     print(f"\nProcessing: {city.title()}")
-
-    # Load merged daily data
-    df = pd.read_csv(path, parse_dates=["datetime"])
-    df.set_index("datetime", inplace=True)
-
-    # === LAG FEATURES ===
-    df["demand_lag1"] = df["Actual Load"].shift(1)
-    df["price_lag1"] = df["Price"].shift(1)
-    df["demand_lag7"] = df["Actual Load"].shift(7)
-    df["price_lag7"] = df["Price"].shift(7)
-
-    # === ROLLING FEATURES ===
-    df["demand_roll7"] = df["Actual Load"].rolling(window=7).mean().shift(1)
-    df["price_roll7"] = df["Price"].rolling(window=7).mean().shift(1)
-    df["temp_roll7"] = df["temp_C"].rolling(window=7).mean().shift(1)
-
-    # === DIFFERENCES FROM PREVIOUS DAY/WEEK ===
-    df["demand_diff1"] = df["Actual Load"] - df["demand_lag1"]
-    df["demand_diff7"] = df["Actual Load"] - df["demand_lag7"]
-    df["price_diff1"] = df["Price"] - df["price_lag1"]
-    df["price_diff7"] = df["Price"] - df["price_lag7"]
-
-    # === TARGETS FOR PREDICTION (T+1) ===
-    df["demand_next"] = df["Actual Load"].shift(-1)
-    df["price_next"] = df["Price"].shift(-1)
-
-    # === DROP ROWS WITH ANY NaNs FROM LAGS/ROLLS/TARGETS ===
-    df.dropna(inplace=True)
-
-    # === Save ===
-    out_path = os.path.join(output_dir, f"{city}_features.csv")
-    df.to_csv(out_path)
-    print(f"Saved engineered features to: {out_path}")
-    print(f"Final shape: {df.shape}")
+    storage.delete("features", city)
+    storage.delete("direct_targets", city)
+    n_rows = 0
+
+    # Processed data at the native resolution (config.RESOLUTION), a few months at
+    # a time plus the months before (lags) and after (targets) each chunk
+    for raw, df in feature_chunks(city, after=1 + FORECAST_HORIZON // 28):
+        # === DIRECT MULTI-HORIZON TARGETS (T+1 .. T+H days) ===
+        # Kept in their own table: rows near the end have no h-day target yet
+        direct = horizon_targets(raw)
+
+        # === Save ===
+        storage.write_frame("features", city, df)
+        storage.write_frame("direct_targets", city, direct.loc[df.index])
+        n_rows += len(df)
+    print(f"Saved engineered features to: features/{city}")
+    print(f"Final shape: {(n_rows, len(df.columns))}")
 
 print("\nAll cities processed.")
@@ -1,33 +1,36 @@
-import os
 import pandas as pd
 import numpy as np
-import pickle
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 
+import storage
+from forecaster import load_ensemble
+from parallel import run_jobs
+
 # Configuration
-FEATURE_DIR = "data/features"
 MODEL_DIR = "models"
 CITIES = ["oslo", "stockholm", "copenhagen"]
 TEST_HOURS_DEFAULT = 24 * 30  # 30 days
 
-# Store results
-price_results = []
-demand_results = []
+# Target name -> (label column, current-value column)
+TARGETS = {
+    "price": ("price_next", "Price"),
+    "demand": ("demand_next", "Actual Load"),
+}
 
 def evaluate(y_true, y_pred):
     mae = mean_absolute_error(y_true, y_pred)
     rmse = np.sqrt(mean_squared_error(y_true, y_pred))
     return mae, rmse
 
-for city in CITIES:
-    print(f"\n=== Evaluating: {city.title()} ===")
+def evaluate_city_target(city, name):
+    # One (city, target) evaluation; runs in a worker process
+    print(f"\n=== Evaluating {name}: {city.title()} ===")
 
-    path = os.path.join(FEATURE_DIR, f"{city}_features.csv")
-    df = pd.read_csv(path, parse_dates=["datetime"], index_col="datetime")
+    df = storage.read_frame("features", city)
 
     if len(df) < 10:
         print(f"Not enough data for {city.title()} (only {len(df)} rows). Skipping.")
-        continue
+        return []
 
     # Train/test split
     test_size = TEST_HOURS_DEFAULT if len(df) > TEST_HOURS_DEFAULT + 10 else int(len(df) * 0.2)
@@ -37,83 +40,64 @@ for city in CITIES:
     feature_cols = [col for col in df.columns if col not in ['demand_next', 'price_next', 'name', 'description']]
     X_test = test[feature_cols]
 
-    # ---- PRICE ----
-    y_test_price = test['price_next']
-    last_price = train['Price'].iloc[-1]
-    naive_price = np.full(shape=y_test_price.shape, fill_value=last_price)
+    target, current = TARGETS[name]
+    y_test = test[target]
+    last_value = train[current].iloc[-1]
+    naive = np.full(shape=y_test.shape, fill_value=last_value)
 
     try:
-        ridge_p = pickle.load(open(f"{MODEL_DIR}/ridge_price_{city}.pkl", 'rb'))
-        rf_p = pickle.load(open(f"{MODEL_DIR}/rf_price_{city}.pkl", 'rb'))
-        xgb_p = pickle.load(open(f"{MODEL_DIR}/xgb_price_{city}.pkl", 'rb'))
+        ensemble = load_ensemble(city, MODEL_DIR, targets=[target])
     except FileNotFoundError:
-        print(f"Missing price models for {city.title()}. Skipping price evaluation.")
-        continue
-
-    ridge_p_pred = ridge_p.predict(X_test)
-    rf_p_pred = rf_p.predict(X_test)
-    xgb_p_pred = xgb_p.predict(X_test)  # Check explicitly
-    ensemble_p = 0.2 * ridge_p_pred + 0.3 * rf_p_pred + 0.5 * xgb_p_pred
-
-    for name, preds in zip(
+        print(f"Missing {name} models for {city.title()}. Skipping {name} evaluation.")
+        return []
+
+    # One batched call; members and the blend come from the same ensemble object
+    member_preds = ensemble.predict_members(X_test)
+    ridge_pred = member_preds[target]["ridge"]
+    rf_pred = member_preds[target]["rf"]
+    xgb_pred = member_preds[target]["xgb"]
+    ensemble_pred = ensemble.blend(member_preds)[target]
+
+    rows = []
+    for model_name, preds in zip(
         ["Naive", "Ridge", "Random Forest", "XGBoost", "Ensemble"],
-        [naive_price, ridge_p_pred, rf_p_pred, xgb_p_pred, ensemble_p]
+        [naive, ridge_pred, rf_pred, xgb_pred, ensemble_pred]
     ):
-        mae, rmse = evaluate(y_test_price, preds)
-        price_results.append({
+        mae, rmse = evaluate(y_test, preds)
+        rows.append({
             "City": city.title(),
-            "Model": name,
+            "Model": model_name,
             "MAE": round(mae, 2),
             "RMSE": round(rmse, 2)
         })
+    return rows
 
-    # ---- DEMAND ----
-    y_test_demand = test['demand_next']
-    last_demand = train['Actual Load'].iloc[-1]
-    naive_demand = np.full(shape=y_test_demand.shape, fill_value=last_demand)
-
-    try:
-        ridge_d = pickle.load(open(f"{MODEL_DIR}/ridge_demand_{city}.pkl", 'rb'))
-        rf_d = pickle.load(open(f"{MODEL_DIR}/rf_demand_{city}.pkl", 'rb'))
-        xgb_d = pickle.load(open(f"{MODEL_DIR}/xgb_demand_{city}.pkl", 'rb'))
-    except FileNotFoundError:
-        print(f"Missing demand models for {city.title()}. Skipping demand evaluation.")
-        continue
 
-    ridge_d_pred = ridge_d.predict(X_test)
-    rf_d_pred = rf_d.predict(X_test)
-    xgb_d_pred = xgb_d.predict(X_test)  # Check explicitly
-    ensemble_d = 0.2 * ridge_d_pred + 0.3 * rf_d_pred + 0.5 * xgb_d_pred
+if __name__ == "__main__":
+    jobs = [((city, name), (city, name)) for city in CITIES for name in TARGETS]
+    results = run_jobs(evaluate_city_target, jobs)
 
-    for name, preds in zip(
-        ["Naive", "Ridge", "Random Forest", "XGBoost", "Ensemble"],
-        [naive_demand, ridge_d_pred, rf_d_pred, xgb_d_pred, ensemble_d]
-    ):
-        mae, rmse = evaluate(y_test_demand, preds)
-        demand_results.append({
-            "City": city.title(),
-            "Model": name,
-            "MAE": round(mae, 2),
-            "RMSE": round(rmse, 2)
-        })
+    # Merge in job order so the tables are identical from run to run
+    price_results = [row for (city, name), rows in results.items() if name == "price" for row in rows]
+    demand_results = [row for (city, name), rows in results.items() if name == "demand" for row in rows]
 
-# ---- Print Summary Tables ----
+    # ---- Print Summary Tables ----
 
-if price_results:
-    df_p = pd.DataFrame(price_results)
-    print("\n=== PRICE MAE Comparison ===")
-    print(df_p.pivot(index="City", columns="Model", values="MAE").to_string())
+    if price_results:
+        df_p = pd.DataFrame(price_results)
+        print("\n=== PRICE MAE Comparison ===")
+        print(df_p.pivot(index="City", columns="Model", values="MAE").to_string())
 
-    print("\n=== PRICE RMSE Comparison ===")
-    print(df_p.pivot(index="City", columns="Model", values="RMSE").to_string())
+        print("\n=== PRICE RMSE Comparison ===")
+        print(df_p.pivot(index="City", columns="Model", values="RMSE").to_string())
 
-if demand_results:
-    df_d = pd.DataFrame(demand_results)
-    print("\n=== DEMAND MAE Comparison ===")
-    print(df_d.pivot(index="City", columns="Model", values="MAE").to_string())
+    if demand_results:
+        df_d = pd.DataFrame(demand_results)
+        print("\n=== DEMAND MAE Comparison ===")
+        print(df_d.pivot(index="City", columns="Model", values="MAE").to_string())
 
-    print("\n=== DEMAND RMSE Comparison ===")
-    print(df_d.pivot(index="City", columns="Model", values="RMSE").to_string())
+        print("\n=== DEMAND RMSE Comparison ===")
+        print(df_d.pivot(index="City", columns="Model", values="RMSE").to_string())
 
-if not price_results and not demand_results:
-    print("\nNo results available. All evaluations were skipped or failed.")
+    if not price_results and not demand_results:
+        print("\nNo results available. All evaluations were skipped or failed.")
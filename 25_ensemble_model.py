@@ -0,0 +1,38 @@
+# Demand and price ensembles trained together from a single load per city
+import matplotlib.pyplot as plt
+
+from cv_engine import TARGETS, report, run_cv, save_final_models
+
+# Config
+CITIES = ['oslo', 'stockholm', 'copenhagen']
+MODEL_PATH = 'models'
+LABELS = {'demand_next': 'Demand', 'price_next': 'Price'}
+
+
+def plot_city(city, label, y_true, ensemble):
+    plt.figure(figsize=(6, 6))
+    plt.scatter(y_true, ensemble, alpha=0.7)
+    plt.plot([min(y_true), max(y_true)], [min(y_true), max(y_true)], 'r--')
+    plt.xlabel(f"Actual {label}")
+    plt.ylabel(f"Predicted {label}")
+    plt.title(f"{city.title()} — Ensemble {label} Prediction vs Actual")
+    plt.grid(True)
+    plt.tight_layout()
+    plt.show()
+
+
+if __name__ == "__main__":
+    # One float32 matrix per city; every fold x model x target job shares it
+    results = run_cv(CITIES, targets=TARGETS)
+
+    for city in CITIES:
+        print(f"\n=== Processing city: {city.title()} ===")
+        for target in TARGETS:
+            print(f"\n--- {LABELS[target]} Forecasting ---")
+            result = results[(city, target)]
+            ensemble = report(result, LABELS[target])
+
+            save_final_models(result, city, target, MODEL_PATH)
+            print(f"Models saved for {LABELS[target].lower()} prediction.")
+
+            plot_city(city, LABELS[target], result["y_true"], ensemble)
@@ -0,0 +1,103 @@
+# Walk-forward backtest of the ensemble for every city and target
+# Usage: python 26_backtest.py [--window expanding|sliding] [--window-size N]
+#        [--initial N] [--step N] [--gap N] [--horizon N] [--refit-every N]
+# With --horizon above 1 each origin is scored on a recursive multi-step forecast
+# of both targets; the ensemble blends its members with the stacked weights of
+# the latest artifacts (the fixed ones where there is none), and the weather
+# follows the forecast vintage issued before each origin.
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import storage
+from artifacts import load_artifact
+from backtest import run_backtest, run_recursive_backtest
+from cv_engine import TARGETS
+from ensemble import ENSEMBLE_WEIGHTS
+from feature_store import load_matrix
+from parallel import run_jobs
+from weather_forecast import DATASET as WEATHER_FORECASTS
+from weather_forecast import load_vintages
+
+# Config
+CITIES = ['oslo', 'stockholm', 'copenhagen']
+
+
+def stacked_weights(city, target):
+    # Blend weights from the latest artifact's manifest
+    try:
+        return load_artifact(city, target).weights
+    except FileNotFoundError:
+        return ENSEMBLE_WEIGHTS
+
+
+def backtest_city_target(city, target, options):
+    # One (city, target) backtest; runs in a worker process
+    print(f"\n=== Backtesting {target} for: {city.title()} ===")
+    m = load_matrix(city, [target])
+    X = np.load(m["paths"]["X"], mmap_mode="r")
+    y = np.load(m["paths"][target])
+
+    metrics = run_backtest(X, y, m["index"], weights=stacked_weights(city, target), **options)
+    print(f"{metrics['origin'].nunique()} origins evaluated")
+    return metrics
+
+
+def backtest_city_recursive(city, options):
+    # Both targets of one city forecast together, as the forecasters do; runs in a worker
+    print(f"\n=== Recursive {options['horizon']}-step backtest for: {city.title()} ===")
+    m = load_matrix(city, TARGETS)
+    X = np.load(m["paths"]["X"], mmap_mode="r")
+    ys = {target: np.load(m["paths"][target]) for target in TARGETS}
+    features = storage.read_frame("features", city).reindex(m["index"])
+
+    weights = {target: stacked_weights(city, target) for target in TARGETS}
+    vintages = load_vintages(city) if storage.exists(WEATHER_FORECASTS, city) else None
+    metrics = run_recursive_backtest(city, features, X, ys, m["index"], m["feature_cols"], weights=weights,
+                                     vintages=vintages, **options)
+    print(f"{metrics['origin'].nunique()} origins evaluated")
+    return {target: metrics[metrics["target"] == target].drop(columns="target") for target in TARGETS}
+
+
+def save_metrics(city, target, metrics):
+    # Per-origin table, one MAE/RMSE column pair per model: backtest_{demand,price}/{city}
+    wide = metrics.pivot(index="origin", columns="model", values=["MAE", "RMSE"])
+    wide.columns = [f"{model}_{metric.lower()}" for metric, model in wide.columns]
+    wide["n_train"] = metrics.groupby("origin")["n_train"].first()
+    storage.write_frame(f"backtest_{target.replace('_next', '')}", city, wide, mode="overwrite")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the ensemble.")
+    parser.add_argument("--window", choices=["expanding", "sliding"], default="expanding")
+    parser.add_argument("--window-size", type=int, default=None, help="Rows per sliding window (default: --initial)")
+    parser.add_argument("--initial", type=int, default=30, help="Rows before the first origin")
+    parser.add_argument("--step", type=int, default=1, help="Rows between origins")
+    parser.add_argument("--gap", type=int, default=0, help="Rows skipped between training and test")
+    parser.add_argument("--horizon", type=int, default=1, help="Test rows per origin")
+    parser.add_argument("--refit-every", type=int, default=10, help="Origins between cold refits of RF/XGBoost")
+    args = parser.parse_args()
+
+    options = {"window": args.window, "window_size": args.window_size, "initial": args.initial,
+               "step": args.step, "gap": args.gap, "horizon": args.horizon, "refit_every": args.refit_every}
+    if args.horizon > 1:
+        per_city = run_jobs(backtest_city_recursive, [(city, (city, options)) for city in CITIES])
+        results = {(city, target): metrics for city, by_target in per_city.items()
+                   for target, metrics in by_target.items()}
+    else:
+        jobs = [((city, target), (city, target, options)) for city in CITIES for target in TARGETS]
+        results = run_jobs(backtest_city_target, jobs)
+
+    summary = []
+    for (city, target), metrics in results.items():
+        save_metrics(city, target, metrics)
+        mean = metrics.groupby("model")[["MAE", "RMSE"]].mean()
+        for model, row in mean.iterrows():
+            summary.append({"City": city.title(), "Target": target, "Model": model,
+                            "MAE": round(row["MAE"], 2), "RMSE": round(row["RMSE"], 2)})
+
+    summary = pd.DataFrame(summary)
+    for target in TARGETS:
+        print(f"\n=== {target.upper()} mean walk-forward MAE ===")
+        print(summary[summary["Target"] == target].pivot(index="City", columns="Model", values="MAE").to_string())
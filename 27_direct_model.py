@@ -0,0 +1,24 @@
+# Direct multi-horizon ensembles: one Ridge + RF + XGBoost set per day ahead
+# Trains every city x target x horizon x model job on the process pool, saves
+# models/direct_{demand,price}_{city}.pkl and writes forecast_direct/{city}.
+import storage
+from config import FORECAST_HORIZON
+from direct import SOURCES, DirectForecaster, save_direct_models, train_direct
+
+# Config
+CITIES = ['oslo', 'stockholm', 'copenhagen']
+MODEL_PATH = 'models'
+N_DAYS = 7
+
+
+if __name__ == "__main__":
+    results = train_direct(CITIES, horizon=FORECAST_HORIZON)
+    for (city, short), models_by_horizon in results.items():
+        save_direct_models(models_by_horizon, city, short, MODEL_PATH)
+        print(f"Saved {len(models_by_horizon)} {short} horizons for {city.title()}")
+
+    forecasts = DirectForecaster.from_store(CITIES, MODEL_PATH, tuple(SOURCES)).forecast(N_DAYS)
+    for city, forecast_df in forecasts.items():
+        storage.write_frame("forecast_direct", city, forecast_df, mode="overwrite")
+        print(f"\n=== {city.upper()} direct {N_DAYS}-day forecast ===")
+        print(forecast_df)
@@ -0,0 +1,35 @@
+# Online update of the ensemble artifacts with the feature rows added since the
+# last model version (see online.py); a full retrain is 25_ensemble_model.py.
+#
+#   python 28_update_models.py [--cities oslo] [--window 90]
+import argparse
+import os
+
+from config import CITIES
+from cv_engine import TARGETS, load_tuned_params
+from online import ONLINE_WINDOW, update_zone
+
+MODEL_PATH = 'models'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the ensemble artifacts with newly arrived rows.")
+    parser.add_argument("--cities", nargs="+", default=CITIES)
+    parser.add_argument("--window", type=int, default=ONLINE_WINDOW,
+                        help="Recent rows the new XGBoost rounds and RF trees are fitted on")
+    args = parser.parse_args()
+
+    tuned = load_tuned_params()
+    for city in args.cities:
+        for target in TARGETS:
+            try:
+                # update_zone reads only the rows since its artifact's training window
+                path = update_zone(city, target, None, os.path.join(MODEL_PATH, "artifacts"), args.window, tuned)
+            except FileNotFoundError as e:
+                print(f"{city}/{target}: {e}; train it first with 25_ensemble_model.py")
+                continue
+            except ValueError as e:
+                # e.g. an artifact exported without a training window; the other zones go on
+                print(f"{city}/{target}: {e}")
+                continue
+            print(f"{city}/{target}: " + (f"updated -> {path}" if path else "no new rows"))
@@ -1,4 +1,4 @@
-import pandas as pd
+import storage
 
 # === Define your mapping ===
 name_to_coords = {
@@ -7,21 +7,17 @@ name_to_coords = {
     "Copenhagen, Hovedstaden, Danmark": "55.6761,12.5683"
 }
 
-# === List of your files ===
-files = [
-    "data/weather/stockholm_current_new.csv",
-    "data/weather/oslo_current_new.csv",
-    "data/weather/copenhagen_current_new.csv"
-]
+# === List of your weather zones ===
+cities = ["stockholm", "oslo", "copenhagen"]
 
-# === Loop through files and update ===
-for file in files:
-    print(f"🔄 Processing: {file}")
-    df = pd.read_csv(file, quotechar='"', skipinitialspace=True)
+# === Loop through zones and update ===
+for city in cities:
+    print(f"🔄 Processing: weather/{city}")
+    df = storage.read_frame("weather", city)
     
     if "name" in df.columns:
         df["name"] = df["name"].apply(lambda x: name_to_coords.get(x, x))  # Replace if match
-        df.to_csv(file, index=False)
-        print(f"✅ Updated and saved: {file}")
+        storage.write_frame("weather", city, df, mode="overwrite")
+        print(f"✅ Updated and saved: weather/{city}")
     else:
-        print(f"⚠️ Skipped {file} (no 'name' column found)")
+        print(f"⚠️ Skipped weather/{city} (no 'name' column found)")
@@ -1,16 +1,15 @@
-import pandas as pd
-import os
+import storage
+import validation
 
 cities = ["stockholm", "oslo", "copenhagen"]
 
 for city in cities:
-    filename = f"data/entsoe/{city}_demand.csv"
-    if not os.path.exists(filename):
-        print(f"File not found: {filename}")
+    if not storage.exists("demand", city):
+        print(f"No stored data: demand/{city}")
         continue
 
-    print(f"\nInspecting {filename}")
-    df = pd.read_csv(filename, index_col=0, parse_dates=True)
+    print(f"\nInspecting demand/{city}")
+    df = storage.read_frame("demand", city)
 
     print("Head:")
     print(df.head(3))
@@ -21,9 +20,7 @@ for city in cities:
     print("Info:")
     print(df.info())
 
-    print("Missing values:")
-    print(df.isnull().sum())
-
-    print("Any NaNs?:", df.isnull().values.any())
-
-    print("Total rows:", df.shape[0])
+    # Missing values, gaps, duplicates, stale values and DST days (validation.RAW_RULES)
+    report = validation.validate(df, validation.RAW_RULES)
+    print(f"Total rows: {report['rows']}")
+    print(validation.summary(report))
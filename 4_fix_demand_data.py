@@ -1,24 +1,25 @@
-import pandas as pd
+import storage
+from etl_pipeline import resample_frame
 
 # Input: original 15-minute data
-input_file = "data/entsoe/oslo_demand.csv"
-# Output: new hourly data file
-output_file = "data/entsoe/oslo_demand_hourly.csv"
+input_zone = "oslo"
+# Output: new hourly dataset
+output_dataset = "demand_hourly"
 
-# Read CSV with datetime index
-df = pd.read_csv(input_file, index_col=0, parse_dates=True)
+# Read stored series (datetime index is restored by the store)
+df = storage.read_frame("demand", input_zone)
 
 # Inspect original
 print("Original entries:", df.shape[0])
 print("Original index sample:", df.index[:4])
 
-# Resample to hourly averages
-df_hourly = df.resample("1H").mean()
+# Resample to hourly by the per-column rules in config.RESAMPLE_RULES
+df_hourly = resample_frame(df, "h")
 
 # Check result
 print("Hourly rows:", df_hourly.shape[0])
 print(df_hourly.head(3))
 
-# Save to new file
-df_hourly.to_csv(output_file)
-print(f" Hourly data saved to: {output_file}")
+# Save to new dataset
+storage.write_frame(output_dataset, input_zone, df_hourly, mode="overwrite")
+print(f" Hourly data saved to: {output_dataset}/{input_zone}")
@@ -1,11 +1,10 @@
-import pandas as pd
+import storage
 
 # === Load demand ===
-load_df = pd.read_csv("data/entsoe/copenhagen_demand.csv", index_col=0, parse_dates=True)
+load_df = storage.read_frame("demand", "copenhagen")
 
-# === Load price from city_price.csv ===
-price_df = pd.read_csv("data/entsoe/copenhagen_price.csv", parse_dates=["Datetime"])
-price_df.set_index("Datetime", inplace=True)
+# === Load price ===
+price_df = storage.read_frame("price", "copenhagen")
 price_df.rename(columns={"Day-Ahead Price": "Price"}, inplace=True)
 
 # === Ensure timezone is set and matches demand ===
@@ -28,5 +27,5 @@ print("\nMerged power_df:")
 print(power_df.head())
 print("Shape:", power_df.shape)
 print("Missing values:\n", power_df.isnull().sum())
-power_df.to_csv("data/entsoe/copenhagen_power.csv")
-print(" Saved merged data to: data/entsoe/copenhagen_power.csv")
+storage.write_frame("power", "copenhagen", power_df, mode="overwrite")
+print(" Saved merged data to: power/copenhagen")
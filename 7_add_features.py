@@ -1,8 +1,7 @@
-import pandas as pd
+import storage
 
 # === Step 1: Load merged power data ===
-file_path = "data/entsoe/copenhagen_power.csv"
-df = pd.read_csv(file_path, index_col=0, parse_dates=True)
+df = storage.read_frame("power", "copenhagen")
 
 # === Step 2: Add datetime-based features ===
 df["hour"] = df.index.hour
@@ -11,7 +10,7 @@ df["month"] = df.index.month
 df["is_weekend"] = df["day_of_week"].isin([5, 6]).astype(int)
 
 
-# === Step 3: Save back to same file ===
-df.to_csv(file_path)
-print(f"Features added and file updated: {file_path}")
+# === Step 3: Save back to same dataset ===
+storage.write_frame("power", "copenhagen", df, mode="overwrite")
+print("Features added and dataset updated: power/copenhagen")
 print(df.head())
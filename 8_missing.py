@@ -1,18 +1,19 @@
 # 7_check_missing.py
 
-import pandas as pd
+import impute
+import storage
+import validation
+from config import CITIES
 
-# Load the merged data
-power_df = pd.read_csv("data/processed/stockholm_power.csv", index_col=0, parse_dates=True)
+# Missing values, gaps and duplicates of the merged data (see validation.py)
+rules = {name: validation.VALIDATION_RULES[name] for name in ["missing", "continuity", "duplicates"]}
+reports = validation.validate_zones("power", CITIES, rules)
+for city, report in reports.items():
+    checks = report["checks"]
+    print(f"\n{city}: {report['rows']} rows")
+    print("Missing values per column:", checks["missing"]["by_column"])
+    print("Missing timestamps:", checks["continuity"].get("missing_steps", 0), checks["continuity"].get("first_gaps", []))
+    print("Any NaNs?:", checks["missing"]["failures"] > 0)
 
-# Check total missing values
-print("Missing values:\n", power_df.isnull().sum())
-
-# Identify exact timestamps with any NaNs
-null_hours = power_df[power_df.isnull().any(axis=1)].index
-print("Timestamps with missing data:")
-print(null_hours)
-
-# Summary
-print(f"\nTotal rows: {len(power_df)}")
-print(f"Any NaNs?: {power_df.isnull().values.any()}")
+    # What the imputation stage would fill, by strategy (nothing is written)
+    print("Would impute:", impute.summary(impute.impute(storage.read_frame("power", city))) or "nothing")
@@ -1,8 +1,8 @@
 
-import pandas as pd
+import storage
 
 # Load your merged demand + price dataset
-power_df = pd.read_csv("data/processed/copenhagen_power.csv", index_col=0, parse_dates=True)
+power_df = storage.read_frame("power", "copenhagen")
 
 # If the index is already timezone-aware (like Europe/Brussels), convert to UTC
 if power_df.index.tz is None:
@@ -0,0 +1,322 @@
+# Streaming anomaly detection on ingested load and price observations
+# 20_diagnostics.py fits an IsolationForest on the whole feature file; this scores
+# every raw observation as ingestion writes it (entsoe_tasks.save_series), so bad
+# ENTSO-E data is flagged before the ETL turns it into features.
+#
+# Each (zone, series) keeps a fixed-size state, independent of the history:
+#   level   running median / MAD of the series (sign-step trackers: every
+#           observation moves them by ANOMALY_ADAPT * MAD towards it, so a single
+#           spike can't drag the baseline)
+#   season  per hour-of-week slot (local market time), the median of the
+#           deviation from the level, i.e. the weekly profile
+#   resid   median / MAD of the deviation from the seasonal baseline
+# An observation's baseline is level + its slot's offset once the slot has seen
+# ANOMALY_SEASON_MIN observations, and its score the robust z-score
+# (value - baseline - median) / (1.4826 * MAD) of the residual; until the slot and
+# the residual trackers are warm, the level's z-score is used. Scores above
+# ANOMALY_THRESHOLD are flagged "spike", below -ANOMALY_THRESHOLD "drop" (per
+# series, see ANOMALY_DIRECTIONS), NaN values "missing". States are saved to
+#
+#   data/anomaly/{zone}_{series}.npz
+#
+# together with the last timestamp scored, so the overlap re-fetched by every
+# ingest run is not scored twice. Flags are appended to {series}_anomalies/{zone};
+# the ETL masks the kinds in ANOMALY_MASK_KINDS.
+#
+# Optionally, refresh_forest() refits an IsolationForest per (zone, series) on the
+# last ANOMALY_FOREST_DAYS of raw data (value and its change over 1 step, 1 day and
+# 1 week), in batch from a scheduler or start_background_refresh(). While one is
+# stored, new observations it isolates are flagged "isolation" if their score is
+# at least half the threshold.
+#
+#   python anomaly.py --rebuild [--cities oslo]     # replay the stored history into fresh states
+#   python anomaly.py --refresh-forest
+import argparse
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+import storage
+from config import (ANOMALY_ADAPT, ANOMALY_DIR, ANOMALY_DIRECTIONS, ANOMALY_FOREST_DAYS, ANOMALY_SEASON_ADAPT,
+                    ANOMALY_SEASON_MIN, ANOMALY_THRESHOLD, ANOMALY_WARMUP, CITIES, SOURCE_TZ)
+
+# Raw dataset -> value column
+SERIES = {"demand": "Actual Load", "price": "Day-Ahead Price"}
+SLOTS = 7 * 24
+MAD_TO_SIGMA = 1.4826
+FOREST_CONTAMINATION = 0.01
+FLAG_COLUMNS = ["value", "baseline", "score", "kind"]
+
+_locks = {}
+_locks_guard = threading.Lock()
+_forests = {}
+
+
+def flag_dataset(series):
+    return f"{series}_anomalies"
+
+
+def _lock(zone, series):
+    with _locks_guard:
+        return _locks.setdefault((zone.lower(), series), threading.Lock())
+
+
+def _slots(index):
+    # Hour of the week in local market time; the store returns naive stamps as UTC
+    index = index.tz_localize("UTC") if index.tz is None else index
+    index = index.tz_convert(SOURCE_TZ)
+    return (index.dayofweek * 24 + index.hour).to_numpy()
+
+
+def _utc_ns(index):
+    return index.tz_convert("UTC").asi8 if index.tz is not None else index.asi8
+
+
+def _track(t, x, adapt, warmup):
+    # One observation into a [n, median, mad] tracker: running mean / mean absolute
+    # deviation while warming up, then sign steps of adapt * mad
+    n, m, mad = t
+    n += 1
+    if n <= warmup:
+        m += (x - m) / n
+        mad += (abs(x - m) - mad) / n
+    else:
+        step = adapt * max(mad, 1e-9)
+        r = x - m
+        m += step if r > 0 else -step if r < 0 else 0.0
+        mad += step if abs(r) > mad else -step
+    t[0], t[1], t[2] = n, m, mad
+
+
+def _scale(mad, level):
+    return MAD_TO_SIGMA * max(mad, 1e-3 * abs(level), 1e-9)
+
+
+class SeriesState:
+    # Fixed-size detector state of one (zone, series): 6 + 3 * SLOTS floats
+    def __init__(self):
+        self.level = [0.0, 0.0, 0.0]
+        self.resid = [0.0, 0.0, 0.0]
+        self.season = np.zeros((SLOTS, 3))
+        self.last = None  # UTC ns of the last observation scored
+
+    @classmethod
+    def load(cls, path):
+        state = cls()
+        if os.path.exists(path):
+            with np.load(path) as data:
+                state.level = [float(v) for v in data["level"]]
+                state.resid = [float(v) for v in data["resid"]]
+                state.season = data["season"].copy()
+                state.last = int(data["last"]) if data["last"] >= 0 else None
+        return state
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, level=np.array(self.level), resid=np.array(self.resid), season=self.season,
+                 last=np.int64(-1 if self.last is None else self.last))
+        os.replace(tmp, path)
+
+    def update(self, values, slots, adapt=ANOMALY_ADAPT, season_adapt=ANOMALY_SEASON_ADAPT,
+               warmup=ANOMALY_WARMUP, season_min=ANOMALY_SEASON_MIN):
+        # Scores the observations in order and folds each into the state after it is
+        # scored; returns (baseline, score), score NaN for NaN values and while warming up
+        baseline = np.full(len(values), np.nan)
+        score = np.full(len(values), np.nan)
+        level, resid, season = self.level, self.resid, self.season.tolist()
+        for i, (x, s) in enumerate(zip(values.tolist(), slots.tolist())):
+            if x != x:  # NaN: nothing to score or learn from
+                continue
+            slot = season[s]
+            seasonal = slot[0] >= season_min
+            baseline[i] = level[1] + slot[1] if seasonal else level[1]
+            r = x - baseline[i]
+            if seasonal and resid[0] >= warmup:
+                score[i] = (r - resid[1]) / _scale(resid[2], baseline[i])
+            elif level[0] >= warmup:
+                score[i] = (x - level[1]) / _scale(level[2], level[1])
+            if seasonal:
+                _track(resid, r, adapt, warmup)
+            _track(slot, x - level[1], season_adapt, season_min)
+            _track(level, x, adapt, warmup)
+        self.season = np.array(season)
+        return baseline, score
+
+
+def state_path(zone, series, state_dir=ANOMALY_DIR):
+    return os.path.join(state_dir, f"{zone.lower()}_{series}.npz")
+
+
+def forest_path(zone, series, state_dir=ANOMALY_DIR):
+    return os.path.join(state_dir, f"{zone.lower()}_{series}.forest.pkl")
+
+
+def classify(values, score, directions, threshold=ANOMALY_THRESHOLD):
+    kind = np.full(len(values), "", dtype=object)
+    kind[np.isnan(values)] = "missing"
+    with np.errstate(invalid="ignore"):
+        if "spike" in directions:
+            kind[score > threshold] = "spike"
+        if "drop" in directions:
+            kind[score < -threshold] = "drop"
+    return kind
+
+
+def score_new(zone, series, values, state_dir=ANOMALY_DIR, threshold=ANOMALY_THRESHOLD):
+    # Scores the observations of `values` (a Series) after the last one scored for
+    # (zone, series) and saves the state; returns a frame with FLAG_COLUMNS, one row
+    # per new observation ("" kind: nothing found)
+    values = values.sort_index()
+    values = values[~values.index.duplicated(keep="last")]
+    with _lock(zone, series):
+        path = state_path(zone, series, state_dir)
+        state = SeriesState.load(path)
+        if state.last is not None:
+            values = values[_utc_ns(values.index) > state.last]
+        x = values.to_numpy(dtype=np.float64)
+        baseline, score = state.update(x, _slots(values.index))
+        if len(values):
+            state.last = int(_utc_ns(values.index)[-1])
+            state.save(path)
+    kind = classify(x, score, ANOMALY_DIRECTIONS.get(series, ["spike", "drop"]), threshold)
+    return pd.DataFrame({"value": x, "baseline": baseline, "score": score, "kind": kind}, index=values.index)
+
+
+def _forest_inputs(values, step):
+    # value and its change over one step, one day and one week (0 where unknown)
+    shifted = {lag: values.shift(freq=lag).reindex(values.index)
+               for lag in (step, pd.Timedelta(days=1), pd.Timedelta(days=7))}
+    X = np.column_stack([values.to_numpy()] + [(values - past).to_numpy() for past in shifted.values()])
+    return np.nan_to_num(X)
+
+
+def _step(index):
+    return pd.Timedelta(int(np.median(np.diff(index.asi8)))) if len(index) > 1 else pd.Timedelta(hours=1)
+
+
+def refresh_forest(zone, series, days=ANOMALY_FOREST_DAYS, state_dir=ANOMALY_DIR):
+    # Refits the IsolationForest of (zone, series) on its last `days` of raw data
+    if not storage.exists(series, zone):
+        return None
+    end = storage.read_frame(series, zone, columns=[SERIES[series]]).index.max()
+    values = storage.read_frame(series, zone, columns=[SERIES[series]],
+                                start=end - pd.Timedelta(days=days))[SERIES[series]].dropna()
+    if len(values) < ANOMALY_WARMUP:
+        return None
+    step = _step(values.index)
+    forest = IsolationForest(contamination=FOREST_CONTAMINATION, random_state=42)
+    forest.fit(_forest_inputs(values, step))
+    path = forest_path(zone, series, state_dir)
+    os.makedirs(state_dir, exist_ok=True)
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump({"forest": forest, "step": step, "trained_until": str(end)}, f)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def _load_forest(path):
+    # Unpickled once per refit: cached until the file's mtime changes
+    mtime = os.stat(path).st_mtime_ns
+    cached = _forests.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = _forests[path] = (mtime, pickle.load(f))
+    return cached[1]
+
+
+def forest_flags(zone, series, scored, state_dir=ANOMALY_DIR, threshold=ANOMALY_THRESHOLD):
+    # Marks as "isolation" the unflagged rows of `scored` the stored forest isolates
+    path = forest_path(zone, series, state_dir)
+    if not os.path.exists(path) or not len(scored):
+        return scored
+    model = _load_forest(path)
+    # Their lags need the week before the new rows
+    start = scored.index[0] - pd.Timedelta(days=7) - model["step"]
+    history = storage.read_frame(series, zone, columns=[SERIES[series]], start=start)[SERIES[series]].dropna()
+    history = history[~history.index.duplicated(keep="last")]
+    at = scored.index.intersection(history.index)
+    if not len(at):
+        return scored
+    isolated = model["forest"].predict(_forest_inputs(history, model["step"]))[history.index.get_indexer(at)] == -1
+    rows = scored.index.get_indexer(at)
+    candidates = (scored["kind"].to_numpy()[rows] == "") & (np.abs(scored["score"].to_numpy()[rows]) >= threshold / 2)
+    scored.iloc[rows[isolated & candidates], scored.columns.get_loc("kind")] = "isolation"
+    return scored
+
+
+def screen(df, series, zone, state_dir=ANOMALY_DIR):
+    # Ingest hook: scores the new rows of a freshly appended raw frame, stores the
+    # flagged ones in {series}_anomalies/{zone} and reports them; returns the flags
+    scored = score_new(zone, series, df[SERIES[series]], state_dir)
+    scored = forest_flags(zone, series, scored, state_dir)
+    flags = scored[scored["kind"] != ""]
+    if len(flags):
+        storage.append(flag_dataset(series), zone, flags)
+        counts = flags["kind"].value_counts().to_dict()
+        print(f"⚠️ {len(flags)} anomalous {series} observation(s) for {zone.lower()}: {counts}, "
+              f"first at {flags.index[0]}")
+    return flags
+
+
+def load_flags(series, zone, start=None, end=None, kinds=None):
+    # Stored flags of (zone, series) in [start, end), optionally only some kinds
+    if not storage.exists(flag_dataset(series), zone):
+        return pd.DataFrame(columns=FLAG_COLUMNS, index=pd.DatetimeIndex([], name=storage.INDEX_COL))
+    flags = storage.read_frame(flag_dataset(series), zone, start=start, end=end)
+    return flags if kinds is None else flags[flags["kind"].isin(kinds)]
+
+
+def rebuild(zone, series, state_dir=ANOMALY_DIR):
+    # Fresh state from the whole stored history, and the flags it raises
+    with _lock(zone, series):
+        if os.path.exists(state_path(zone, series, state_dir)):
+            os.remove(state_path(zone, series, state_dir))
+    storage.delete(flag_dataset(series), zone)
+    values = storage.read_frame(series, zone, columns=[SERIES[series]])
+    flags = score_new(zone, series, values[SERIES[series]], state_dir)
+    flags = flags[flags["kind"] != ""]
+    if len(flags):
+        storage.append(flag_dataset(series), zone, flags)
+    return flags
+
+
+def start_background_refresh(zones, series=tuple(SERIES), interval_seconds=6 * 3600, state_dir=ANOMALY_DIR):
+    # Daemon thread that periodically refits the IsolationForests in batch
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval_seconds):
+            for zone in zones:
+                for name in series:
+                    try:
+                        refresh_forest(zone, name, state_dir=state_dir)
+                    except Exception as e:
+                        print(f"IsolationForest refresh failed for {name}/{zone}: {e}")
+
+    threading.Thread(target=_loop, name="anomaly-forest", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild streaming anomaly states or refit the IsolationForests.")
+    parser.add_argument("--cities", nargs="+", default=CITIES)
+    parser.add_argument("--series", nargs="+", default=list(SERIES), choices=list(SERIES))
+    parser.add_argument("--rebuild", action="store_true", help="Replay the stored history into fresh states")
+    parser.add_argument("--refresh-forest", action="store_true", help="Refit the IsolationForests")
+    args = parser.parse_args()
+
+    for city in args.cities:
+        for name in args.series:
+            if not storage.exists(name, city):
+                print(f"No stored data: {name}/{city}")
+                continue
+            if args.rebuild:
+                flags = rebuild(city, name)
+                print(f"{name}/{city}: {len(flags)} flag(s) {flags['kind'].value_counts().to_dict()}")
+            if args.refresh_forest:
+                print(f"{name}/{city}: forest -> {refresh_forest(city, name)}")
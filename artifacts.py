@@ -0,0 +1,320 @@
+# Compact model artifacts for the Ridge + RF + XGBoost ensembles
+# One directory per (zone, target) and training run instead of three pickles:
+#
+#   models/artifacts/{city}/{demand,price}/v0003/
+#       manifest.json   feature names, ensemble weights, training window, members
+#       ridge.npz       coefficients + intercept
+#       xgb.ubj         native XGBoost booster (UBJSON)
+#       rf/*.npy        RandomForest as flat node arrays (see FlatForest)
+#   models/artifacts/{city}/{demand,price}/LATEST   -> "v0003"
+#
+# Nothing is unpickled: the manifest is read when an artifact is opened and each
+# member is only loaded when first used. The forest arrays are memory-mapped
+# read-only, so processes serving the same zones share the pages through the OS
+# page cache. Versions are written to a temp directory and renamed into place,
+# and LATEST is swapped atomically, so readers never see a partial artifact.
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+import xgboost as xgb
+from sklearn.ensemble import RandomForestRegressor
+
+ARTIFACT_DIR = os.path.join("models", "artifacts")
+FORMAT_VERSION = 2
+LATEST = "LATEST"
+FOREST_ARRAYS = ["roots", "left", "right", "feature", "threshold", "value", "depths"]
+
+
+class LinearMember:
+    def __init__(self, coef, intercept):
+        self.coef = coef
+        self.intercept = float(intercept)
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+
+
+class BoosterMember:
+    def __init__(self, booster):
+        self.booster = booster
+
+    def predict(self, X):
+        return self.booster.inplace_predict(np.asarray(X), validate_features=False)
+
+
+class FlatForest:
+    # RandomForestRegressor as flat node arrays. Leaves point to themselves, so a
+    # row can keep stepping down until the tree's depth without checking for leaves.
+    # Small batches (forecast steps, service requests) walk all trees at once, where
+    # sklearn would dispatch one joblib task per tree; large batches walk one tree
+    # at a time over all rows to stay cache-friendly.
+    SMALL_BATCH = 3000
+
+    def __init__(self, roots, left, right, feature, threshold, value, depths):
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.depths = depths
+
+    @classmethod
+    def from_forest(cls, forest):
+        trees = [est.tree_ for est in forest.estimators_]
+        offsets = np.cumsum([0] + [t.node_count for t in trees[:-1]])
+
+        def children(side, t, o):
+            nodes = np.arange(t.node_count) + o
+            return np.where(side >= 0, side + o, nodes)
+
+        return cls(
+            roots=offsets.astype(np.int64),
+            left=np.concatenate([children(t.children_left, t, o) for t, o in zip(trees, offsets)]),
+            right=np.concatenate([children(t.children_right, t, o) for t, o in zip(trees, offsets)]),
+            feature=np.concatenate([np.maximum(t.feature, 0) for t in trees]).astype(np.int64),
+            threshold=np.concatenate([t.threshold for t in trees]),
+            value=np.concatenate([t.value[:, 0, 0] for t in trees]),
+            depths=np.array([t.max_depth for t in trees], dtype=np.int64),
+        )
+
+    def tree_slice(self, start, stop=None):
+        # Forest of trees [start, stop); node ids are shifted to start at 0
+        stop = len(self.roots) if stop is None else stop
+        first = int(self.roots[start])
+        last = int(self.roots[stop]) if stop < len(self.roots) else len(self.left)
+        return FlatForest(
+            roots=np.asarray(self.roots[start:stop]) - first,
+            left=np.asarray(self.left[first:last]) - first,
+            right=np.asarray(self.right[first:last]) - first,
+            feature=np.asarray(self.feature[first:last]),
+            threshold=np.asarray(self.threshold[first:last]),
+            value=np.asarray(self.value[first:last]),
+            depths=np.asarray(self.depths[start:stop]),
+        )
+
+    @classmethod
+    def concat(cls, forests):
+        # One forest averaging all trees of `forests`, in order
+        offsets = np.cumsum([0] + [len(f.left) for f in forests[:-1]])
+        return cls(**{name: np.concatenate([np.asarray(getattr(f, name)) + o if name in ("roots", "left", "right")
+                                            else np.asarray(getattr(f, name)) for f, o in zip(forests, offsets)])
+                      for name in FOREST_ARRAYS})
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in FOREST_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        return {"n_trees": len(self.roots), "n_nodes": len(self.left), "max_depth": int(self.depths.max())}
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(**{name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                      for name in FOREST_ARRAYS})
+
+    def predict(self, X):
+        # sklearn compares float32 features against float64 thresholds: right if x > t
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat = X.ravel()
+        offsets = np.arange(len(X), dtype=np.int64) * X.shape[1]
+        if len(X) <= self.SMALL_BATCH:
+            offsets = offsets[:, None]
+            nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+            for _ in range(int(self.depths.max())):
+                go_right = flat[offsets + self.feature[nodes]] > self.threshold[nodes]
+                nodes = np.where(go_right, self.right[nodes], self.left[nodes])
+            return self.value[nodes].mean(axis=1)
+
+        total = np.zeros(len(X))
+        for root, depth in zip(self.roots, self.depths):
+            nodes = np.full(len(X), root, dtype=np.int64)
+            for _ in range(int(depth)):
+                go_right = flat[offsets + self.feature[nodes]] > self.threshold[nodes]
+                nodes = np.where(go_right, self.right[nodes], self.left[nodes])
+            total += self.value[nodes]
+        return total / len(self.roots)
+
+
+MEMBER_TYPES = (LinearMember, BoosterMember, FlatForest)
+
+# Ridge sufficient statistics (backtest.IncrementalRidge) stored next to the
+# coefficients, so online.py can add new rows without revisiting the history
+RIDGE_STATS = ["n", "sx", "sy", "xtx", "xty", "alpha"]
+
+
+def _export_member(name, model, path):
+    # Writes one fitted member into the version directory; returns its manifest entry
+    if (hasattr(model, "coef_") and hasattr(model, "intercept_")) or hasattr(model, "xtx"):
+        stats = {k: np.asarray(getattr(model, k), dtype=np.float64) for k in RIDGE_STATS} \
+            if hasattr(model, "xtx") else {}
+        np.savez(os.path.join(path, f"{name}.npz"), coef=np.asarray(model.coef_, dtype=np.float64),
+                 intercept=np.float64(model.intercept_), **stats)
+        return {"kind": "linear", "file": f"{name}.npz", "stats": bool(stats)}
+    if isinstance(model, (RandomForestRegressor, FlatForest)):
+        forest = FlatForest.from_forest(model) if isinstance(model, RandomForestRegressor) else model
+        info = forest.save(os.path.join(path, name))
+        return {"kind": "forest", "file": name, **info}
+    if isinstance(model, (xgb.XGBModel, xgb.Booster, BoosterMember)):
+        if isinstance(model, xgb.XGBModel):
+            booster = model.get_booster()
+        else:
+            booster = model.booster if isinstance(model, BoosterMember) else model
+        booster.save_model(os.path.join(path, f"{name}.ubj"))
+        return {"kind": "xgboost", "file": f"{name}.ubj"}
+    raise TypeError(f"Cannot export {type(model).__name__} as an artifact member")
+
+
+def _load_member(entry, path, mmap=True):
+    file = os.path.join(path, entry["file"])
+    if entry["kind"] == "linear":
+        with np.load(file) as data:
+            return LinearMember(data["coef"], data["intercept"])
+    if entry["kind"] == "forest":
+        return FlatForest.load(file, mmap)
+    if entry["kind"] == "xgboost":
+        booster = xgb.Booster()
+        booster.load_model(file)
+        return BoosterMember(booster)
+    raise ValueError(f"Unknown member kind: {entry['kind']}")
+
+
+def artifact_path(city, target, root=ARTIFACT_DIR):
+    return os.path.join(root, city.lower(), target.replace("_next", ""))
+
+
+def latest_version(city, target, root=ARTIFACT_DIR):
+    # Name of the current version ("v0003"), or None if nothing was exported
+    try:
+        with open(os.path.join(artifact_path(city, target, root), LATEST)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _next_version(base):
+    versions = [int(d[1:]) for d in os.listdir(base) if d.startswith("v") and d[1:].isdigit()] \
+        if os.path.isdir(base) else []
+    return f"v{max(versions, default=0) + 1:04d}"
+
+
+def _publish(base, fill):
+    # Builds a new version in a temp directory via fill(tmp, version) -> manifest,
+    # renames it into place and points LATEST at it
+    os.makedirs(base, exist_ok=True)
+    version = _next_version(base)
+    tmp = os.path.join(base, f".tmp-{version}-{os.getpid()}")
+    os.makedirs(tmp)
+    try:
+        manifest = {"format": FORMAT_VERSION, "version": version,
+                    "created": datetime.now(timezone.utc).isoformat(), **fill(tmp)}
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        final = os.path.join(base, version)
+        os.replace(tmp, final)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(base, f"{LATEST}.tmp-{os.getpid()}")
+    with open(pointer, "w") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(base, LATEST))
+    return final
+
+
+def save_artifact(city, target, models, feature_names, weights, train_index=None,
+                  root=ARTIFACT_DIR, extra=None):
+    # models: {member name: fitted model}. Returns the new version directory.
+    def fill(tmp):
+        return {
+            "city": city.lower(),
+            "target": target,
+            "feature_names": list(feature_names),
+            "weights": {name: float(w) for name, w in weights.items()},
+            "members": {name: _export_member(name, model, tmp) for name, model in models.items()},
+            "training_window": None if train_index is None or len(train_index) == 0 else {
+                "start": str(train_index[0]), "end": str(train_index[-1]), "n_rows": len(train_index)},
+            **(extra or {}),
+        }
+
+    return _publish(artifact_path(city, target, root), fill)
+
+
+def update_manifest(city, target, changes, root=ARTIFACT_DIR, models=None):
+    # New version of the LATEST artifact with some manifest fields replaced (e.g.
+    # re-learned weights) and optionally some members replaced by `models`
+    # ({name: fitted model}). Other member files are hard-linked, not re-exported.
+    current = load_artifact(city, target, root)
+    models = models or {}
+    replaced = {current.manifest["members"][name]["file"] for name in models if name in current.manifest["members"]}
+
+    def fill(tmp):
+        for entry in os.listdir(current.path):
+            src, dst = os.path.join(current.path, entry), os.path.join(tmp, entry)
+            if entry == "manifest.json" or entry in replaced:
+                continue
+            if os.path.isdir(src):
+                shutil.copytree(src, dst, copy_function=_link)
+            else:
+                _link(src, dst)
+        manifest = {k: v for k, v in current.manifest.items() if k not in ("format", "version", "created")}
+        members = {**manifest["members"], **{name: _export_member(name, model, tmp) for name, model in models.items()}}
+        return {**manifest, **changes, "members": members, "parent": current.version}
+
+    return _publish(artifact_path(city, target, root), fill)
+
+
+def _link(src, dst):
+    # Versions never modify their files, so they can share them
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+class Artifact:
+    # Opened artifact: manifest in memory, members loaded on first access
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self.mmap = mmap
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{path} uses artifact format {self.manifest.get('format')}, expected "
+                             f"{FORMAT_VERSION}; re-export it with export_artifacts.py")
+        self._members = {}
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    @property
+    def feature_names(self):
+        return self.manifest["feature_names"]
+
+    @property
+    def weights(self):
+        return self.manifest["weights"]
+
+    def member(self, name):
+        if name not in self._members:
+            self._members[name] = _load_member(self.manifest["members"][name], self.path, self.mmap)
+        return self._members[name]
+
+    def members(self):
+        return {name: self.member(name) for name in self.manifest["members"]}
+
+    def predict(self, X):
+        return sum(w * self.member(name).predict(X) for name, w in self.weights.items())
+
+
+def load_artifact(city, target, root=ARTIFACT_DIR, version=None, mmap=True):
+    # Opens the LATEST (or the given) version; raises FileNotFoundError if absent
+    version = version or latest_version(city, target, root)
+    if version is None:
+        raise FileNotFoundError(f"No artifact for {city}/{target} under {root}")
+    return Artifact(os.path.join(artifact_path(city, target, root), version), mmap)
@@ -0,0 +1,227 @@
+# Walk-forward backtesting
+# Forecast origins move forward through time; at each origin the models are
+# trained only on rows before it (optionally leaving a gap) and scored on the next
+# `horizon` rows. Windows are either expanding (all history) or sliding (fixed size).
+#
+# Refits are incremental where the model allows it, so hundreds of origins stay cheap:
+#   - Ridge keeps the sufficient statistics (n, sum x, sum y, X'X, X'y); moving the
+#     window only adds/removes the rows that changed and re-solves a p x p system.
+#   - XGBoost continues boosting from the previous origin's booster for a few extra
+#     rounds on the current window, with a cold refit every `refit_every` origins to
+#     keep the tree count bounded.
+#   - RandomForest has no incremental form; it is refit every `refit_every` origins
+#     and reused in between.
+#
+# run_backtest scores each member's T+1 predictions on the `horizon` rows after the
+# origin. run_recursive_backtest scores true multi-step forecasts instead: from each
+# origin the RecursiveForecaster (forecaster.py) runs `horizon` steps on both targets'
+# members, feeding its own demand / price predictions forward as in production.
+# Given the stored weather forecast vintages, each origin's weather follows the
+# vintage issued before it (weather_forecast.align), never a later one.
+import numpy as np
+import pandas as pd
+from xgboost import XGBRegressor
+
+from ensemble import ENSEMBLE_WEIGHTS, MODEL_PARAMS, EnsembleForecaster, compile_member, evaluate_model, make_model
+from features import FEATURE_SPEC, STEP, STEPS_PER_DAY, lookback
+from weather_forecast import align, covariate_days
+
+
+def walk_forward_splits(n_rows, initial, step=1, horizon=1, gap=0, window="expanding", window_size=None):
+    # Yields (origin, train_idx, test_idx); origin is the first row that is not trained on
+    if window not in ("expanding", "sliding"):
+        raise ValueError(f"Unknown window type: {window}")
+    if window == "sliding" and not window_size:
+        window_size = initial
+    origin = initial
+    while origin + gap + horizon <= n_rows:
+        start = 0 if window == "expanding" else max(0, origin - window_size)
+        yield origin, np.arange(start, origin), np.arange(origin + gap, origin + gap + horizon)
+        origin += step
+
+
+def time_series_folds(n_rows, n_splits):
+    # Expanding-window replacement for KFold: n_splits consecutive test blocks, each
+    # trained only on the rows before it
+    fold_size = n_rows // (n_splits + 1)
+    if fold_size == 0:
+        raise ValueError(f"Not enough rows ({n_rows}) for {n_splits} time-series folds.")
+    initial = n_rows - n_splits * fold_size
+    return [(train_idx, test_idx) for _, train_idx, test_idx in
+            walk_forward_splits(n_rows, initial, step=fold_size, horizon=fold_size)]
+
+
+class IncrementalRidge:
+    # Ridge regression (with intercept, same solution as sklearn's Ridge) kept as
+    # sufficient statistics so rows can be added to or removed from the window
+    def __init__(self, alpha=1.0, n_features=None):
+        self.alpha = alpha
+        self.n = 0
+        if n_features is not None:
+            self._reset(n_features)
+
+    def _reset(self, p):
+        self.sx = np.zeros(p)
+        self.sy = 0.0
+        self.xtx = np.zeros((p, p))
+        self.xty = np.zeros(p)
+
+    def _update(self, X, y, sign):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if self.n == 0 and sign > 0:
+            self._reset(X.shape[1])
+        self.n += sign * len(y)
+        self.sx += sign * X.sum(axis=0)
+        self.sy += sign * y.sum()
+        self.xtx += sign * (X.T @ X)
+        self.xty += sign * (X.T @ y)
+        self.coef_ = None
+
+    def add(self, X, y):
+        self._update(X, y, 1)
+        return self
+
+    def remove(self, X, y):
+        self._update(X, y, -1)
+        return self
+
+    def fit(self, X, y):
+        self.n = 0
+        return self.add(X, y)
+
+    def solve(self):
+        # Centred normal equations: (Sxx + alpha I) w = Sxy, b = mean_y - mean_x . w
+        mean_x = self.sx / self.n
+        mean_y = self.sy / self.n
+        sxx = self.xtx - self.n * np.outer(mean_x, mean_x)
+        sxy = self.xty - self.n * mean_x * mean_y
+        self.coef_ = np.linalg.solve(sxx + self.alpha * np.eye(len(mean_x)), sxy)
+        self.intercept_ = mean_y - mean_x @ self.coef_
+        return self
+
+    def predict(self, X):
+        if self.coef_ is None:
+            self.solve()
+        return np.asarray(X, dtype=np.float64) @ self.coef_ + self.intercept_
+
+
+class WalkForwardModel:
+    # Wraps one ensemble member and decides, per origin, between an incremental
+    # update and a cold refit
+    def __init__(self, name, params=None, refit_every=10, warm_rounds=10):
+        self.name = name
+        self.params = dict(MODEL_PARAMS[name] if params is None else params)
+        self.refit_every = refit_every
+        self.warm_rounds = warm_rounds
+        self.model = None
+        self.window = (0, 0)
+        self.origins_since_refit = 0
+        self._compiled = (None, None)
+
+    def update(self, X, y, start, stop):
+        # Bring the model to training window [start, stop) of X / y
+        cold = self.model is None or self.origins_since_refit >= self.refit_every
+        if self.name == "ridge":
+            self._update_ridge(X, y, start, stop)
+        elif cold or self.name == "rf":
+            if cold:
+                self.model = make_model(self.name, self.params).fit(X[start:stop], y[start:stop])
+                self.origins_since_refit = 0
+        else:
+            # Continue boosting from the previous booster on the current window
+            warm = XGBRegressor(**{**self.params, "n_estimators": self.warm_rounds},
+                                n_jobs=self.model.get_params().get("n_jobs"))
+            self.model = warm.fit(X[start:stop], y[start:stop], xgb_model=self.model.get_booster())
+        self.origins_since_refit += 1
+        self.window = (start, stop)
+
+    def _update_ridge(self, X, y, start, stop):
+        old_start, old_stop = self.window
+        if self.model is None or start < old_start or stop < old_stop or start >= old_stop:
+            self.model = IncrementalRidge(alpha=self.params.get("alpha", 1.0)).fit(X[start:stop], y[start:stop])
+        else:
+            if stop > old_stop:
+                self.model.add(X[old_stop:stop], y[old_stop:stop])
+            if start > old_start:
+                self.model.remove(X[old_start:start], y[old_start:start])
+        self.model.solve()
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+    def member(self):
+        # Prediction-only form for an EnsembleForecaster; recompiled only when the model
+        # changed (Ridge is updated in place, so always)
+        if self._compiled[0] is not self.model or self.name == "ridge":
+            self._compiled = (self.model, compile_member(self.model))
+        return self._compiled[1]
+
+
+def run_backtest(X, y, index, models=tuple(MODEL_PARAMS), params=None, initial=30, step=1,
+                 horizon=1, gap=0, window="expanding", window_size=None, refit_every=10,
+                 warm_rounds=10, weights=ENSEMBLE_WEIGHTS):
+    # Returns one row per (origin, model) with MAE / RMSE on that origin's horizon
+    params = params or {}
+    members = {name: WalkForwardModel(name, params.get(name), refit_every, warm_rounds) for name in models}
+    rows = []
+    for origin, train_idx, test_idx in walk_forward_splits(len(y), initial, step, horizon, gap, window, window_size):
+        preds = {}
+        for name, member in members.items():
+            member.update(X, y, train_idx[0], train_idx[-1] + 1)
+            preds[name] = member.predict(X[test_idx])
+        if all(name in preds for name in weights):
+            preds["ensemble"] = sum(weights[name] * preds[name] for name in weights)
+
+        for name, pred in preds.items():
+            mae, rmse = evaluate_model(y[test_idx], pred)
+            rows.append({"origin": index[origin], "model": name, "n_train": len(train_idx),
+                         "horizon": len(test_idx), "MAE": mae, "RMSE": rmse})
+    return pd.DataFrame(rows)
+
+
+def run_recursive_backtest(city, features, X, ys, index, feature_cols, models=tuple(MODEL_PARAMS), params=None,
+                           initial=30, step=1, horizon=STEPS_PER_DAY, gap=0, window="expanding",
+                           window_size=None, refit_every=10, warm_rounds=10, weights=ENSEMBLE_WEIGHTS,
+                           spec=FEATURE_SPEC, vintages=None):
+    # Returns one row per (origin, target) with the MAE / RMSE of the ensemble's
+    # `horizon`-step recursive forecast from that origin.
+    # features: the feature table rows of X (raw sources included), ys: {target: labels}
+    # params: {target: {model: params}}; weights: {name: w} or {target: {name: w}}
+    # vintages: weather_forecast/{city} rows; without them the weather holds its last value
+    from forecaster import RecursiveForecaster, ZoneState  # forecaster imports cv_engine, which imports this module
+
+    params = params or {}
+    members = {target: {name: WalkForwardModel(name, params.get(target, {}).get(name), refit_every, warm_rounds)
+                        for name in models} for target in ys}
+    actual = {target: pd.Series(y, index=index) for target, y in ys.items()}
+    n_days = -(-horizon // STEPS_PER_DAY)
+    splits = list(walk_forward_splits(len(index), initial, step, horizon, gap, window, window_size))
+    # The forecast starts from the last row before the test rows
+    starts = index[[origin + gap for origin, _, _ in splits]]
+    weather = align(starts, vintages, n_days) if vintages is not None and len(vintages) else None
+    rows = []
+    for i, (origin, train_idx, _) in enumerate(splits):
+        last = origin + gap
+        if last + 1 < lookback(spec):
+            continue
+        for target, ms in members.items():
+            for member in ms.values():
+                member.update(X, ys[target], train_idx[0], train_idx[-1] + 1)
+        ensemble = EnsembleForecaster({target: {name: m.member() for name, m in ms.items()}
+                                       for target, ms in members.items()}, weights, feature_cols)
+        zone = ZoneState(city, features.iloc[:last + 1], ensemble, spec)
+        covariates = None if weather is None else {city: covariate_days(weather.iloc[i], starts[i], n_days)}
+        out = RecursiveForecaster([zone], covariates).run(n_days)[city]
+        # Step k predicts the value at index[last] + (k + 1) * STEP, the label of row index[last] + k * STEP
+        labelled = index[last] + np.arange(horizon) * STEP
+        for target, series in actual.items():
+            truth = series.reindex(labelled).to_numpy()
+            pred = out[target][:horizon, 0]
+            known = ~np.isnan(truth)
+            if not known.any():
+                continue
+            mae, rmse = evaluate_model(truth[known], pred[known])
+            rows.append({"origin": index[last], "target": target, "model": "ensemble",
+                         "n_train": len(train_idx), "horizon": int(known.sum()), "MAE": mae, "RMSE": rmse})
+    return pd.DataFrame(rows)
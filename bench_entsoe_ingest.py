@@ -0,0 +1,30 @@
+# Benchmark the concurrent ENTSO-E flow against the fake client
+# Usage: python bench_entsoe_ingest.py [n_zones] [max_workers]
+import os
+import sys
+import tempfile
+import time
+
+# Configure the fake client and a throwaway data dir before importing the flow
+os.environ["ENTSOE_FAKE"] = "1"
+os.environ.setdefault("ENTSOE_FAKE_LATENCY", "0.5")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="entsoe_bench_")
+
+from entsoe_tasks import entsoe_flow
+
+n_zones = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+regions = {f"Zone{i:02d}": ("NO_1" if i % 3 == 0 else f"Z_{i}") for i in range(n_zones)}
+start_date, end_date = "2025-01-01", "2025-01-08"
+latency = float(os.environ["ENTSOE_FAKE_LATENCY"])
+
+print(f"{n_zones} zones x 2 series, fake latency {latency:.2f}s per request")
+for workers in [1, max_workers]:
+    t0 = time.perf_counter()
+    entsoe_flow(start_date, end_date, max_workers=workers, regions=regions)
+    elapsed = time.perf_counter() - t0
+    print(f"max_workers={workers:>3}: {elapsed:.2f}s")
+
+print(f"Lower bound (slowest single request): {latency:.2f}s")
+print(f"Output written to: {os.environ['DATA_DIR']}")
@@ -0,0 +1,44 @@
+# Benchmark the async weather collector against the local stub (fake_weather.py)
+# Usage: python bench_weather_ingest.py [n_locations] [max_concurrency]
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Throwaway data dir before importing the collector
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="weather_bench_")
+
+import fake_weather
+from weather_collector import collect
+
+n_locations = int(sys.argv[1]) if len(sys.argv) > 1 else 53
+max_concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+latency = float(os.getenv("WEATHER_FAKE_LATENCY", "0.2"))
+
+
+def requests_for(n):
+    return [(f"Loc{i:02d}", 55 + i * 0.1, 10 + i * 0.1, None) for i in range(n)]
+
+
+async def main():
+    runner, url = await fake_weather.start(latency=latency)
+    try:
+        print(f"Fake latency {latency:.2f}s per request")
+        for n, workers in [(3, 1), (n_locations, 1), (3, max_concurrency), (n_locations, max_concurrency)]:
+            cache_dir = tempfile.mkdtemp(prefix="weather_cache_")
+            t0 = time.perf_counter()
+            frames, errors = await collect(requests_for(n), api_url=url, max_concurrency=workers,
+                                           cache_dir=cache_dir)
+            elapsed = time.perf_counter() - t0
+            print(f"{n:>3} locations, max_concurrency={workers:>3}: {elapsed:.2f}s ({len(errors)} failed)")
+            t0 = time.perf_counter()
+            await collect(requests_for(n), api_url=url, max_concurrency=workers, cache_dir=cache_dir)
+            print(f"{'':>3} same run again (cached): {time.perf_counter() - t0:.3f}s")
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    finally:
+        await runner.cleanup()
+
+
+asyncio.run(main())
@@ -0,0 +1,30 @@
+# Compaction of the append-only ingest log
+# Folds pending segments of the raw datasets into their month partitions
+# (duplicates resolved last-writer-wins, rows sorted). Readers already see the
+# merged view before this runs; compaction just keeps reads cheap.
+# Usage: python compact_store.py [--all]   (--all ignores COMPACT_MIN_SEGMENTS)
+import sys
+
+from prefect import flow, task
+
+import storage
+from config import COMPACT_MIN_SEGMENTS, RAW_DATASETS
+
+
+@task
+def compact_zone(dataset, zone):
+    n = storage.compact(dataset, zone)
+    print(f"Compacted {n} segments into {dataset}/{zone}")
+    return n
+
+
+@flow
+def compaction_flow(min_segments=COMPACT_MIN_SEGMENTS):
+    for dataset in RAW_DATASETS:
+        for zone in storage.list_zones(dataset):
+            if len(storage.list_segments(dataset, zone)) >= min_segments:
+                compact_zone(dataset, zone)
+
+
+if __name__ == "__main__":
+    compaction_flow(min_segments=1 if "--all" in sys.argv else COMPACT_MIN_SEGMENTS)
@@ -0,0 +1,118 @@
+# Shared project configuration
+import os
+
+# Root folder for all data files (override with DATA_DIR, e.g. for benchmarks)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+# City -> ENTSO-E bidding zone
+REGIONS = {
+    "Stockholm": "SE_3",
+    "Oslo": "NO_1",
+    "Copenhagen": "DK_1"
+}
+
+# Zone keys used in the store (lower-case city names)
+CITIES = [city.lower() for city in REGIONS]
+
+# ENTSO-E ingestion: max number of API requests in flight at once,
+# and retry policy applied per zone/series
+ENTSOE_MAX_WORKERS = int(os.getenv("ENTSOE_MAX_WORKERS", "4"))
+ENTSOE_RETRIES = int(os.getenv("ENTSOE_RETRIES", "3"))
+ENTSOE_RETRY_BACKOFF = float(os.getenv("ENTSOE_RETRY_BACKOFF", "2"))
+
+# Incremental fetching: first run backfills this many days, later runs start
+# at the stored watermark minus a small overlap to pick up revised values
+ENTSOE_BACKFILL_DAYS = int(os.getenv("ENTSOE_BACKFILL_DAYS", "60"))
+ENTSOE_OVERLAP_HOURS = int(os.getenv("ENTSOE_OVERLAP_HOURS", "24"))
+
+# Weather collection (weather_collector.py): location of each city, API base URL
+# (point it at fake_weather.py for a local stub), requests in flight, retry policy
+# for 429 / 5xx responses, per-request timeout and the on-disk response cache
+WEATHER_LOCATIONS = {
+    "Stockholm": (59.3293, 18.0686),
+    "Oslo": (59.9139, 10.7522),
+    "Copenhagen": (55.6761, 12.5683),
+}
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.openweathermap.org")
+WEATHER_MAX_CONCURRENCY = int(os.getenv("WEATHER_MAX_CONCURRENCY", "16"))
+WEATHER_RETRIES = int(os.getenv("WEATHER_RETRIES", "4"))
+WEATHER_RETRY_BACKOFF = float(os.getenv("WEATHER_RETRY_BACKOFF", "1"))
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "30"))
+WEATHER_CACHE_DIR = os.getenv("WEATHER_CACHE_DIR", os.path.join(DATA_DIR, "weather_cache"))
+
+# Append-only ingest log: raw datasets written through storage.append, and the
+# number of pending segments per zone that triggers compaction
+RAW_DATASETS = ["demand", "price", "weather", "weather_forecast"]
+COMPACT_MIN_SEGMENTS = int(os.getenv("COMPACT_MIN_SEGMENTS", "24"))
+
+# Time zone of the naive timestamps in the raw demand / price series (market time)
+SOURCE_TZ = "Europe/Brussels"
+
+# Streaming anomaly detection on ingest (anomaly.py): robust z-score above which an
+# observation is flagged, step of the running median / MAD per observation (as a
+# fraction of the MAD) for the level and for the hour-of-week profile, observations
+# before scores are issued, observations an hour-of-week slot needs before it is
+# used, the flag directions per series, the flag kinds the ETL masks out, and the
+# days of history the optional IsolationForest is refitted on
+ANOMALY_DIR = os.getenv("ANOMALY_DIR", os.path.join(DATA_DIR, "anomaly"))
+ANOMALY_THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "6"))
+ANOMALY_ADAPT = float(os.getenv("ANOMALY_ADAPT", "0.05"))
+ANOMALY_SEASON_ADAPT = float(os.getenv("ANOMALY_SEASON_ADAPT", "0.2"))
+ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "48"))
+ANOMALY_SEASON_MIN = int(os.getenv("ANOMALY_SEASON_MIN", "3"))
+ANOMALY_DIRECTIONS = {"demand": ["drop", "spike"], "price": ["spike"]}
+ANOMALY_MASK_KINDS = [k for k in os.getenv("ANOMALY_MASK_KINDS", "drop").split(",") if k]
+ANOMALY_FOREST_DAYS = int(os.getenv("ANOMALY_FOREST_DAYS", "90"))
+
+# Native resolution of the processed and feature layers (pandas frequency: "15min",
+# "h" or "D") and how each power column is brought to it: "agg" when the source is
+# finer, "fill" ("ffill" or "interpolate") across one source period when it is
+# coarser. Daily weather is matched by date, i.e. held over the day.
+RESOLUTION = os.getenv("RESOLUTION", "D")
+RESAMPLE_RULES = {
+    "Actual Load": {"agg": "mean", "fill": "interpolate"},
+    "Price": {"agg": "mean", "fill": "ffill"},
+}
+DEFAULT_RESAMPLE_RULE = {"agg": "mean", "fill": "ffill"}
+
+# Gap filling (impute.py), per processed column: gaps of up to max_gap are
+# interpolated ("time" or "linear"), longer ones filled by "long": "seasonal" (the
+# value one season earlier, e.g. the same hour last week, or later), "model" (least
+# squares on calendar terms and the covariates) or None (left missing). Only gaps
+# inside a column's observed span are filled; each column gets a {col}_imputed code.
+IMPUTE_RULES = {
+    "Actual Load": {"method": "time", "max_gap": "3h", "long": "model", "covariates": ["temp_C"]},
+    "Price": {"method": "time", "max_gap": "3h", "long": "seasonal", "season": "7D"},
+    "temp_C": {"method": "time", "max_gap": "3D", "long": "model", "covariates": []},
+}
+DEFAULT_IMPUTE_RULE = {"method": "time", "max_gap": "3D", "long": "seasonal", "season": "1D"}
+
+# Out-of-core ETL: months of raw data per chunk (0 = each city in one pass)
+ETL_CHUNK_MONTHS = int(os.getenv("ETL_CHUNK_MONTHS", "0"))
+
+# Process pool used by the modelling scripts: number of concurrent per-city /
+# per-target jobs (default: all cores) and CPU threads given to each job
+# (default: cores / workers)
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "0")) or (os.cpu_count() or 1)
+THREADS_PER_JOB = int(os.getenv("THREADS_PER_JOB", "0")) or None
+
+# Direct multi-horizon models: one target column per day ahead, 1..FORECAST_HORIZON
+FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", "14"))
+
+# Forecast service (forecast_service.py): listen address, how long the batcher
+# waits to collect concurrent requests, largest batch, and how often the model
+# registry checks for new artifacts
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+SERVICE_BATCH_WAIT_MS = float(os.getenv("SERVICE_BATCH_WAIT_MS", "5"))
+SERVICE_MAX_BATCH = int(os.getenv("SERVICE_MAX_BATCH", "256"))
+SERVICE_RELOAD_SECONDS = float(os.getenv("SERVICE_RELOAD_SECONDS", "10"))
+
+# Feature store (feature_store.py): cached float32 feature matrices, evicted
+# least-recently-used first once they take more than this many bytes
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", os.path.join(DATA_DIR, "feature_cache"))
+FEATURE_CACHE_MAX_BYTES = int(float(os.getenv("FEATURE_CACHE_MAX_BYTES", str(2 * 1024**3))))
+
+# Months of processed data turned into features at a time (plus the months their
+# lags need), which bounds memory for long 15-minute histories
+FEATURE_CHUNK_MONTHS = int(os.getenv("FEATURE_CHUNK_MONTHS", "6"))
@@ -0,0 +1,193 @@
+# Cross-validation engine for the Ridge + RandomForest + XGBoost ensemble
+# For each city the feature store (feature_store.py) provides one float32 matrix
+# (plus one label vector per target) as cached .npy files that every worker
+# memory-maps read-only, so all fold x model x target jobs share the same pages
+# instead of receiving their own copy. Jobs run concurrently on the
+# process pool from parallel.py; out-of-fold predictions and the final full-data
+# models are collected back in deterministic order.
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import storage
+from artifacts import save_artifact
+from backtest import IncrementalRidge, time_series_folds
+from ensemble import (ENSEMBLE_WEIGHTS, MODEL_NAMES, MODEL_PARAMS,
+                      evaluate_model, make_model)
+from feature_store import load_matrix
+from features import TARGET_SOURCES, feature_columns  # noqa: F401 (re-exported)
+from parallel import run_jobs
+from stacking import forward_blend, oof_dataset, solve_weights
+
+TARGETS = list(TARGET_SOURCES)
+
+N_SPLITS = 5
+
+# Rows per block when the final Ridge's sufficient statistics are accumulated
+STATS_CHUNK_ROWS = 65536
+
+# Best parameters found by tuning.py: {city: {target: {model: params}}}
+TUNED_PARAMS_FILE = os.path.join('models', 'tuning', 'best_params.json')
+
+
+def load_tuned_params(path=TUNED_PARAMS_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def model_params(city, target, params=None, tuned=None):
+    # Defaults, then tuned parameters for this zone/target, then explicit overrides
+    tuned = (tuned or {}).get(city, {}).get(target, {})
+    return {name: {**MODEL_PARAMS[name], **tuned.get(name, {}), **(params or {}).get(name, {})}
+            for name in MODEL_PARAMS}
+
+
+def build_matrix(city, targets):
+    # One float32 matrix per city from the feature store, memory-mapped by every job;
+    # built once and reused until the processed data or the feature spec changes
+    return load_matrix(city, targets)
+
+
+def _fit_predict(x_path, y_path, train_idx, test_idx, model_name, params, feature_cols):
+    # Runs in a worker: the matrices are memory-mapped, not copied through the pool
+    X = np.load(x_path, mmap_mode="r")
+    y = np.load(y_path, mmap_mode="r")
+    if test_idx is None:
+        # Final model on the full data; fitted with column names so callers can
+        # keep predicting from DataFrames
+        X_full = pd.DataFrame(np.asarray(X), columns=feature_cols)
+        return make_model(model_name, params).fit(X_full, y)
+    model = make_model(model_name, params).fit(X[train_idx], y[train_idx])
+    return model.predict(X[test_idx])
+
+
+def run_cv(cities, targets=TARGETS, models=tuple(MODEL_PARAMS), params=None,
+           n_splits=N_SPLITS, max_workers=None, threads_per_job=None, use_tuned=True):
+    # Returns {(city, target): {"y_true", "oof": {model: preds}, "final": {model: fitted},
+    #                           "folds", "y", "x_path", "feature_cols"}}
+    # Parameters per zone/target: tuned ones from tuning.py (if use_tuned) with
+    # `params` ({model: {param: value}}) applied on top
+    tuned = load_tuned_params() if use_tuned else {}
+    matrices = {city: build_matrix(city, targets) for city in cities}
+
+    jobs = []
+    folds = {}
+    for city, m in matrices.items():
+        # Expanding-window folds: each test block is trained only on earlier rows
+        folds[city] = time_series_folds(m["n_rows"], n_splits)
+        for target in targets:
+            target_params = model_params(city, target, params, tuned)
+            for model_name in models:
+                for fold, (train_idx, test_idx) in enumerate(folds[city]):
+                    jobs.append(((city, target, model_name, fold),
+                                 (m["paths"]["X"], m["paths"][target], train_idx, test_idx,
+                                  model_name, target_params[model_name], None)))
+                jobs.append(((city, target, model_name, "final"),
+                             (m["paths"]["X"], m["paths"][target], None, None,
+                              model_name, target_params[model_name], m["feature_cols"])))
+
+    outputs = run_jobs(_fit_predict, jobs, max_workers, threads_per_job)
+
+    results = {}
+    for city, m in matrices.items():
+        for target in targets:
+            y = np.load(m["paths"][target])
+            test_order = np.concatenate([test_idx for _, test_idx in folds[city]])
+            oof = {name: np.concatenate([outputs[(city, target, name, f)] for f in range(n_splits)])
+                   for name in models}
+            results[(city, target)] = {
+                "y_true": y[test_order],
+                "oof": oof,
+                # Blend weights stacked on the OOF predictions (fixed ones if a
+                # member of the default blend was not run)
+                "weights": solve_weights(oof, y[test_order]) if set(models) >= set(ENSEMBLE_WEIGHTS)
+                else ENSEMBLE_WEIGHTS,
+                "test_order": test_order,
+                "final": {name: outputs[(city, target, name, "final")] for name in models},
+                "folds": folds[city],
+                "y": y,
+                "x_path": m["paths"]["X"],
+                "feature_cols": m["feature_cols"],
+                "index": m["index"],
+            }
+    return results
+
+
+def ensemble_prediction(oof, weights=ENSEMBLE_WEIGHTS):
+    return sum(weights[name] * oof[name] for name in weights)
+
+
+def report(result, label):
+    # Print the per-model and ensemble CV metrics for one (city, target)
+    y_true = result["y_true"]
+    print(f"\nResults for {label} Prediction:")
+    for name, preds in result["oof"].items():
+        mae, rmse = evaluate_model(y_true, preds)
+        print(f"{MODEL_NAMES[name]}: MAE = {mae:.2f}, RMSE = {rmse:.2f}")
+
+    fixed = ensemble_prediction(result["oof"])
+    mae_f, rmse_f = evaluate_model(y_true, fixed)
+    print(f"Ensemble (fixed weights): MAE = {mae_f:.2f}, RMSE = {rmse_f:.2f}")
+
+    ensemble = ensemble_prediction(result["oof"], result["weights"])
+    mae_e, rmse_e = evaluate_model(y_true, ensemble)
+    shown = ", ".join(f"{name}={w:.2f}" for name, w in result["weights"].items())
+    print(f"Ensemble (stacked {shown}, in-sample): MAE = {mae_e:.2f}, RMSE = {rmse_e:.2f}")
+
+    # The weights above are solved on the same OOF rows; out of sample, each fold is
+    # blended with weights solved on the folds before it
+    sizes = [len(test_idx) for _, test_idx in result["folds"]]
+    if set(result["oof"]) >= set(ENSEMBLE_WEIGHTS) and len(sizes) > 1:
+        forward, start = forward_blend(result["oof"], y_true, sizes)
+        mae_o, rmse_o = evaluate_model(y_true[start:], forward)
+        mae_fo, _ = evaluate_model(y_true[start:], fixed[start:])
+        print(f"Ensemble (stacked on earlier folds, folds 2-{len(sizes)}): MAE = {mae_o:.2f}, "
+              f"RMSE = {rmse_o:.2f} (fixed weights on the same rows: MAE = {mae_fo:.2f})")
+
+    # Dummy baseline on the last fold (mean of its training labels)
+    train_idx, test_idx = result["folds"][-1]
+    y = result["y"]
+    dummy_pred = [np.mean(y[train_idx])] * len(test_idx)
+    dummy_mae, dummy_rmse = evaluate_model(y[test_idx], dummy_pred)
+    print(f"Dummy baseline: MAE = {dummy_mae:.2f}, RMSE = {dummy_rmse:.2f}")
+    return ensemble
+
+
+def save_oof(result, city, target):
+    # oof_{demand,price}/{city}: y_true plus each member's OOF predictions, so the
+    # weights can be re-solved (stacking.py) without retraining
+    frame = pd.DataFrame({"y_true": result["y_true"], **result["oof"]},
+                         index=result["index"][result["test_order"]])
+    storage.write_frame(oof_dataset(target), city, frame, mode="overwrite")
+
+
+def artifact_members(result):
+    # The final members as exported: Ridge as an IncrementalRidge carrying its
+    # sufficient statistics, so online updates (online.py) never revisit the history
+    members = dict(result["final"])
+    if "ridge" in members:
+        X = np.load(result["x_path"], mmap_mode="r")
+        ridge = IncrementalRidge(alpha=members["ridge"].alpha, n_features=X.shape[1])
+        for lo in range(0, len(X), STATS_CHUNK_ROWS):
+            ridge.add(X[lo:lo + STATS_CHUNK_ROWS], result["y"][lo:lo + STATS_CHUNK_ROWS])
+        members["ridge"] = ridge.solve()
+    return members
+
+
+def save_final_models(result, city, target, model_path='models'):
+    # models/{ridge,rf,xgb}_{demand,price}_{city}.pkl, plus a compact artifact under
+    # models/artifacts/{city}/{demand,price}/ (with the stacked weights) that the
+    # forecasters load, and the cached OOF predictions
+    os.makedirs(model_path, exist_ok=True)
+    short = target.replace('_next', '')
+    for name, model in result["final"].items():
+        with open(f"{model_path}/{name}_{short}_{city}.pkl", 'wb') as f:
+            pickle.dump(model, f)
+    save_oof(result, city, target)
+    return save_artifact(city, target, artifact_members(result), result["feature_cols"], result["weights"],
+                         result["index"], root=os.path.join(model_path, "artifacts"))
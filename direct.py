@@ -0,0 +1,159 @@
+# Direct multi-horizon forecasting
+# Instead of feeding T+1 predictions back as inputs (forecaster.py), one model per
+# horizon h = 1..H learns the value h days ahead straight from today's features
+# (at sub-daily resolution: from the latest row, the value h * 24 hours later):
+#
+#   direct_targets/{city}: demand_next_1 .. demand_next_H, price_next_1 .. price_next_H
+#
+# The targets are built by 18_feature engineering.py in one sliding-window pass and
+# stored next to the feature table (same index), so the T+1 feature table used by
+# every other script is unchanged. Horizons are independent: training fans out over
+# city x target x horizon x model on the process pool, and a forecast is one batched
+# EnsembleForecaster call covering every horizon, with no chain between days.
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import storage
+from config import FORECAST_HORIZON
+from ensemble import ENSEMBLE_WEIGHTS, MODEL_PARAMS, EnsembleForecaster, make_model
+from feature_store import load_matrix
+from features import STEPS_PER_DAY
+from forecaster import MODEL_DIR, forecast_dates, load_history
+from parallel import run_jobs
+
+# Target prefix -> source column
+SOURCES = {"demand": "Actual Load", "price": "Price"}
+
+
+def target_name(short, h):
+    return f"{short}_next_{h}"
+
+
+def horizon_targets(df, horizon=FORECAST_HORIZON, sources=SOURCES, steps_per_day=STEPS_PER_DAY):
+    # Row t gets the values 1 .. horizon days later; rows too close to the end are NaN
+    cols = {}
+    for short, col in sources.items():
+        values = df[col].to_numpy(dtype=np.float64)
+        padded = np.concatenate([values, np.full(horizon * steps_per_day, np.nan)])
+        for h in range(1, horizon + 1):
+            cols[target_name(short, h)] = padded[h * steps_per_day:h * steps_per_day + len(values)]
+    return pd.DataFrame(cols, index=df.index)
+
+
+def build_direct_matrix(city, shorts, workdir):
+    # Feature matrix from the feature store plus one (n_rows, horizon) label matrix
+    # per target prefix, aligned to its rows
+    m = load_matrix(city, targets=[])
+    targets = storage.read_frame("direct_targets", city).reindex(m["index"])
+    horizon = max(int(c.rsplit("_", 1)[1]) for c in targets.columns)
+
+    paths = {"X": m["paths"]["X"]}
+    for short in shorts:
+        paths[short] = os.path.join(workdir, f"{city}_{short}_direct.npy")
+        cols = [target_name(short, h) for h in range(1, horizon + 1)]
+        np.save(paths[short], targets[cols].to_numpy(dtype=np.float64))
+    return {"paths": paths, "feature_cols": m["feature_cols"], "horizon": horizon}
+
+
+def _fit_horizon(x_path, y_path, h, model_name, params, feature_cols):
+    # Runs in a worker; rows whose h-step target lies beyond the data are dropped
+    X = np.load(x_path, mmap_mode="r")
+    y = np.load(y_path, mmap_mode="r")[:, h - 1]
+    mask = ~np.isnan(y)
+    X_h = pd.DataFrame(np.asarray(X)[mask], columns=feature_cols)
+    return make_model(model_name, params).fit(X_h, y[mask])
+
+
+def train_direct(cities, shorts=tuple(SOURCES), horizon=None, models=tuple(ENSEMBLE_WEIGHTS),
+                 params=None, max_workers=None, threads_per_job=None):
+    # Returns {(city, short): {h: {model name: fitted model}}}
+    params = {**MODEL_PARAMS, **(params or {})}
+    workdir = tempfile.mkdtemp(prefix="direct_matrices_")
+    try:
+        matrices = {city: build_direct_matrix(city, shorts, workdir) for city in cities}
+        jobs = []
+        for city, m in matrices.items():
+            n_horizons = min(horizon or m["horizon"], m["horizon"])
+            for short in shorts:
+                for h in range(1, n_horizons + 1):
+                    for name in models:
+                        jobs.append(((city, short, h, name),
+                                     (m["paths"]["X"], m["paths"][short], h, name, params[name],
+                                      m["feature_cols"])))
+        outputs = run_jobs(_fit_horizon, jobs, max_workers, threads_per_job)
+
+        results = {}
+        for (city, short, h, name), model in outputs.items():
+            results.setdefault((city, short), {}).setdefault(h, {})[name] = model
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def save_direct_models(models_by_horizon, city, short, model_path=MODEL_DIR):
+    # models/direct_{demand,price}_{city}.pkl: {h: {model name: fitted model}}
+    os.makedirs(model_path, exist_ok=True)
+    with open(f"{model_path}/direct_{short}_{city}.pkl", "wb") as f:
+        pickle.dump(models_by_horizon, f)
+
+
+def load_direct_models(city, short, model_path=MODEL_DIR):
+    with open(f"{model_path}/direct_{short}_{city}.pkl", "rb") as f:
+        return pickle.load(f)
+
+
+class DirectForecaster:
+    # One EnsembleForecaster per city whose targets are the horizons
+    # (demand_next_1 .. price_next_H), plus each city's latest feature row
+    def __init__(self, models, last_rows, weights=ENSEMBLE_WEIGHTS):
+        # models: {city: {short: {h: {name: fitted model}}}}
+        self.ensembles = {}
+        for city, per_city in models.items():
+            members = {target_name(short, h): by_h[h] for short, by_h in per_city.items() for h in by_h}
+            feature_names = next(iter(next(iter(members.values())).values())).feature_names_in_
+            self.ensembles[city] = EnsembleForecaster(members, weights, feature_names)
+        self.shorts = {city: list(per_city) for city, per_city in models.items()}
+        self.horizons = {city: min(max(by_h) for by_h in per_city.values()) for city, per_city in models.items()}
+        self.last_rows = last_rows
+
+    @classmethod
+    def from_store(cls, cities, model_dir=MODEL_DIR, shorts=tuple(SOURCES), weights=ENSEMBLE_WEIGHTS):
+        models, last_rows = {}, {}
+        for city in cities:
+            try:
+                models[city] = {short: load_direct_models(city, short, model_dir) for short in shorts}
+            except FileNotFoundError as e:
+                print(f"Direct model missing for {city}: {e}")
+                continue
+            last_rows[city] = load_history(city).iloc[[-1]]
+        return cls(models, last_rows, weights)
+
+    def horizon(self, city):
+        return self.horizons[city]
+
+    def predict(self, city, X, n_days=None):
+        # X: feature rows, one per forecast origin. Returns {short: (n_rows, n_days) array};
+        # every horizon is an independent model, all evaluated in one batched call.
+        n_days = n_days or self.horizon(city)
+        if n_days > self.horizon(city):
+            raise ValueError(f"{city} has direct models up to {self.horizon(city)} days, not {n_days}.")
+        preds = self.ensembles[city].predict(X)
+        return {short: np.column_stack([preds[target_name(short, h)] for h in range(1, n_days + 1)])
+                for short in self.shorts[city]}
+
+    def forecast(self, n_days=7):
+        # Same output as RecursiveForecaster.forecast: {city: DataFrame}
+        if not isinstance(n_days, int) or n_days <= 0:
+            raise ValueError("n_days must be a positive integer.")
+        results = {}
+        for city, row in self.last_rows.items():
+            preds = self.predict(city, row, n_days)
+            dates = forecast_dates(row.index[-1], n_days, step=pd.Timedelta(days=1))
+            results[city] = pd.DataFrame({f"predicted_{short}": p[0] for short, p in preds.items()},
+                                         index=dates)
+        return results
@@ -0,0 +1,130 @@
+# Ensemble members shared by training, validation, backtesting and inference
+# Ridge + RandomForest + XGBoost, blended with fixed weights.
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from xgboost import XGBRegressor
+
+from artifacts import (ARTIFACT_DIR, MEMBER_TYPES, BoosterMember, FlatForest, LinearMember,
+                       load_artifact)
+from parallel import job_threads
+
+# Parameters for models
+MODEL_PARAMS = {
+    'ridge': {'alpha': 1.0, 'random_state': 42},
+    'rf': {'n_estimators': 100, 'random_state': 42},
+    'xgb': {'objective': 'reg:squarederror', 'n_estimators': 100, 'random_state': 42},
+}
+MODEL_NAMES = {'ridge': 'Ridge', 'rf': 'Random Forest', 'xgb': 'XGBoost'}
+ENSEMBLE_WEIGHTS = {'ridge': 0.2, 'rf': 0.3, 'xgb': 0.5}
+
+
+def evaluate_model(y_true, y_pred):
+    mae = mean_absolute_error(y_true, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_true, y_pred))
+    return mae, rmse
+
+
+def make_model(name, params=None):
+    params = MODEL_PARAMS[name] if params is None else params
+    if name == 'ridge':
+        return Ridge(**params)
+    if name == 'rf':
+        return RandomForestRegressor(**params, n_jobs=job_threads())
+    if name == 'xgb':
+        return XGBRegressor(**params, n_jobs=job_threads())
+    raise ValueError(f"Unknown model: {name}")
+
+
+def compile_member(model):
+    # Prediction-only form of a fitted member: Ridge -> coefficients, RF -> flat node
+    # arrays, XGBoost -> raw booster. All take a bare float32 matrix, no DataFrame
+    # validation per call.
+    if isinstance(model, MEMBER_TYPES):
+        return model
+    if hasattr(model, "coef_") and hasattr(model, "intercept_"):  # Ridge and other linear models
+        return LinearMember(np.asarray(model.coef_, dtype=np.float64), model.intercept_)
+    if isinstance(model, RandomForestRegressor):
+        return FlatForest.from_forest(model)
+    if isinstance(model, XGBRegressor):
+        return BoosterMember(model.get_booster())
+    raise TypeError(f"Unsupported ensemble member: {type(model).__name__}")
+
+
+class EnsembleForecaster:
+    # Weighted Ridge + RF + XGBoost ensembles for one or more targets (e.g. demand
+    # and price of one zone) behind a single predict call on a float32 matrix.
+    # Large batches run the members concurrently on a thread pool (NumPy and
+    # XGBoost release the GIL); small ones run inline, where dispatch would cost
+    # more than the work. Picklable: the pool is recreated on demand.
+    #
+    #   ens = EnsembleForecaster({"demand_next": {...}, "price_next": {...}}, feature_names=cols)
+    #   preds = ens.predict(X)        # {"demand_next": array, "price_next": array}
+    CONCURRENT_MIN_ROWS = 2048
+
+    def __init__(self, members, weights=ENSEMBLE_WEIGHTS, feature_names=None, max_workers=None):
+        # members: {target: {name: fitted model}}
+        # weights: {name: weight} for every target, or {target: {name: weight}}
+        self.members = {target: {name: compile_member(m) for name, m in ms.items()}
+                        for target, ms in members.items()}
+        per_target = isinstance(next(iter(weights.values())), dict)
+        self.weights = {target: dict(weights[target] if per_target else weights) for target in self.members}
+        self.feature_names = None if feature_names is None else list(feature_names)
+        self.max_workers = max_workers
+        self._pool = None
+
+    @classmethod
+    def from_artifacts(cls, city, targets, root=ARTIFACT_DIR, weights=None, max_workers=None):
+        # Weights default to the ones recorded in each target's manifest
+        artifacts = {target: load_artifact(city, target, root) for target in targets}
+        names = {tuple(a.feature_names) for a in artifacts.values()}
+        if len(names) > 1:
+            raise ValueError(f"Artifacts for {city} were trained on different feature sets")
+        return cls({target: a.members() for target, a in artifacts.items()},
+                   weights or {target: a.weights for target, a in artifacts.items()},
+                   feature_names=names.pop(), max_workers=max_workers)
+
+    @property
+    def targets(self):
+        return list(self.members)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        return state
+
+    def matrix(self, X):
+        # DataFrames are reordered to the training columns; everything ends up as one
+        # contiguous float32 matrix
+        if isinstance(X, pd.DataFrame) and self.feature_names is not None:
+            X = X[self.feature_names]
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    def predict_members(self, X, weighted_only=False):
+        # {target: {name: predictions}}; weighted_only skips members stacked to weight 0
+        X = self.matrix(X)
+        tasks = [(target, name, member) for target, ms in self.members.items() for name, member in ms.items()
+                 if not weighted_only or self.weights[target].get(name, 0)]
+        if len(X) >= self.CONCURRENT_MIN_ROWS and len(tasks) > 1:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.max_workers or min(len(tasks), job_threads()))
+            outputs = list(self._pool.map(lambda task: task[2].predict(X), tasks))
+        else:
+            outputs = [member.predict(X) for _, _, member in tasks]
+
+        preds = {target: {} for target in self.members}
+        for (target, name, _), output in zip(tasks, outputs):
+            preds[target][name] = np.asarray(output, dtype=np.float64)
+        return preds
+
+    def blend(self, member_preds):
+        return {target: sum(w * member_preds[target][name] for name, w in self.weights[target].items() if w)
+                for target in member_preds}
+
+    def predict(self, X):
+        # {target: weighted ensemble prediction}
+        return self.blend(self.predict_members(X, weighted_only=True))
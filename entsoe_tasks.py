@@ -0,0 +1,141 @@
+# Shared ENTSO-E ingestion tasks for 1_entsoe_prefect.py and 5_entsoe_price_prefect.py
+# Every (zone, series) fetch is its own Prefect task with retry/backoff, and the
+# number of requests in flight is capped by a shared semaphore so flows can
+# submit all zones at once.
+import os
+import threading
+
+import pandas as pd
+from dotenv import load_dotenv
+from prefect import flow, task
+from prefect.task_runners import ConcurrentTaskRunner
+from prefect.tasks import exponential_backoff
+
+from config import (ENTSOE_BACKFILL_DAYS, ENTSOE_MAX_WORKERS,
+                    ENTSOE_OVERLAP_HOURS, ENTSOE_RETRIES, ENTSOE_RETRY_BACKOFF,
+                    REGIONS)
+import anomaly
+import storage
+from watermarks import advance_watermark, fetch_window
+
+load_dotenv(dotenv_path=".env")
+
+WATERMARK_FILE = os.path.join(storage.STORE_DIR, "_watermarks.json")
+
+# Bounded pool of concurrent API requests shared by all fetch tasks
+_request_slots = threading.BoundedSemaphore(ENTSOE_MAX_WORKERS)
+
+
+def set_max_workers(n):
+    global _request_slots
+    if n < 1:
+        raise ValueError("max_workers must be at least 1.")
+    _request_slots = threading.BoundedSemaphore(n)
+
+
+@task
+def initialize_entsoe_client():
+    # ENTSOE_FAKE=1 swaps in the local fake client (no token, synthetic data)
+    if os.getenv("ENTSOE_FAKE") == "1":
+        from fake_entsoe import FakeEntsoePandasClient
+        return FakeEntsoePandasClient()
+
+    from entsoe import EntsoePandasClient
+    token = os.getenv("ENTSOE_TOKEN")
+    return EntsoePandasClient(api_key=token)
+
+
+def save_series(df, dataset, city):
+    # Append the fetched window as a new log segment (cost grows with the delta,
+    # not the history); duplicates are resolved by compact_store.py. The new rows are
+    # then scored by the streaming anomaly detector (see anomaly.py).
+    storage.append(dataset, city, df)
+    print(f"✅ Appended {len(df)} rows to {dataset}/{city.lower()}")
+    anomaly.screen(df, dataset, city)
+
+
+_retry_policy = dict(
+    retries=ENTSOE_RETRIES,
+    retry_delay_seconds=exponential_backoff(backoff_factor=ENTSOE_RETRY_BACKOFF),
+    retry_jitter_factor=0.5,
+)
+
+
+def _resolve_window(country_code, series, start_date, end_date):
+    # Explicit dates win; otherwise ask only for what is missing since the watermark
+    if start_date is not None:
+        start_ts = pd.Timestamp(start_date, tz="Europe/Brussels")
+        end_ts = pd.Timestamp(end_date, tz="Europe/Brussels")
+        return start_ts, end_ts, None
+    end_ts = pd.Timestamp.now(tz="Europe/Brussels").floor("h") if end_date is None \
+        else pd.Timestamp(end_date, tz="Europe/Brussels")
+    return fetch_window(WATERMARK_FILE, country_code, series, end_ts,
+                        ENTSOE_OVERLAP_HOURS, ENTSOE_BACKFILL_DAYS)
+
+
+@task(task_run_name="demand-{city}", **_retry_policy)
+def fetch_demand_data(client, city, country_code, start_date=None, end_date=None):
+    start_ts, end_ts, _ = _resolve_window(country_code, "demand", start_date, end_date)
+    print(f"Fetching for {city} ({country_code}) from {start_ts} to {end_ts}")
+
+    with _request_slots:
+        load_df = client.query_load(country_code, start=start_ts, end=end_ts)
+    load_df.columns = ["Actual Load"]  # Ensure proper column name
+
+    save_series(load_df, "demand", city)
+    if len(load_df):
+        advance_watermark(WATERMARK_FILE, country_code, "demand", load_df.index.max())
+    return load_df
+
+
+@task(task_run_name="price-{city}", **_retry_policy)
+def fetch_price_data(client, city, country_code, start_date=None, end_date=None):
+    start_ts, end_ts, _ = _resolve_window(country_code, "price", start_date, end_date)
+    print(f"Fetching prices for {city} ({country_code}) from {start_ts} to {end_ts}")
+
+    # Errors propagate so the task's retry policy can kick in
+    with _request_slots:
+        price_series = client.query_day_ahead_prices(country_code, start=start_ts, end=end_ts)
+
+    # Convert to DataFrame
+    price_df = price_series.to_frame(name="Day-Ahead Price")
+    price_df.index.name = "Datetime"
+
+    save_series(price_df, "price", city)
+    if len(price_df):
+        advance_watermark(WATERMARK_FILE, country_code, "price", price_df.index.max())
+    return price_df
+
+
+FETCH_TASKS = {
+    "demand": fetch_demand_data,
+    "price": fetch_price_data,
+}
+
+
+def fan_out(client, series, start_date=None, end_date=None, regions=None):
+    # Submit one task per (zone, series) and wait for all of them; a zone that
+    # still fails after its retries does not stop the others
+    regions = REGIONS if regions is None else regions
+    futures = {}
+    for kind in series:
+        for city, code in regions.items():
+            futures[(kind, city)] = FETCH_TASKS[kind].submit(client, city, code, start_date, end_date)
+
+    failed = []
+    for (kind, city), future in futures.items():
+        state = future.wait()
+        if not state.is_completed():
+            failed.append(f"{kind}/{city}")
+
+    if failed:
+        raise RuntimeError(f"ENTSO-E fetch failed after retries for: {', '.join(failed)}")
+
+
+@flow(task_runner=ConcurrentTaskRunner())
+def entsoe_flow(start_date=None, end_date=None, series=("demand", "price"), max_workers=ENTSOE_MAX_WORKERS, regions=None):
+    # Demand and price for every zone in one fan-out; without explicit dates each
+    # zone/series only fetches the interval after its watermark
+    set_max_workers(max_workers)
+    client = initialize_entsoe_client()
+    fan_out(client, series, start_date, end_date, regions)
@@ -0,0 +1,298 @@
+# Single-pass ETL: raw demand/price/weather -> processed/{city}
+# Replaces the chain 6_series_dataframe -> 7_add_features -> 9/10 timezone ->
+# 12_convert_to_daily -> 14_merge_weather_power. Each city's inputs are loaded
+# once, the stages run in memory as a small DAG, and the result is written once.
+#
+# Out-of-core mode (--chunk-months N) streams the history instead: the stages run
+# on N months at a time, each read with CHUNK_OVERLAP of raw data on either side
+# (time zone shift, fill / interpolation across a source period, whole days for
+# daily bins; with the impute stage, as far as its seasonal fills look back),
+# trimmed back to the chunk and upserted into a staging table that replaces
+# processed/{city} once every chunk has passed. Peak memory depends on N, not on the
+# length of the history.
+#
+# The screen stage masks (sets to NaN) the raw observations the streaming anomaly
+# detector flagged at ingest with one of ANOMALY_MASK_KINDS, before they reach
+# resampling and features.
+#
+# The impute stage fills the gaps of every column by impute.py's rules (instead of
+# losing the rows) and adds the {col}_imputed codes.
+#
+# The validate stage runs validation.py's rules on the result and stops the city
+# (nothing is written) when an error-severity rule fails.
+#
+# Usage:
+#   python etl_pipeline.py                          # all stages, all cities
+#   python etl_pipeline.py --cities oslo stockholm
+#   python etl_pipeline.py --stages load,tz,join,resample,write   # skip screen/weather/impute/calendar/validate
+#   python etl_pipeline.py --chunk-months 3         # out-of-core
+import argparse
+from graphlib import TopologicalSorter
+
+import pandas as pd
+
+import anomaly
+import impute as gap_filling
+import storage
+import validation
+from config import (ANOMALY_MASK_KINDS, CITIES, DEFAULT_RESAMPLE_RULE, ETL_CHUNK_MONTHS, RESAMPLE_RULES,
+                    RESOLUTION, SOURCE_TZ)
+
+RAW_INPUTS = ["demand", "price"]
+CHUNK_OVERLAP = pd.Timedelta(days=1)
+# Out-of-core output is collected here until every chunk of the city has passed
+STAGING = "processed_staging"
+
+
+# === Stages ===
+# Each stage takes and returns the per-city context dict
+
+def load(ctx):
+    # Everything, or [start, end) in out-of-core mode
+    city, span = ctx["city"], {"start": ctx.get("start"), "end": ctx.get("end")}
+    ctx["demand"] = storage.read_frame("demand", city, **span)
+    ctx["price"] = storage.read_frame("price", city, **span).rename(columns={"Day-Ahead Price": "Price"})
+    ctx["weather"] = storage.read_frame("weather", city, **span) if storage.exists("weather", city) else None
+    return ctx
+
+
+def screen(ctx):
+    # Flagged observations become gaps, which resample fills like any other
+    for series, column in (("demand", "Actual Load"), ("price", "Price")):
+        df = ctx[series]
+        flags = anomaly.load_flags(series, ctx["city"], ctx.get("start"), ctx.get("end"), ANOMALY_MASK_KINDS)
+        masked = df.index.isin(flags.index)
+        if masked.any():
+            df.loc[masked, column] = float("nan")
+            print(f"  Masked {int(masked.sum())} flagged {series} observation(s)")
+    return ctx
+
+
+def _to_utc_naive(index):
+    # Naive timestamps in the raw series are local market time
+    if index.tz is None:
+        index = index.tz_localize(SOURCE_TZ, ambiguous="infer", nonexistent="shift_forward")
+    return index.tz_convert("UTC").tz_localize(None)
+
+
+def tz(ctx):
+    ctx["demand"].index = _to_utc_naive(ctx["demand"].index)
+    ctx["price"].index = _to_utc_naive(ctx["price"].index)
+    # Weather dates are already naive UTC
+    if ctx["weather"] is not None and ctx["weather"].index.tz is not None:
+        ctx["weather"].index = ctx["weather"].index.tz_convert("UTC").tz_localize(None)
+    return ctx
+
+
+def join(ctx):
+    # Outer join so 15-minute load and hourly prices both survive until resampling
+    ctx["power"] = ctx["demand"][["Actual Load"]].join(ctx["price"][["Price"]], how="outer")
+    return ctx
+
+
+def resample_frame(df, resolution=RESOLUTION, rules=RESAMPLE_RULES):
+    # Each column to the target resolution by its own rule; columns coarser than
+    # the target (e.g. hourly prices at 15 minutes) are filled within one source period
+    step = pd.to_timedelta(pd.tseries.frequencies.to_offset(resolution))
+    out = {}
+    for col in df.columns:
+        rule = rules.get(col, DEFAULT_RESAMPLE_RULE)
+        series = df[col].dropna()
+        resampled = series.resample(resolution).agg(rule["agg"])
+        native = series.index.to_series().diff().median() if len(series) > 1 else step
+        limit = int(native / step) - 1
+        if limit > 0:
+            # The last source period covers the steps up to the next one as well
+            resampled = resampled.reindex(pd.date_range(resampled.index[0], series.index[-1] + native - step,
+                                                        freq=resolution))
+            if rule["fill"] == "interpolate":
+                resampled = resampled.interpolate(method="time", limit=limit, limit_area="inside")
+            else:
+                resampled = resampled.ffill(limit=limit)
+        out[col] = resampled
+    return pd.DataFrame(out).dropna(how="all")
+
+
+def resample(ctx):
+    ctx["power"] = resample_frame(ctx["power"])
+    return ctx
+
+
+def weather(ctx):
+    if ctx["weather"] is None:
+        print(f"  No weather stored for {ctx['city']}, keeping power only")
+        return ctx
+    weather_df = ctx["weather"].copy()
+    weather_df["temp_C"] = weather_df.pop("temp")
+    weather_df.index = weather_df.index.normalize()
+    weather_df = weather_df[~weather_df.index.duplicated(keep="last")]
+
+    # Daily weather is matched by date, so this also works when resample is skipped.
+    # Every power row is kept: impute fills weather gaps inside the weather's span,
+    # rows outside it keep NaN weather and the validation report counts them.
+    power = ctx["power"]
+    matched = weather_df.reindex(power.index.normalize())
+    matched.index = power.index
+    days = power.index.normalize()
+    outside = int(((days < weather_df.index.min()) | (days > weather_df.index.max())).sum())
+    if outside:
+        print(f"  {outside} power rows outside the weather's span keep NaN weather")
+    ctx["power"] = power.join(matched)
+    return ctx
+
+
+def impute(ctx):
+    ctx["power"] = gap_filling.impute(ctx["power"])
+    filled = gap_filling.summary(ctx["power"])
+    if filled:
+        print(f"  Imputed {filled}")
+    return ctx
+
+
+def calendar(ctx):
+    df = ctx["power"]
+    if (df.index.hour != 0).any():
+        df["hour"] = df.index.hour
+    df["day_of_week"] = df.index.dayofweek  # Monday=0, Sunday=6
+    df["month"] = df.index.month
+    df["is_weekend"] = df["day_of_week"].isin([5, 6]).astype(int)
+    return ctx
+
+
+def _own_rows(ctx):
+    # Out-of-core: only the chunk's own rows, the overlap belongs to its neighbours
+    if "keep" not in ctx:
+        return ctx["power"]
+    lo, hi = ctx["keep"]
+    return ctx["power"][(ctx["power"].index >= lo) & (ctx["power"].index < hi)]
+
+
+def validate(ctx):
+    # Blocks the write when an error rule fails; the report goes to data/validation/processed.json.
+    # A chunk is checked on the rows it writes, without its overlap.
+    key = ctx["city"] if "keep" not in ctx else f"{ctx['city']}/{ctx['keep'][0]:%Y-%m}"
+    ctx["power"] = _own_rows(ctx)
+    report = validation.validate(ctx["power"])
+    validation.save_report("processed", {key: report})
+    if not report["passed"]:
+        raise validation.ValidationError(f"Validation failed for {key}: {validation.errors(report)}\n{validation.summary(report)}")
+    return ctx
+
+
+def write(ctx):
+    if "keep" not in ctx:
+        storage.write_frame("processed", ctx["city"], ctx["power"], mode="overwrite")
+        print(f"  Saved processed/{ctx['city']} {ctx['power'].shape}")
+        return ctx
+    # Chunks go to the staging dataset run_city_chunked() swaps in at the end
+    ctx["power"] = _own_rows(ctx)
+    storage.write_frame(STAGING, ctx["city"], ctx["power"])
+    return ctx
+
+
+# stage -> (function, upstream stages)
+STAGES = {
+    "load": (load, []),
+    "screen": (screen, ["load"]),
+    "tz": (tz, ["screen"]),
+    "join": (join, ["tz"]),
+    "resample": (resample, ["join"]),
+    "weather": (weather, ["resample"]),
+    "impute": (impute, ["weather"]),
+    "calendar": (calendar, ["impute"]),
+    "validate": (validate, ["calendar"]),
+    "write": (write, ["validate"]),
+}
+REQUIRED_STAGES = {"load", "join"}
+
+
+def plan(stages=None):
+    # Topological order of the selected stages; skipped stages pass their input through
+    selected = set(STAGES) if stages is None else set(stages)
+    unknown = selected - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)}")
+    missing = REQUIRED_STAGES - selected
+    if missing:
+        raise ValueError(f"Stages {sorted(missing)} are required")
+    order = TopologicalSorter({name: deps for name, (_, deps) in STAGES.items()}).static_order()
+    return [name for name in order if name in selected]
+
+
+def run_city(city, stages=None, **ctx):
+    ctx = {"city": city, **ctx}
+    for name in plan(stages):
+        ctx = STAGES[name][0](ctx)
+    return ctx["power"]
+
+
+def chunks(city, chunk_months):
+    # [lo, hi) month ranges covering the raw months of the city, oldest first
+    for dataset in RAW_INPUTS:
+        storage.compact(dataset, city)  # pending log segments may hold months of their own
+    months = sorted(set().union(*(storage.list_months(dataset, city) for dataset in RAW_INPUTS)))
+    if not months:
+        raise FileNotFoundError(f"No raw data stored for {city}")
+    first, last = pd.Timestamp(f"{months[0]}-01"), pd.Timestamp(f"{months[-1]}-01")
+    # One month of margin: the first local hours of a month are still the previous UTC month
+    starts = pd.date_range(first - pd.offsets.MonthBegin(1), last, freq=pd.DateOffset(months=chunk_months))
+    for lo in starts:
+        yield lo, lo + pd.DateOffset(months=chunk_months)
+
+
+def run_city_chunked(city, stages=None, chunk_months=ETL_CHUNK_MONTHS):
+    # Streams the city through the stages chunk by chunk; returns the row count written
+    if "write" not in stages:
+        raise ValueError("Out-of-core mode writes as it goes; the write stage is required")
+    # Chunks are written to STAGING, which replaces processed/{city} only once every
+    # chunk has passed validation; a failure leaves the previous table in place
+    storage.delete(STAGING, city)
+    # Enough raw data around the chunk for the fills that look furthest (seasonal);
+    # model fills are fitted on the chunk, and gaps longer than this may differ
+    overlap = max(CHUNK_OVERLAP, gap_filling.reach()) if "impute" in stages else CHUNK_OVERLAP
+    n_rows = 0
+    try:
+        for lo, hi in chunks(city, chunk_months):
+            try:
+                power = run_city(city, stages, start=lo - overlap, end=hi + overlap, keep=(lo, hi))
+            except FileNotFoundError:
+                continue  # no raw data in this chunk
+            n_rows += len(power)
+    except Exception:
+        storage.delete(STAGING, city)
+        raise
+    storage.replace(STAGING, "processed", city)
+    print(f"  Saved processed/{city} ({n_rows} rows, {chunk_months}-month chunks)")
+    return n_rows
+
+
+def run(cities=None, stages=None, chunk_months=ETL_CHUNK_MONTHS):
+    # Returns {city: processed frame}, or {city: rows written} in out-of-core mode
+    cities = CITIES if cities is None else cities
+    order = plan(stages)
+    print(f"Stages: {' -> '.join(order)}")
+    results = {}
+    for city in cities:
+        print(f"\nProcessing: {city.title()}")
+        try:
+            if chunk_months:
+                results[city] = run_city_chunked(city, order, chunk_months)
+            else:
+                results[city] = run_city(city, order)
+        except FileNotFoundError as e:
+            print(f"  Skipped {city}: {e}")
+        except validation.ValidationError as e:
+            # The failing city is not written; the others still run
+            print(f"  Not written, {e}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ETL pipeline for each city.")
+    parser.add_argument("--cities", nargs="+", default=None, help="Cities to process (default: all configured)")
+    parser.add_argument("--stages", default=None, help=f"Comma-separated subset of: {','.join(STAGES)}")
+    parser.add_argument("--chunk-months", type=int, default=ETL_CHUNK_MONTHS,
+                        help="Out-of-core mode: months of raw data per chunk (default: 0, whole history)")
+    args = parser.parse_args()
+
+    run(args.cities, args.stages.split(",") if args.stages else None, args.chunk_months)
@@ -0,0 +1,39 @@
+# One-off conversion of the pickled ensemble members into compact artifacts
+# Reads models/{ridge,rf,xgb}_{demand,price}_{city}.pkl and writes a new version
+# under models/artifacts/{city}/{demand,price}/. Training scripts (21, 22, 25)
+# write artifacts themselves; this only covers models trained before them.
+# Usage: python export_artifacts.py [--model-dir models]
+import argparse
+import os
+import pickle
+
+from artifacts import save_artifact
+from config import CITIES
+from cv_engine import TARGETS
+from ensemble import ENSEMBLE_WEIGHTS
+
+
+def export_city_target(city, target, model_dir):
+    short = target.replace('_next', '')
+    models = {}
+    for name in ENSEMBLE_WEIGHTS:
+        with open(f"{model_dir}/{name}_{short}_{city}.pkl", "rb") as f:
+            models[name] = pickle.load(f)
+    # Members were fitted on DataFrames, so the feature order is on the model
+    feature_names = list(models["ridge"].feature_names_in_)
+    return save_artifact(city, target, models, feature_names, ENSEMBLE_WEIGHTS,
+                         root=os.path.join(model_dir, "artifacts"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pickled models to compact artifacts.")
+    parser.add_argument("--model-dir", default="models")
+    args = parser.parse_args()
+
+    for city in CITIES:
+        for target in TARGETS:
+            try:
+                path = export_city_target(city, target, args.model_dir)
+                print(f"Exported {city}/{target} -> {path}")
+            except FileNotFoundError as e:
+                print(f"Skipped {city}/{target}: {e}")
@@ -0,0 +1,45 @@
+# Local stand-in for entsoe.EntsoePandasClient
+# Returns synthetic load/price series after a configurable delay so the
+# ingestion flows can be run and benchmarked without an API token.
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+# Zones that publish load at 15-minute resolution (everything else is hourly)
+QUARTER_HOUR_ZONES = {"NO_1"}
+
+
+class FakeEntsoePandasClient:
+    def __init__(self, api_key=None, latency=None, failure_rate=None, seed=42):
+        self.api_key = api_key
+        self.latency = float(os.getenv("ENTSOE_FAKE_LATENCY", "0.5")) if latency is None else latency
+        self.failure_rate = float(os.getenv("ENTSOE_FAKE_FAILURE_RATE", "0")) if failure_rate is None else failure_rate
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    def _simulate_request(self, country_code):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self._rng.random() < self.failure_rate:
+            raise ConnectionError(f"Simulated ENTSO-E failure for {country_code}")
+
+    def _index(self, country_code, start, end):
+        freq = "15min" if country_code in QUARTER_HOUR_ZONES else "h"
+        return pd.date_range(start, end, freq=freq, inclusive="left")
+
+    def query_load(self, country_code, start, end):
+        self._simulate_request(country_code)
+        idx = self._index(country_code, start, end)
+        hours = idx.hour.to_numpy()
+        load = 3000 + 400 * np.sin((hours - 6) / 24 * 2 * np.pi) + np.random.normal(0, 50, len(idx))
+        return pd.DataFrame({"Actual Load": load.round(1)}, index=idx)
+
+    def query_day_ahead_prices(self, country_code, start, end):
+        self._simulate_request(country_code)
+        idx = pd.date_range(start, end, freq="h", inclusive="left")
+        hours = idx.hour.to_numpy()
+        price = 50 + 20 * np.sin((hours - 8) / 24 * 2 * np.pi) + np.random.normal(0, 5, len(idx))
+        return pd.Series(price.round(2), index=idx)
@@ -0,0 +1,107 @@
+# Local stand-in for the OpenWeatherMap API
+# Serves /data/2.5/weather, /data/3.0/onecall/timemachine and /data/3.0/onecall
+# (8-day daily forecast, error growing with the lead) with synthetic values (a
+# smooth function of lat, lon and time) after a configurable delay, and answers
+# a fraction of requests with 429 + Retry-After, so weather_collector.py can be run
+# and benchmarked without an API key.
+#
+#   python fake_weather.py [--port 8081] [--latency 0.2] [--rate-limit 0.05]
+#   WEATHER_API_URL=http://127.0.0.1:8081 python weather_collector.py --backfill-days 30
+import argparse
+import asyncio
+import math
+import os
+import random
+import time
+
+from aiohttp import web
+
+
+def _observation(lat, lon, ts):
+    # Kelvin temperature with a yearly and a daily cycle, colder further north
+    days = ts / 86_400
+    temp = 283.15 - 0.5 * (lat - 55) + 8 * math.sin(2 * math.pi * (days - 105) / 365.25) \
+        + 3 * math.sin(2 * math.pi * (days % 1 - 0.375))
+    humidity = 60 + 25 * math.sin(lon + days)
+    return {
+        "temp": round(temp, 2),
+        "humidity": round(humidity),
+        "pressure": 1013,
+        "wind_speed": round(4 + 3 * math.cos(lat + days), 1),
+        "clouds": round(50 + 45 * math.sin(lat * lon + days)),
+        "weather": [{"description": "clouds"}],
+    }
+
+
+def make_app(latency=None, rate_limit=None, retry_after=1, seed=42):
+    latency = float(os.getenv("WEATHER_FAKE_LATENCY", "0.2")) if latency is None else latency
+    rate_limit = float(os.getenv("WEATHER_FAKE_RATE_LIMIT", "0")) if rate_limit is None else rate_limit
+    rng = random.Random(seed)
+    stats = {"calls": 0, "rate_limited": 0}
+    app = web.Application()
+    app["stats"] = stats
+
+    async def _forecast(request):
+        stats["calls"] += 1
+        await asyncio.sleep(latency)
+        lat, lon = float(request.query["lat"]), float(request.query["lon"])
+        now = time.time()
+        today = now - now % 86_400
+        daily = []
+        for lead in range(8):
+            ts = today + lead * 86_400 + 43_200
+            obs = _observation(lat, lon, ts)
+            noise = random.Random(f"{lat},{lon},{now // 3600},{lead}").gauss(0, 0.5 * lead)
+            daily.append({"dt": int(ts), "temp": {"day": round(obs["temp"] + noise, 2)},
+                          "humidity": obs["humidity"], "pressure": obs["pressure"],
+                          "wind_speed": obs["wind_speed"], "clouds": obs["clouds"],
+                          "weather": obs["weather"]})
+        return web.json_response({"lat": lat, "lon": lon, "daily": daily})
+
+    async def _serve(request, history):
+        stats["calls"] += 1
+        await asyncio.sleep(latency)
+        if rng.random() < rate_limit:
+            stats["rate_limited"] += 1
+            return web.json_response({"cod": 429, "message": "rate limited"}, status=429,
+                                     headers={"Retry-After": str(retry_after)})
+        try:
+            lat, lon = float(request.query["lat"]), float(request.query["lon"])
+            ts = int(request.query["dt"]) if history else time.time()
+        except (KeyError, ValueError):
+            return web.json_response({"cod": 400, "message": "bad query"}, status=400)
+        obs = _observation(lat, lon, ts)
+        if history:
+            return web.json_response({"lat": lat, "lon": lon, "data": [{"dt": ts, **obs}]})
+        return web.json_response({
+            "coord": {"lat": lat, "lon": lon},
+            "main": {"temp": obs["temp"], "humidity": obs["humidity"], "pressure": obs["pressure"]},
+            "wind": {"speed": obs["wind_speed"]},
+            "clouds": {"all": obs["clouds"]},
+            "weather": obs["weather"],
+        })
+
+    app.router.add_get("/data/2.5/weather", lambda request: _serve(request, history=False))
+    app.router.add_get("/data/3.0/onecall/timemachine", lambda request: _serve(request, history=True))
+    app.router.add_get("/data/3.0/onecall", _forecast)
+    return app
+
+
+async def start(port=0, **app_args):
+    # Start the stub in the running event loop; returns (runner, base URL)
+    runner = web.AppRunner(make_app(**app_args))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake OpenWeatherMap API.")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=None, help="Seconds per response")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.latency, args.rate_limit), host="127.0.0.1", port=args.port)
@@ -0,0 +1,238 @@
+# Feature store: cached feature matrices for the modelling scripts
+# Instead of every script reading the feature table and converting it to NumPy,
+# load_matrix(city) returns paths to memory-mappable .npy files:
+#
+#   data/feature_cache/{city}/block-{YYYY-MM}-{key}/   one month of rows
+#   data/feature_cache/{city}/matrix-{key}/            all months, concatenated
+#       X.npy (float32), demand_next.npy / price_next.npy (float64),
+#       index.npy (datetime64[ns]), columns.json
+#
+# Blocks are computed from the processed/{city} partitions with
+# features.feature_table, and keyed by the feature spec version plus the
+# fingerprints (size, mtime) of the month and the neighbouring months its lags
+# and targets read. Rewriting one month of processed data therefore recomputes
+# only the blocks around it, and a full hit reads no Parquet and computes nothing.
+# Misses are computed at most FEATURE_CHUNK_MONTHS months at a time and the full
+# matrix is written part by part, so memory stays bounded at any resolution.
+# Entries are touched when used; the least recently used are deleted once the
+# cache exceeds FEATURE_CACHE_MAX_BYTES.
+#
+#   python feature_store.py [--cities oslo] [--clear]
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import storage
+from config import CITIES, FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES, FEATURE_CHUNK_MONTHS
+from features import (FEATURE_SPEC, STEPS_PER_DAY, TARGET_SOURCES, feature_columns, feature_table,
+                      lookback, resolve_spec, spec_version)
+
+SOURCE_DATASET = "processed"
+TARGETS = list(TARGET_SOURCES)
+
+
+def _key(*parts):
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()[:16]
+
+
+def _month_range(first, last):
+    start = pd.Timestamp(f"{first}-01")
+    return start, pd.Timestamp(f"{last}-01") + pd.offsets.MonthBegin(1)
+
+
+def _entry_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def _save(path, values):
+    # values: an array, or a list of arrays written one after the other without
+    # building their concatenation in memory
+    if not isinstance(values, list):
+        np.save(path, values)
+        return
+    shape = (sum(len(part) for part in values),) + values[0].shape[1:]
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=values[0].dtype, shape=shape)
+    pos = 0
+    for part in values:
+        out[pos:pos + len(part)] = part
+        pos += len(part)
+    out.flush()
+    del out
+
+
+def _write_entry(path, arrays, columns):
+    # Written to a temp directory and renamed, so readers never see half an entry
+    tmp = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    for name, values in arrays.items():
+        _save(os.path.join(tmp, f"{name}.npy"), values)
+    with open(os.path.join(tmp, "columns.json"), "w") as f:
+        json.dump(columns, f)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)  # another process wrote it first
+
+
+def _read_columns(path):
+    with open(os.path.join(path, "columns.json")) as f:
+        return json.load(f)
+
+
+def context_months(spec):
+    # Months before a month that its lags reach back into; monthly partitions hold
+    # at least 28 days of rows. EWM features are warmed up over 4 spans of context.
+    spec = resolve_spec(spec)
+    reach = max([lookback(spec)] + [4 * s["span"] for s in spec.values() if s["kind"] == "ewm"])
+    return 1 + reach // (28 * STEPS_PER_DAY)
+
+
+def _block_keys(months, prints, spec):
+    # Block m depends on the months its lags reach back into and on the next month
+    # (T+1 targets)
+    before = context_months(spec)
+    version = spec_version(spec)
+    keys = {}
+    for i, month in enumerate(months):
+        context = months[max(0, i - before):i + 2]
+        keys[month] = _key(version, [(m, prints[m]) for m in context], prints.get(storage.LOG_DIR))
+    return keys, before
+
+
+def _runs(positions, chunk_months):
+    # Consecutive positions, in runs of at most chunk_months
+    runs = []
+    for pos in positions:
+        if runs and pos == runs[-1][-1] + 1 and len(runs[-1]) < chunk_months:
+            runs[-1].append(pos)
+        else:
+            runs.append([pos])
+    return runs
+
+
+def _chunk(city, months, run, before, after, spec):
+    # Raw rows of months[run] plus context, and the feature rows of months[run]
+    first, last = months[max(0, run[0] - before)], months[min(len(months) - 1, run[-1] + after)]
+    start, end = _month_range(first, last)
+    raw = storage.read_frame(SOURCE_DATASET, city, start=start, end=end)
+    lo, hi = _month_range(months[run[0]], months[run[-1]])
+    table = feature_table(raw, spec)
+    return raw, table[(table.index >= lo) & (table.index < hi)]
+
+
+def feature_chunks(city, spec=FEATURE_SPEC, chunk_months=FEATURE_CHUNK_MONTHS, after=1):
+    # Yields (raw rows with context, feature rows) for processed/{city}, chunk_months
+    # months at a time; raw also covers `after` months past the chunk, e.g. for
+    # targets further ahead than T+1. Same rows as feature_table on the full history.
+    months = storage.list_months(SOURCE_DATASET, city)
+    if not months:
+        raise FileNotFoundError(f"No data stored for {SOURCE_DATASET}/{city}")
+    before = context_months(spec)
+    for run in _runs(range(len(months)), chunk_months):
+        yield _chunk(city, months, run, before, max(after, 1), spec)
+
+
+def _compute_blocks(city, months, missing, before, keys, spec, root, chunk_months=FEATURE_CHUNK_MONTHS):
+    # One read and one feature pass per chunk of consecutive missing months
+    for run in _runs([months.index(m) for m in missing], chunk_months):
+        _, table = _chunk(city, months, run, before, 1, spec)
+        cols = feature_columns(table)
+        for pos in run:
+            month = months[pos]
+            lo, hi = _month_range(month, month)
+            rows = table[(table.index >= lo) & (table.index < hi)]
+            arrays = {"X": np.ascontiguousarray(rows[cols].to_numpy(dtype=np.float32)),
+                      "index": rows.index.to_numpy(dtype="datetime64[ns]")}
+            arrays.update({t: rows[t].to_numpy(dtype=np.float64) for t in TARGETS})
+            _write_entry(os.path.join(root, f"block-{month}-{keys[month]}"), arrays, cols)
+
+
+def load_matrix(city, targets=TARGETS, spec=FEATURE_SPEC, cache_dir=FEATURE_CACHE_DIR):
+    # Returns {"paths": {"X", target...}, "feature_cols", "index", "n_rows", "key"}; the
+    # arrays are meant to be opened with np.load(path, mmap_mode="r"). "key" changes
+    # with the spec version and the processed data.
+    prints = storage.fingerprint(SOURCE_DATASET, city)
+    months = [m for m in prints if m != storage.LOG_DIR]
+    if not months:
+        raise FileNotFoundError(f"No data stored for {SOURCE_DATASET}/{city}")
+    root = os.path.join(cache_dir, city.lower())
+    keys, before = _block_keys(months, prints, spec)
+    matrix_key = _key([keys[m] for m in months])
+    matrix = os.path.join(root, f"matrix-{matrix_key}")
+
+    if not os.path.isdir(matrix):
+        blocks = {m: os.path.join(root, f"block-{m}-{keys[m]}") for m in months}
+        missing = [m for m in months if not os.path.isdir(blocks[m])]
+        if missing:
+            print(f"Feature store: computing {len(missing)}/{len(months)} month block(s) for {city}")
+            _compute_blocks(city, months, missing, before, keys, spec, root)
+        columns = _read_columns(blocks[months[-1]])
+        arrays = {}
+        for name in ["X", "index"] + TARGETS:
+            parts = [np.load(os.path.join(blocks[m], f"{name}.npy"), mmap_mode="r") for m in months]
+            if name == "X" and any(_read_columns(blocks[m]) != columns for m in months):
+                raise ValueError(f"Feature columns of {city} differ between months; rebuild processed/{city}")
+            arrays[name] = parts
+        _write_entry(matrix, arrays, columns)
+        for path in blocks.values():
+            os.utime(path)
+    os.utime(matrix)
+    evict(cache_dir, keep={matrix})
+
+    paths = {"X": os.path.join(matrix, "X.npy")}
+    paths.update({t: os.path.join(matrix, f"{t}.npy") for t in targets})
+    index = pd.DatetimeIndex(np.load(os.path.join(matrix, "index.npy")), name=storage.INDEX_COL)
+    return {"paths": paths, "feature_cols": _read_columns(matrix), "index": index, "n_rows": len(index),
+            "key": matrix_key}
+
+
+def entries(cache_dir=FEATURE_CACHE_DIR):
+    # (path, bytes, last used) of every cached block and matrix
+    out = []
+    if not os.path.isdir(cache_dir):
+        return out
+    for city in os.listdir(cache_dir):
+        root = os.path.join(cache_dir, city)
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.startswith(("block-", "matrix-")) and ".tmp-" not in name:
+                out.append((path, _entry_size(path), os.path.getmtime(path)))
+    return out
+
+
+def evict(cache_dir=FEATURE_CACHE_DIR, max_bytes=FEATURE_CACHE_MAX_BYTES, keep=()):
+    # Delete least recently used entries until the cache fits in max_bytes
+    cached = sorted(entries(cache_dir), key=lambda e: e[2])
+    total = sum(size for _, size, _ in cached)
+    removed = 0
+    for path, size, _ in cached:
+        if total <= max_bytes:
+            break
+        if path in keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build (or clear) the cached feature matrices.")
+    parser.add_argument("--cities", nargs="+", default=CITIES)
+    parser.add_argument("--clear", action="store_true", help="Delete the whole cache")
+    args = parser.parse_args()
+
+    if args.clear:
+        shutil.rmtree(FEATURE_CACHE_DIR, ignore_errors=True)
+        print(f"Cleared {FEATURE_CACHE_DIR}")
+    else:
+        for city in args.cities:
+            m = load_matrix(city)
+            print(f"{city}: {m['n_rows']} rows x {len(m['feature_cols'])} features -> {os.path.dirname(m['paths']['X'])}")
+        cached = entries()
+        print(f"Cache: {len(cached)} entries, {sum(size for _, size, _ in cached) / 1e6:.1f} MB")
@@ -0,0 +1,284 @@
+# Declarative feature engineering
+# Every engineered feature is one entry of a spec, {name: {"kind": ..., ...}}:
+#
+#   lag       {"source", "periods"}          x[t - periods]
+#   diff      {"source", "periods"}          x[t] - x[t - periods]
+#   rolling   {"source", "window", "stat"}   mean / std / min / max of x[t - window .. t - 1]
+#   ewm       {"source", "span"}             exponential mean of x[.. t - 1] (adjust=False)
+#   calendar  {"field"}                      dayofweek, month, dayofyear, hour, is_weekend
+#   fourier   {"period", "order", "fn"}      sin / cos(2 pi order t / period), period in days
+#
+# periods / window / span are durations ("1D", "168h") resolved to rows at the
+# native resolution (config.RESOLUTION), or plain row counts. The same spec thus
+# means "yesterday" and "last week" whether the table is daily, hourly or 15-minute.
+#
+# The same spec is evaluated two ways, so training and forecasting can't drift apart:
+#   - compute_features(df): the whole table at once; features of one kind and
+#     parameters are computed for all of their source columns in a single NumPy op.
+#   - FeatureStream: ring buffers holding the last `lookback` values of each source
+#     (one row per scenario). push() appends one time step and features() returns
+#     that step's features, each in O(window). The recursive forecaster uses it,
+#     and new rows can be extended without recomputing the history.
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from config import RESOLUTION
+
+# Time between rows of the processed / feature tables
+STEP = pd.to_timedelta(to_offset(RESOLUTION))
+STEPS_PER_DAY = int(pd.Timedelta(days=1) / STEP)
+
+# Features of the `features` table, in column order (raw columns stay in front)
+FEATURE_SPEC = {
+    "demand_lag1": {"kind": "lag", "source": "Actual Load", "periods": "1D"},
+    "price_lag1": {"kind": "lag", "source": "Price", "periods": "1D"},
+    "demand_lag7": {"kind": "lag", "source": "Actual Load", "periods": "7D"},
+    "price_lag7": {"kind": "lag", "source": "Price", "periods": "7D"},
+    "demand_roll7": {"kind": "rolling", "source": "Actual Load", "window": "7D", "stat": "mean"},
+    "price_roll7": {"kind": "rolling", "source": "Price", "window": "7D", "stat": "mean"},
+    "temp_roll7": {"kind": "rolling", "source": "temp_C", "window": "7D", "stat": "mean"},
+    "demand_diff1": {"kind": "diff", "source": "Actual Load", "periods": "1D"},
+    "demand_diff7": {"kind": "diff", "source": "Actual Load", "periods": "7D"},
+    "price_diff1": {"kind": "diff", "source": "Price", "periods": "1D"},
+    "price_diff7": {"kind": "diff", "source": "Price", "periods": "7D"},
+    "day_of_week": {"kind": "calendar", "field": "dayofweek"},
+    "month": {"kind": "calendar", "field": "month"},
+    "is_weekend": {"kind": "calendar", "field": "is_weekend"},
+}
+
+# Added below daily resolution: the last hour and the daily profile
+INTRADAY_SPEC = {
+    "demand_lag1h": {"kind": "lag", "source": "Actual Load", "periods": "1h"},
+    "price_lag1h": {"kind": "lag", "source": "Price", "periods": "1h"},
+    "hour": {"kind": "calendar", "field": "hour"},
+    "day_sin": {"kind": "fourier", "period": 1, "order": 1, "fn": "sin"},
+    "day_cos": {"kind": "fourier", "period": 1, "order": 1, "fn": "cos"},
+}
+if STEP < pd.Timedelta(days=1):
+    FEATURE_SPEC.update(INTRADAY_SPEC)
+
+# T+1 targets: target column -> source column it is the next value of
+TARGET_SOURCES = {"demand_next": "Actual Load", "price_next": "Price"}
+
+# Text columns of the processed tables that are never model inputs
+NON_FEATURE_COLS = ["name", "description"]
+# Suffix of the imputation codes impute.py adds per column (not model inputs either)
+IMPUTED_SUFFIX = "_imputed"
+
+ROLLING_STATS = {"mean": np.mean, "std": lambda a, axis: np.std(a, axis=axis, ddof=1),
+                 "min": np.min, "max": np.max}
+DAY_NS = 86_400 * 10**9
+
+
+def feature_columns(df):
+    return [col for col in df.columns
+            if col not in list(TARGET_SOURCES) + NON_FEATURE_COLS and not col.endswith(IMPUTED_SUFFIX)]
+
+
+def _rows(value, step):
+    # Durations become row counts at `step`; ints already are
+    if not isinstance(value, str):
+        return value
+    rows = pd.Timedelta(value) / step
+    if rows < 1 or rows != int(rows):
+        raise ValueError(f"{value} is not a whole number of {step} steps.")
+    return int(rows)
+
+
+def resolve_spec(spec, step=STEP):
+    # The spec with every periods / window / span in rows
+    return {name: {k: _rows(v, step) if k in ("periods", "window", "span") else v for k, v in s.items()}
+            for name, s in spec.items()}
+
+
+def spec_version(spec=FEATURE_SPEC):
+    # Changes whenever the spec, the resolution or the target / column definitions change
+    payload = json.dumps([resolve_spec(spec), str(STEP), TARGET_SOURCES, NON_FEATURE_COLS, IMPUTED_SUFFIX],
+                         sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def sources(spec):
+    return list(dict.fromkeys(s["source"] for s in spec.values() if "source" in s))
+
+
+def lookback(spec):
+    # Values of each source needed to compute one row: the current one plus history
+    back = [s.get("periods", 0) or s.get("window", 0) for s in resolve_spec(spec).values() if "source" in s]
+    return max(back + [1]) + 1
+
+
+def _calendar(index, field):
+    if field == "is_weekend":
+        return (index.dayofweek >= 5).astype(np.float64)
+    return getattr(index, field).to_numpy(dtype=np.float64)
+
+
+def _fourier(index, s):
+    days = index.asi8 / DAY_NS
+    return getattr(np, s["fn"])(2 * np.pi * s["order"] * days / s["period"])
+
+
+def _groups(spec, keys):
+    # {(kind, params...): [(feature name, source), ...]}
+    groups = {}
+    for name, s in spec.items():
+        if "source" in s:
+            groups.setdefault((s["kind"],) + tuple(s.get(k) for k in keys), []).append((name, s["source"]))
+    return groups
+
+
+def _rolling(block, window, stat):
+    # Row t (t >= window) sees rows t - window .. t - 1. O(n) whatever the window,
+    # so a week of 15-minute rows (672) costs no more than a week of days.
+    if stat == "mean":
+        # NaNs are summed as 0 and counted, so one only blanks the windows it is in
+        missing = np.isnan(block)
+        zeros = np.zeros((1, block.shape[1]))
+        csum = np.vstack([zeros, np.cumsum(np.where(missing, 0.0, block), axis=0)])
+        nans = np.vstack([zeros, np.cumsum(missing, axis=0)])
+        mean = (csum[window:-1] - csum[:-window - 1]) / window
+        return np.where(nans[window:-1] - nans[:-window - 1] > 0, np.nan, mean)
+    return pd.DataFrame(block).rolling(window).agg(stat).to_numpy()[window - 1:-1]
+
+
+def compute_features(df, spec=FEATURE_SPEC):
+    # df with the raw source columns, one row per STEP; returns df plus every
+    # feature of the spec
+    spec = resolve_spec(spec)
+    used = sources(spec)
+    values = df[used].to_numpy(dtype=np.float64)
+    col = {source: i for i, source in enumerate(used)}
+    n = len(df)
+    out = {}
+
+    for (kind, periods, window, stat, span), members in _groups(spec, ["periods", "window", "stat", "span"]).items():
+        block = values[:, [col[source] for _, source in members]]
+        result = np.full_like(block, np.nan)
+        if kind in ("lag", "diff"):
+            if periods < n:
+                result[periods:] = block[:-periods]
+            if kind == "diff":
+                result = block - result
+        elif kind == "rolling":
+            if n > window:
+                result[window:] = _rolling(block, window, stat)
+        elif kind == "ewm":
+            smoothed = pd.DataFrame(block).ewm(span=span, adjust=False).mean().to_numpy()
+            result[1:] = smoothed[:-1]
+        else:
+            raise ValueError(f"Unknown feature kind: {kind}")
+        for j, (name, _) in enumerate(members):
+            out[name] = result[:, j]
+
+    for name, s in spec.items():
+        if s["kind"] == "calendar":
+            out[name] = _calendar(df.index, s["field"])
+        elif s["kind"] == "fourier":
+            out[name] = _fourier(df.index, s)
+
+    features = pd.DataFrame({name: out[name] for name in spec}, index=df.index)
+    return pd.concat([df.drop(columns=[c for c in spec if c in df.columns]), features], axis=1)
+
+
+def feature_table(df, spec=FEATURE_SPEC):
+    # The modelling table: features plus T+1 targets, minus rows where any lag,
+    # window or target falls outside the data
+    df = compute_features(df, spec)
+    for target, source in TARGET_SOURCES.items():
+        df[target] = df[source].shift(-1)
+    return df.dropna()
+
+
+class RingBuffer:
+    # Last `size` values of one series for n scenarios
+    def __init__(self, values, n_scenarios):
+        values = np.asarray(values, dtype=np.float64)
+        self.size = len(values)
+        self.buf = np.tile(values, (n_scenarios, 1))
+        self.pos = 0  # slot of the oldest value
+
+    def push(self, values):
+        self.buf[:, self.pos] = values
+        self.pos = (self.pos + 1) % self.size
+
+    def back(self, k):
+        # Value k steps back; back(1) is the latest
+        return self.buf[:, (self.pos - k) % self.size]
+
+    def window(self, k, skip=0):
+        # The k values before the latest `skip` ones, oldest first: (n_scenarios, k)
+        return self.buf[:, (self.pos - skip - k + np.arange(k)) % self.size]
+
+
+class FeatureStream:
+    # Incremental evaluation of a spec for one zone, batched over n scenarios. The
+    # state is built from the tail of the raw history; after push(values, time) the
+    # current step is `time` and features() gives that row.
+    def __init__(self, history, spec=FEATURE_SPEC, n_scenarios=1, step=None, extra_sources=()):
+        # extra_sources: further raw columns to buffer, e.g. forecast targets
+        self.spec = spec = resolve_spec(spec)
+        self.sources = list(dict.fromkeys(sources(spec) + list(extra_sources)))
+        size = lookback(spec)
+        if len(history) < size:
+            raise ValueError(f"Need at least {size} rows of history for this feature spec, got {len(history)}.")
+        self.buffers = {source: RingBuffer(history[source].iloc[-size:].to_numpy(), n_scenarios)
+                        for source in self.sources}
+        self.time = history.index[-1]
+        self.step = step if step is not None else STEP
+        # EWM through the previous step (the feature) and through the current one
+        self.ewm = {}
+        for name, s in spec.items():
+            if s["kind"] == "ewm":
+                smoothed = history[s["source"]].ewm(span=s["span"], adjust=False).mean().to_numpy()
+                self.ewm[name] = [np.full(n_scenarios, smoothed[-2]), np.full(n_scenarios, smoothed[-1])]
+
+    def current(self, source):
+        return self.buffers[source].back(1)
+
+    def push(self, values, time=None):
+        # values: {source: n_scenarios values (or a scalar)} for the next step
+        self.time = self.time + self.step if time is None else time
+        for source, buf in self.buffers.items():
+            buf.push(values[source])
+        for name, state in self.ewm.items():
+            alpha = 2 / (self.spec[name]["span"] + 1)
+            state[0] = state[1]
+            state[1] = alpha * self.current(self.spec[name]["source"]) + (1 - alpha) * state[1]
+
+    def features(self):
+        # {feature name: n_scenarios values} at the current step
+        index = pd.DatetimeIndex([self.time])
+        out = {}
+        for name, s in self.spec.items():
+            kind = s["kind"]
+            if kind == "lag":
+                out[name] = self.buffers[s["source"]].back(s["periods"] + 1)
+            elif kind == "diff":
+                buf = self.buffers[s["source"]]
+                out[name] = buf.back(1) - buf.back(s["periods"] + 1)
+            elif kind == "rolling":
+                out[name] = ROLLING_STATS[s["stat"]](self.buffers[s["source"]].window(s["window"], skip=1), axis=1)
+            elif kind == "ewm":
+                out[name] = self.ewm[name][0]
+            elif kind == "calendar":
+                out[name] = _calendar(index, s["field"])[0]
+            elif kind == "fourier":
+                out[name] = _fourier(index, s)[0]
+            else:
+                raise ValueError(f"Unknown feature kind: {kind}")
+        return out
+
+    def extend(self, rows):
+        # Feature rows for new raw rows (single scenario), one O(window) step each;
+        # same values compute_features gives on the full table
+        out = []
+        for time, row in rows.iterrows():
+            self.push({source: row[source] for source in self.sources}, time)
+            out.append({name: float(np.ravel(v)[0]) for name, v in self.features().items()})
+        features = pd.DataFrame(out, index=rows.index, columns=list(self.spec))
+        return pd.concat([rows.drop(columns=[c for c in self.spec if c in rows.columns]), features], axis=1)
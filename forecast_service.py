@@ -0,0 +1,309 @@
+# Long-running forecast service
+# Loads each zone's models and latest feature row once, on first request, into an
+# in-memory registry instead of re-reading the store and unpickling six models
+# per call.
+# A watcher thread polls model / feature / weather forecast modification times and
+# hot-swaps a zone when new artifacts or vintages appear; requests in flight finish
+# on the old version. Weather follows the zone's forecast vintage
+# (weather_forecast.future_covariates), as in RecursiveForecaster.from_store.
+#
+# Concurrent requests are queued and collected into micro-batches (up to
+# SERVICE_BATCH_WAIT_MS / SERVICE_MAX_BATCH). Each batch is one lockstep run of
+# the recursive forecaster: every request becomes a scenario row of its zone, so
+# each model does one vectorised predict per step for the whole batch. Identical
+# requests share a row.
+#
+# Usage:
+#   python forecast_service.py [--host 127.0.0.1] [--port 8080] [--cities oslo stockholm] [--preload]
+#
+#   GET  /forecast?city=oslo&days=7            -> JSON forecast
+#   GET  /forecast?city=oslo&days=7&temp_C=15  -> feature held at a scenario value
+#   GET  /zones                                -> loaded zones and versions
+#   POST /reload                               -> check for new artifacts now
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import storage
+from artifacts import latest_version
+from config import (CITIES, SERVICE_BATCH_WAIT_MS, SERVICE_HOST, SERVICE_MAX_BATCH,
+                    SERVICE_PORT, SERVICE_RELOAD_SECONDS)
+from cv_engine import TARGETS
+from ensemble import ENSEMBLE_WEIGHTS
+from forecaster import (MODEL_DIR, RecursiveForecaster, ZoneState, forecast_dates, load_ensemble,
+                        load_history)
+from weather_forecast import DATASET as WEATHER_FORECASTS
+from weather_forecast import FORECAST_DAYS, future_covariates
+
+MAX_DAYS = 60
+REQUEST_TIMEOUT = 30
+
+
+class ModelRegistry:
+    # city -> (version, ZoneState, daily weather covariates or None); a version is the
+    # zone's LATEST artifacts plus the modification times of its model pickles,
+    # feature table and weather forecast vintages
+    def __init__(self, cities, model_dir=MODEL_DIR):
+        self.cities = list(cities)
+        self.model_dir = model_dir
+        self._zones = {}
+        self._lock = threading.Lock()
+
+    def _model_files(self, city):
+        return [f"{self.model_dir}/{name}_{target.replace('_next', '')}_{city}.pkl"
+                for target in TARGETS for name in ENSEMBLE_WEIGHTS]
+
+    def version(self, city):
+        artifacts = tuple(latest_version(city, target, os.path.join(self.model_dir, "artifacts"))
+                          for target in TARGETS)
+        mtimes = [os.path.getmtime(p) if os.path.exists(p) else None for p in self._model_files(city)]
+        return (artifacts, tuple(mtimes), storage.last_modified("features", city),
+                storage.last_modified(WEATHER_FORECASTS, city))
+
+    def _load(self, city):
+        version = self.version(city)
+        zone = ZoneState(city, load_history(city), load_ensemble(city, self.model_dir))
+        daily = future_covariates(city, zone.last_time, FORECAST_DAYS)
+        return version, zone, daily if daily.notna().any().any() else None
+
+    def refresh(self, cities=None):
+        # Reload zones whose artifacts changed (default: the zones loaded so far);
+        # returns the cities swapped in
+        with self._lock:
+            cities = list(self._zones) if cities is None else cities
+        swapped = []
+        for city in cities:
+            with self._lock:
+                current = self._zones.get(city)
+            if current is not None and current[0] == self.version(city):
+                continue
+            try:
+                entry = self._load(city)
+            except (FileNotFoundError, ValueError) as e:
+                # Keep serving the previous version, if any
+                print(f"Could not load {city}: {e}")
+                continue
+            with self._lock:
+                self._zones[city] = entry
+            swapped.append(city)
+        if swapped:
+            print(f"Loaded models for: {', '.join(swapped)}")
+        return swapped
+
+    def get(self, city):
+        # Zones are loaded on first request, so start-up cost doesn't grow with the
+        # number of zones served
+        with self._lock:
+            entry = self._zones.get(city)
+        if entry is None:
+            if city not in self.cities:
+                raise KeyError(f"Unknown zone: {city}")
+            try:
+                entry = self._load(city)
+            except (FileNotFoundError, ValueError) as e:
+                raise KeyError(f"No models loaded for {city}: {e}")
+            with self._lock:
+                entry = self._zones.setdefault(city, entry)
+        return entry
+
+    def zones(self):
+        with self._lock:
+            return {city: {"last_data": str(zone.last_time), "features": len(zone.feature_cols)}
+                    for city, (_, zone, _) in self._zones.items()}
+
+    def start_watcher(self, interval_seconds=SERVICE_RELOAD_SECONDS):
+        # Daemon thread that hot-swaps zones when new artifacts appear
+        stop = threading.Event()
+
+        def _loop():
+            while not stop.wait(interval_seconds):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Model reload failed: {e}")
+
+        threading.Thread(target=_loop, name="model-registry", daemon=True).start()
+        return stop
+
+
+class ForecastRequest:
+    def __init__(self, city, n_days, overrides):
+        self.city = city
+        self.n_days = n_days
+        self.overrides = overrides
+        self.key = tuple(sorted(overrides.items()))
+        self.future = Future()
+
+
+class MicroBatcher:
+    # Single worker thread: it is the only user of the registry's ZoneStates, so
+    # their scenario buffers are never shared between runs
+    def __init__(self, registry, wait_ms=SERVICE_BATCH_WAIT_MS, max_batch=SERVICE_MAX_BATCH):
+        self.registry = registry
+        self.wait = wait_ms / 1000
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        threading.Thread(target=self._loop, name="forecast-batcher", daemon=True).start()
+
+    def submit(self, city, n_days, overrides=None):
+        request = ForecastRequest(city, n_days, overrides or {})
+        self.queue.put(request)
+        return request.future
+
+    def _loop(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._run(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _run(self, batch):
+        # Group by zone, one scenario row per distinct set of overrides
+        zones, covariates, rows, pending = {}, {}, {}, []
+        for request in batch:
+            try:
+                _, zone, daily = self.registry.get(request.city)
+                unknown = [col for col in request.overrides if col not in zone.feature_cols]
+                if unknown:
+                    raise ValueError(f"Unknown feature(s) for {request.city}: {unknown}")
+            except (KeyError, ValueError) as e:
+                request.future.set_exception(e)
+                continue
+            zones[request.city] = zone
+            if daily is not None:
+                covariates[request.city] = daily
+            keys = rows.setdefault(request.city, {})
+            keys.setdefault(request.key, len(keys))
+            pending.append(request)
+        if not pending:
+            return
+
+        overrides = {}
+        for city, keys in rows.items():
+            zone = zones[city]
+            columns = {col for key in keys for col, _ in key}
+            overrides[city] = {}
+            for col in columns:
+                default = zone.template[zone.feature_cols.index(col)]
+                values = np.full(len(keys), default)
+                for key, row in keys.items():
+                    values[row] = dict(key).get(col, default)
+                overrides[city][col] = values
+
+        n_days = max(request.n_days for request in pending)
+        counts = {city: len(keys) for city, keys in rows.items()}
+        out = RecursiveForecaster(list(zones.values()), covariates).run(n_days, counts, overrides)
+
+        for request in pending:
+            zone = zones[request.city]
+            row = rows[request.city][request.key]
+            dates = forecast_dates(zone.last_time, request.n_days)
+            result = {"datetime": [d.isoformat() for d in dates]}
+            for target, preds in out[request.city].items():
+                result[f"predicted_{target.replace('_next', '')}"] = preds[:len(dates), row].tolist()
+            request.future.set_result(result)
+
+
+class ForecastHandler(BaseHTTPRequestHandler):
+    registry = None
+    batcher = None
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/zones":
+            return self._send(200, self.registry.zones())
+        if url.path != "/forecast":
+            return self._send(404, {"error": f"Unknown path: {url.path}"})
+
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            city = params.pop("city").lower()
+            n_days = int(params.pop("days", 7))
+            if not 0 < n_days <= MAX_DAYS:
+                raise ValueError(f"days must be between 1 and {MAX_DAYS}")
+            overrides = {col: float(value) for col, value in params.items()}
+        except KeyError:
+            return self._send(400, {"error": "Missing parameter: city"})
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+
+        try:
+            result = self.batcher.submit(city, n_days, overrides).result(timeout=REQUEST_TIMEOUT)
+        except KeyError as e:
+            return self._send(404, {"error": str(e.args[0])})
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+        except FutureTimeout:
+            return self._send(504, {"error": f"Forecast not ready within {REQUEST_TIMEOUT}s"})
+        except Exception as e:
+            print(f"Forecast for {city} failed: {e!r}")
+            return self._send(500, {"error": "Internal error"})
+        self._send(200, {"city": city, **result})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/reload":
+            return self._send(404, {"error": f"Unknown path: {self.path}"})
+        self._send(200, {"reloaded": self.registry.refresh()})
+
+    def log_message(self, format, *args):
+        pass  # dashboards poll every minute; keep the console for reloads and errors
+
+
+def serve(cities=CITIES, host=SERVICE_HOST, port=SERVICE_PORT, model_dir=MODEL_DIR, preload=False):
+    registry = ModelRegistry(cities, model_dir)
+    if preload:
+        registry.refresh(registry.cities)
+    stop_watcher = registry.start_watcher()
+
+    ForecastHandler.registry = registry
+    ForecastHandler.batcher = MicroBatcher(registry)
+    server = ThreadingHTTPServer((host, port), ForecastHandler)
+    print(f"Serving forecasts for {len(registry.cities)} zone(s) on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_watcher.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve ensemble forecasts over HTTP.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--cities", nargs="+", default=CITIES, help="Zones to serve (default: all configured)")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--preload", action="store_true", help="Load every zone at start-up")
+    args = parser.parse_args()
+
+    serve(args.cities, args.host, args.port, args.model_dir, args.preload)
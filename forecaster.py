@@ -0,0 +1,213 @@
+# Vectorized recursive multi-day forecaster
+# Replaces the row-by-row loop of get_forecast. Per zone, a FeatureStream
+# (features.py) keeps the recent load / price / temperature values in NumPy ring
+# buffers (one row per scenario) and evaluates the same feature spec that built the
+# training table, so lags, differences and rolling stats follow the training
+# definitions exactly. All zones advance in lockstep: at every step each zone's
+# EnsembleForecaster gets one predict call on the (n_scenarios, n_features) batch,
+# and its predictions are pushed back into the stream for the next step. Weather
+# columns (temp_C, humidity, ...) follow the stored forecast vintage
+# (weather_forecast.py) when there is one.
+# Steps are rows of the native resolution, e.g. 168 for a 7-day hourly forecast.
+#
+#   fc = RecursiveForecaster.from_store(["oslo", "stockholm"])
+#   forecasts = fc.forecast(n_days=14)           # {city: DataFrame}
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import storage
+from cv_engine import TARGETS, feature_columns
+from ensemble import ENSEMBLE_WEIGHTS, EnsembleForecaster
+from feature_store import context_months
+from features import FEATURE_SPEC, STEP, STEPS_PER_DAY, TARGET_SOURCES, FeatureStream, lookback, sources
+from weather_forecast import FORECAST_DAYS, future_covariates
+
+MODEL_DIR = "models"
+
+
+def load_ensemble(city, model_dir=MODEL_DIR, targets=TARGETS, weights=None):
+    # EnsembleForecaster from the latest artifacts under models/artifacts (weights from
+    # their manifests), falling back to the models/{name}_{short}_{city}.pkl pickles
+    try:
+        return EnsembleForecaster.from_artifacts(city, targets, os.path.join(model_dir, "artifacts"), weights)
+    except FileNotFoundError:
+        pass
+    weights = weights or ENSEMBLE_WEIGHTS
+    members = {}
+    for target in targets:
+        short = target.replace('_next', '')
+        members[target] = {}
+        for name in (weights[target] if target in weights else weights):
+            with open(f"{model_dir}/{name}_{short}_{city}.pkl", "rb") as f:
+                members[target][name] = pickle.load(f)
+    # Members were fitted on DataFrames, so the feature order is on the model
+    feature_names = next(iter(members[targets[0]].values())).feature_names_in_
+    return EnsembleForecaster(members, weights, feature_names)
+
+
+def load_history(city, spec=FEATURE_SPEC):
+    # The recent months of features/{city} a forecast starts from (the stream's
+    # lookback and EWM warm-up), rather than the whole table
+    months = storage.list_months("features", city)
+    start = f"{months[-context_months(spec) - 1]}-01" if len(months) > context_months(spec) else None
+    return storage.read_frame("features", city, start=start)
+
+
+class ZoneState:
+    # Feature template, feature stream and models of one zone
+    def __init__(self, city, df, ensemble, spec=FEATURE_SPEC):
+        self.city = city
+        self.ensemble = ensemble
+        # Columns in the order the models were trained on
+        self.feature_cols = ensemble.feature_names or feature_columns(df)
+        missing = [col for col in self.feature_cols if col not in df.columns]
+        if missing:
+            raise ValueError(f"Feature table for {city} lacks model features: {missing}")
+        self.spec = {name: s for name, s in spec.items() if name in self.feature_cols}
+        # Raw columns fed forward step by step: spec sources and forecast targets
+        self.sources = list(dict.fromkeys(sources(self.spec) + [
+            col for col in TARGET_SOURCES.values() if col in df.columns]))
+        if len(df) < lookback(self.spec):
+            raise ValueError(f"Not enough historical data for {city} "
+                             f"(need at least {lookback(self.spec)} rows).")
+        self.history = df[self.sources]
+        self.template = df[self.feature_cols].iloc[-1].to_numpy(dtype=np.float64)
+        self.last_time = df.index[-1]
+        self.columns = {col: i for i, col in enumerate(self.feature_cols)}
+
+    def reset(self, n_scenarios, overrides=None, covariates=None):
+        # overrides: {feature column: array of n_scenarios values} held over the forecast
+        # covariates: {column: one value per step} known in advance, e.g. forecast
+        # temperature and humidity; NaN steps hold the last value. Sources are pushed
+        # into the stream, other model features written into X directly.
+        self.X = np.tile(self.template, (n_scenarios, 1))
+        self.stream = FeatureStream(self.history, self.spec, n_scenarios, extra_sources=self.sources)
+        self.overrides = {}
+        for col, values in (overrides or {}).items():
+            self.overrides[col] = np.broadcast_to(np.asarray(values, dtype=np.float64), (n_scenarios,))
+        covariates = {col: np.asarray(values, dtype=np.float64) for col, values in (covariates or {}).items()}
+        self.covariates = {col: values for col, values in covariates.items() if col in self.sources}
+        self.feature_covariates = {col: values for col, values in covariates.items()
+                                   if col in self.columns and col not in self.sources}
+        self.n_steps = 0
+
+    def inputs(self):
+        for name, values in self.stream.features().items():
+            self.X[:, self.columns[name]] = values
+        for source in self.sources:
+            if source in self.columns:
+                self.X[:, self.columns[source]] = self.stream.current(source)
+        # Row n_steps of the forecast: the covariate value of that step (row 0 is observed)
+        if self.n_steps:
+            for col, values in self.feature_covariates.items():
+                if not np.isnan(values[self.n_steps - 1]):
+                    self.X[:, self.columns[col]] = values[self.n_steps - 1]
+        # Overridden columns keep their scenario value, e.g. a temperature scenario
+        for col, values in self.overrides.items():
+            self.X[:, self.columns[col]] = values
+        return self.X
+
+    def step(self):
+        preds = self.ensemble.predict(self.inputs())
+        values = {}
+        for source in self.sources:
+            target = next((t for t, col in TARGET_SOURCES.items() if col == source), None)
+            if source in self.overrides:
+                values[source] = self.overrides[source]
+            elif target in preds:
+                values[source] = preds[target]
+            elif source in self.covariates and not np.isnan(self.covariates[source][self.n_steps]):
+                values[source] = self.covariates[source][self.n_steps]
+            else:
+                # Series that are neither forecast nor known ahead stay at their last value
+                values[source] = self.stream.current(source)
+        self.stream.push(values)
+        self.n_steps += 1
+        return preds
+
+    def covariate_steps(self, daily, n_days):
+        # Daily covariates (indexed by date) -> one value per forecast step; days past
+        # the last forecast one keep its value
+        dates = forecast_dates(self.last_time, n_days).normalize()
+        return {col: values.to_numpy() for col, values in daily.reindex(dates).ffill().items()}
+
+
+def forecast_dates(last_time, n_days, step=STEP):
+    # The n_days * (steps per day) time stamps after last_time
+    periods = n_days * int(pd.Timedelta(days=1) / step)
+    return pd.date_range(last_time + step, periods=periods, freq=step, name="datetime")
+
+
+class RecursiveForecaster:
+    def __init__(self, zones, covariates=None):
+        # covariates: {city: daily DataFrame of future source values}, see run()
+        self.zones = zones
+        self.covariates = covariates or {}
+
+    @classmethod
+    def from_store(cls, cities, model_dir=MODEL_DIR, weights=None, spec=FEATURE_SPEC, weather_forecasts=True):
+        # Zones whose models are missing are reported and left out. With
+        # weather_forecasts, each zone's weather follows the forecast vintage available
+        # at its last row (weather_forecast.py) instead of holding the last observation.
+        zones, covariates = [], {}
+        for city in cities:
+            try:
+                ensemble = load_ensemble(city, model_dir, weights=weights)
+            except FileNotFoundError as e:
+                print(f"Model missing for {city}: {e}")
+                continue
+            zone = ZoneState(city, load_history(city, spec), ensemble, spec)
+            zones.append(zone)
+            if weather_forecasts:
+                daily = future_covariates(city, zone.last_time, FORECAST_DAYS)
+                if daily.notna().any().any():
+                    covariates[city] = daily
+        return cls(zones, covariates)
+
+    def run(self, n_days, n_scenarios=1, overrides=None, covariates=None):
+        # Raw predictions {city: {target: (n_steps, n_scenarios) array}}, one row per
+        # step of the native resolution (n_days * steps per day).
+        # n_scenarios: int, or {city: count} to give zones different batch sizes
+        # overrides: {city: {feature column: n_scenarios values}}
+        # covariates: {city: DataFrame indexed by date, one column per source}, e.g.
+        # temp_C from weather_forecast.future_covariates (default: the ones from_store loaded)
+        if not isinstance(n_days, int) or n_days <= 0:
+            raise ValueError("n_days must be a positive integer.")
+        overrides = overrides or {}
+        covariates = self.covariates if covariates is None else covariates
+        counts = {zone.city: n_scenarios[zone.city] if isinstance(n_scenarios, dict) else n_scenarios
+                  for zone in self.zones}
+        for zone in self.zones:
+            daily = covariates.get(zone.city)
+            zone.reset(counts[zone.city], overrides.get(zone.city),
+                       zone.covariate_steps(daily, n_days) if daily is not None else None)
+
+        n_steps = n_days * STEPS_PER_DAY
+        out = {zone.city: {target: np.empty((n_steps, counts[zone.city])) for target in zone.ensemble.targets}
+               for zone in self.zones}
+        for step in range(n_steps):
+            for zone in self.zones:
+                for target, pred in zone.step().items():
+                    out[zone.city][target][step] = pred
+        return out
+
+    def forecast(self, n_days=7, n_scenarios=1, overrides=None, covariates=None):
+        # Returns {city: DataFrame} indexed by datetime (single scenario) or by
+        # (scenario, datetime), with predicted_demand / predicted_price columns.
+        # n_scenarios: int or {city: count}, as in run()
+        out = self.run(n_days, n_scenarios, overrides, covariates)
+        results = {}
+        for zone in self.zones:
+            count = n_scenarios[zone.city] if isinstance(n_scenarios, dict) else n_scenarios
+            dates = forecast_dates(zone.last_time, n_days)
+            columns = {f"predicted_{target.replace('_next', '')}": out[zone.city][target].T.ravel()
+                       for target in zone.ensemble.targets}
+            if count == 1:
+                index = dates
+            else:
+                index = pd.MultiIndex.from_product([range(count), dates], names=["scenario", "datetime"])
+            results[zone.city] = pd.DataFrame(columns, index=index)
+        return results
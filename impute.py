@@ -0,0 +1,232 @@
+# Gap filling for the processed tables
+# Rows used to be lost instead of repaired: the weather match kept only days with
+# weather (14_merge_weather_power.py's inner join), and every row with a NaN fell
+# out of the feature table. impute() reindexes a frame to its full grid at the native
+# resolution and fills each column's gaps by its rule (config.IMPUTE_RULES):
+#
+#   method  "time" / "linear"     gaps of up to max_gap: interpolation between the
+#                                 observations on either side (by time / by row)
+#   long    "seasonal"            longer gaps: the value `season` earlier (e.g. the
+#                                 same hour last week), up to MAX_SEASONS seasons
+#                                 back, then forward
+#           "model"               least squares on calendar terms (weekday, hour,
+#                                 yearly cycle) plus the rule's covariates
+#           None                  left missing
+#
+# Whatever a long strategy leaves inside the span is interpolated. Only gaps
+# between a column's first and last observation are filled, so nothing is
+# extrapolated past the data (e.g. tomorrow's load).
+# Text columns carry their last label over the gap.
+# Every filled column gets a {col}_imputed code: 0 observed (or still missing),
+# 1 interpolated, 2 seasonal, 3 model.
+#
+# Columns with the same rule are filled together as one matrix, and
+# impute_zones() puts all zones side by side, so one pass fills a column for every
+# zone at once.
+#
+#   python impute.py [--cities oslo] [--dataset processed]   # fill the stored tables in place
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import storage
+from config import CITIES, DEFAULT_IMPUTE_RULE, IMPUTE_RULES
+from features import DAY_NS, IMPUTED_SUFFIX, STEP
+
+CODES = {"interpolate": 1, "seasonal": 2, "model": 3}
+MAX_SEASONS = 4
+
+
+def _name(key):
+    # Column name without the zone level of impute_zones' wide frame
+    return key[-1] if isinstance(key, tuple) else key
+
+
+def _mask_key(key):
+    return key[:-1] + (key[-1] + IMPUTED_SUFFIX,) if isinstance(key, tuple) else key + IMPUTED_SUFFIX
+
+
+def _covariate_key(key, covariate):
+    return key[:-1] + (covariate,) if isinstance(key, tuple) else covariate
+
+
+def _rows(duration, step):
+    return max(1, int(pd.Timedelta(duration) / step))
+
+
+def _neighbours(missing):
+    # Row of the previous and of the next observation of every cell (-1 / n if none)
+    n = len(missing)
+    rows = np.arange(n)[:, None]
+    prev = np.maximum.accumulate(np.where(missing, -1, rows), axis=0)
+    nxt = np.minimum.accumulate(np.where(missing, n, rows)[::-1], axis=0)[::-1]
+    return prev, nxt
+
+
+def _interpolate(values, prev, nxt, positions, fill):
+    # Interpolates the `fill` cells between their neighbouring observations
+    n, m = values.shape
+    p, q = np.clip(prev, 0, n - 1), np.clip(nxt, 0, n - 1)
+    cols = np.arange(m)[None, :]
+    lo, hi = values[p, cols], values[q, cols]
+    span = positions[q] - positions[p]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = np.where(span > 0, (positions[:, None] - positions[p]) / span, 0.0)
+    return np.where(fill, lo + (hi - lo) * weight, values)
+
+
+def _seasonal(values, todo, season):
+    # The value k seasons earlier (k = 1..MAX_SEASONS), then k seasons later
+    filled = values.copy()
+    for k in [*range(1, MAX_SEASONS + 1), *range(-1, -MAX_SEASONS - 1, -1)]:
+        shift = k * season
+        if abs(shift) >= len(values):
+            continue
+        shifted = np.full_like(values, np.nan)
+        if shift > 0:
+            shifted[shift:] = values[:-shift]
+        else:
+            shifted[:shift] = values[-shift:]
+        use = todo & np.isnan(filled) & ~np.isnan(shifted)
+        filled[use] = shifted[use]
+    return filled
+
+
+def _design(index, step):
+    # Intercept, weekday and hour dummies and the yearly cycle
+    columns = [np.ones(len(index))]
+    columns += [(index.dayofweek == d).astype(np.float64) for d in range(1, 7)]
+    if step < pd.Timedelta(days=1):
+        columns += [(index.hour == h).astype(np.float64) for h in range(1, 24)]
+    days = index.asi8 / DAY_NS
+    columns += [np.sin(2 * np.pi * days / 365.25), np.cos(2 * np.pi * days / 365.25)]
+    return np.column_stack(columns)
+
+
+def _model(column, todo, calendar, covariates):
+    # Least squares fit on the observed rows, predicted for the `todo` rows
+    X = np.column_stack([calendar, covariates]) if covariates.size else calendar
+    known = ~np.isnan(X).any(axis=1)
+    train, predict = known & ~np.isnan(column), known & todo
+    if train.sum() <= X.shape[1] or not predict.any():
+        return column
+    coef, *_ = np.linalg.lstsq(X[train], column[train], rcond=None)
+    out = column.copy()
+    out[predict] = X[predict] @ coef
+    return out
+
+
+def _rule(key, rules):
+    return rules.get(_name(key), DEFAULT_IMPUTE_RULE)
+
+
+def impute(df, rules=IMPUTE_RULES, step=STEP):
+    # df on the full grid at `step` with the gaps of its numeric columns filled and a
+    # {col}_imputed code per filled column
+    if df.empty:
+        return df
+    grid = pd.date_range(df.index.min(), df.index.max(), freq=step)
+    df = df.reindex(grid.union(df.index))
+    keys = [key for key in df.select_dtypes("number").columns
+            if not _name(key).endswith(IMPUTED_SUFFIX) and _rule(key, rules) is not None]
+    positions = {"time": df.index.asi8.astype(np.float64), "linear": np.arange(len(df), dtype=np.float64)}
+    filled, codes = {}, {}
+
+    # Columns with covariates last, so their covariates are already filled
+    groups = {}
+    for key in keys:
+        rule = _rule(key, rules)
+        params = (rule["method"], rule["max_gap"], rule.get("long"), rule.get("season"))
+        groups.setdefault((bool(rule.get("covariates")), params), []).append(key)
+    calendar = None
+    for (_, (method, max_gap, long, season)), group in sorted(groups.items(), key=lambda g: g[0][0]):
+        values = df[group].to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        prev, nxt = _neighbours(missing)
+        inside = missing & (prev >= 0) & (nxt < len(values))
+        short = inside & (nxt - prev - 1 <= _rows(max_gap, step))
+        code = np.zeros(values.shape, dtype=np.int8)
+
+        out = _interpolate(values, prev, nxt, positions[method], short)
+        code[short] = CODES["interpolate"]
+        todo = inside & ~short
+        if long == "seasonal" and todo.any():
+            out = _seasonal(out, todo, _rows(season, step))
+        elif long == "model" and todo.any():
+            calendar = _design(df.index, step) if calendar is None else calendar
+            for j, key in enumerate(group):
+                covariates = [filled.get(c, df[c].to_numpy(dtype=np.float64))
+                              for c in (_covariate_key(key, name) for name in _rule(key, rules).get("covariates", []))
+                              if c in df.columns]
+                cov = np.column_stack(covariates) if covariates else np.empty((len(df), 0))
+                out[:, j] = _model(out[:, j], todo[:, j], calendar, cov)
+        if long is not None:
+            code[todo & ~np.isnan(out)] = CODES[long]
+        # Whatever the long strategy left inside the span: interpolated (long gaps of a
+        # rule without one stay missing)
+        rest = inside & np.isnan(out) if long is not None else np.zeros_like(inside)
+        if rest.any():
+            out = _interpolate(out, *_neighbours(np.isnan(out)), positions[method], rest)
+            code[rest] = CODES["interpolate"]
+        for j, key in enumerate(group):
+            filled[key], codes[_mask_key(key)] = out[:, j], code[:, j]
+
+    out = df.copy()
+    for key, column in filled.items():
+        out[key] = column
+    # Text columns (weather name / description) carry the last label over the gap
+    for key in df.select_dtypes(exclude="number").columns:
+        out[key] = out[key].ffill(limit_area="inside")
+    for key, code in codes.items():
+        # Re-imputing a filled table keeps the codes of the earlier fills
+        previous = out[key].fillna(0).to_numpy(dtype=np.int8) if key in out.columns else 0
+        out[key] = np.where(code > 0, code, previous).astype(np.int8)
+    return out
+
+
+def impute_zones(frames, rules=IMPUTE_RULES, step=STEP):
+    # {zone: frame} -> {zone: imputed frame}, all zones filled in one pass over a
+    # wide frame (columns (zone, col)); each zone keeps its own time span
+    frames = {zone: df for zone, df in frames.items() if not df.empty}
+    if not frames:
+        return {}
+    wide = impute(pd.concat(frames, axis=1), rules, step)
+    out = {}
+    for zone, df in frames.items():
+        zone_df = wide[zone]
+        out[zone] = zone_df[(zone_df.index >= df.index.min()) & (zone_df.index <= df.index.max())]
+    return out
+
+
+def reach(rules=IMPUTE_RULES):
+    # How far a fill looks from the gap: raw data needed around an out-of-core chunk
+    spans = [pd.Timedelta(rule["max_gap"]) for rule in [*rules.values(), DEFAULT_IMPUTE_RULE] if rule]
+    spans += [MAX_SEASONS * pd.Timedelta(rule["season"]) for rule in [*rules.values(), DEFAULT_IMPUTE_RULE]
+              if rule and rule.get("long") == "seasonal"]
+    return max(spans, default=pd.Timedelta(0))
+
+
+def summary(df):
+    # {column: {strategy: values filled}}
+    names = {code: name for name, code in CODES.items()}
+    out = {}
+    for col in df.columns:
+        if isinstance(col, str) and col.endswith(IMPUTED_SUFFIX):
+            counts = df[col].value_counts()
+            filled = {names[int(c)]: int(n) for c, n in counts.items() if c in names}
+            if filled:
+                out[col[:-len(IMPUTED_SUFFIX)]] = filled
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the gaps of stored tables in place.")
+    parser.add_argument("--dataset", default="processed")
+    parser.add_argument("--cities", nargs="+", default=CITIES)
+    args = parser.parse_args()
+
+    frames = {city: storage.read_frame(args.dataset, city) for city in args.cities if storage.exists(args.dataset, city)}
+    for city, df in impute_zones(frames).items():
+        storage.write_frame(args.dataset, city, df, mode="overwrite")
+        print(f"{args.dataset}/{city}: {len(frames[city])} -> {len(df)} rows, filled {summary(df) or 'nothing'}")
@@ -0,0 +1,49 @@
+# One-off import of the legacy per-city CSV files into the columnar store
+# Usage: python migrate_csv_to_store.py
+import glob
+import os
+import re
+
+import pandas as pd
+
+import storage
+from config import DATA_DIR
+
+# (glob pattern, dataset, regex extracting the zone from the file name)
+SOURCES = [
+    ("entsoe/*_demand.csv", "demand", r"(\w+)_demand\.csv"),
+    ("entsoe/*_demand_hourly.csv", "demand_hourly", r"(\w+)_demand_hourly\.csv"),
+    ("entsoe/*_price.csv", "price", r"(\w+)_price\.csv"),
+    ("entsoe/*_power.csv", "power", r"(\w+)_power\.csv"),
+    ("processed/*_power.csv", "power", r"(\w+)_power\.csv"),
+    ("weather/*_current_new.csv", "weather", r"(\w+)_current_new\.csv"),
+    ("processed/*_power_with_weather.csv", "processed", r"(\w+)_power_with_weather\.csv"),
+    ("features/*_features.csv", "features", r"(\w+)_features\.csv"),
+    ("forecast/forecast_*.csv", "forecast", r"forecast_(\w+)\.csv"),
+]
+
+OFFSET = re.compile(r"[+-]\d\d:\d\d$")
+
+
+def load_legacy_csv(path):
+    df = pd.read_csv(path)
+    time_col = "datetime" if "datetime" in df.columns else df.columns[0]
+    values = df.pop(time_col).astype(str)
+    # Raw ENTSO-E files carry UTC offsets (which change with DST); derived files are naive UTC
+    if values.str.contains(OFFSET).any():
+        df.index = pd.to_datetime(values, utc=True)
+    else:
+        df.index = pd.to_datetime(values)
+    return df
+
+
+for pattern, dataset, name_re in SOURCES:
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, pattern))):
+        match = re.fullmatch(name_re, os.path.basename(path))
+        if not match:
+            continue
+        zone = match.group(1)
+        df = load_legacy_csv(path)
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+        storage.write_frame(dataset, zone, df)
+        print(f"✅ {path} -> {dataset}/{zone} ({len(df)} rows)")
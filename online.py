@@ -0,0 +1,122 @@
+# Online model updates
+# Instead of refitting all three members on the whole history (21 / 22 / 25), an
+# update takes the feature rows added since the LATEST artifact's training window
+# and publishes a new artifact version from them:
+#   - Ridge adds the new rows to its sufficient statistics (n, sum x, sum y, X'X,
+#     X'y, kept in ridge.npz) and re-solves a p x p system. Artifacts trained before
+#     the statistics were stored get them from one pass over the history, once.
+#   - XGBoost continues boosting from the saved booster for a few rounds.
+#   - RandomForest replaces its oldest fraction of trees with new ones.
+# The new trees are fitted on the new rows plus the most recent ONLINE_WINDOW rows,
+# so the cost of a daily update does not grow with the history. Ensemble weights are
+# kept; the service / forecasters pick up the new version through LATEST. Every
+# update adds XGBoost trees, so after MAX_ONLINE_UPDATES a full retrain is advised.
+import os
+
+import numpy as np
+import pandas as pd
+
+import storage
+from artifacts import ARTIFACT_DIR, FlatForest, load_artifact, update_manifest
+from backtest import IncrementalRidge
+from cv_engine import load_tuned_params, model_params
+from ensemble import make_model
+from features import STEP
+
+ONLINE_WINDOW = 90
+XGB_UPDATE_ROUNDS = 10
+RF_REPLACE_FRACTION = 0.1
+MAX_ONLINE_UPDATES = 30
+
+
+def new_rows(df, artifact):
+    # Feature rows after the artifact's training window
+    window = artifact.manifest.get("training_window")
+    if window is None:
+        raise ValueError(f"{artifact.path} has no training window; retrain it before updating online.")
+    return df[df.index > pd.Timestamp(window["end"])]
+
+
+def ridge_state(artifact, history, target, alpha):
+    # IncrementalRidge with the statistics of the artifact's training rows
+    entry = artifact.manifest["members"]["ridge"]
+    if entry.get("stats"):
+        with np.load(os.path.join(artifact.path, entry["file"])) as data:
+            model = IncrementalRidge(alpha=float(data["alpha"]))
+            model.n = int(data["n"])
+            model.sx, model.sy = data["sx"], float(data["sy"])
+            model.xtx, model.xty = data["xtx"], data["xty"]
+        return model
+    # First online update of this artifact: rebuild the statistics once
+    X = history[artifact.feature_names].to_numpy(dtype=np.float64)
+    return IncrementalRidge(alpha=alpha).fit(X, history[target].to_numpy(dtype=np.float64))
+
+
+def update_ridge(model, X_new, y_new):
+    return model.add(X_new, y_new).solve()
+
+
+def update_xgb(booster, X_recent, y_recent, params, rounds=XGB_UPDATE_ROUNDS):
+    # Continue boosting the saved booster on the recent rows
+    model = make_model('xgb', {**params, 'n_estimators': rounds})
+    return model.fit(X_recent, y_recent, xgb_model=booster).get_booster()
+
+
+def update_rf(forest, X_recent, y_recent, params, fraction=RF_REPLACE_FRACTION, seed=0):
+    # Drop the oldest `fraction` of trees and append as many fitted on the recent rows
+    n_trees = len(forest.roots)
+    n_new = max(1, int(round(n_trees * fraction)))
+    fresh = make_model('rf', {**params, 'n_estimators': n_new,
+                              'random_state': params.get('random_state', 0) + seed}).fit(X_recent, y_recent)
+    kept = [forest.tree_slice(n_new)] if n_new < n_trees else []
+    return FlatForest.concat(kept + [FlatForest.from_forest(fresh)])
+
+
+def update_zone(city, target, df=None, root=ARTIFACT_DIR, window=ONLINE_WINDOW, tuned=None):
+    # Publishes a new artifact version from the rows added since LATEST; returns its
+    # path, or None if there is nothing new
+    artifact = load_artifact(city, target, root)
+    members = artifact.manifest["members"]
+    if df is None:
+        # Only the new rows and the refit window before them, unless the Ridge
+        # statistics still have to be rebuilt from the whole history (once)
+        rebuild = "ridge" in members and not members["ridge"].get("stats")
+        window_end = (artifact.manifest.get("training_window") or {}).get("end")
+        start = None if rebuild or window_end is None else pd.Timestamp(window_end) - window * STEP
+        df = storage.read_frame("features", city, start=start)
+    added = new_rows(df, artifact).dropna(subset=[target])
+    if added.empty:
+        return None
+
+    params = model_params(city, target, tuned=load_tuned_params() if tuned is None else tuned)
+    features = artifact.feature_names
+    online = artifact.manifest.get("online", {"updates": 0, "rows_added": 0})
+    end = added.index[-1]
+    recent = df[df.index <= end].dropna(subset=[target]).iloc[-(len(added) + window):]
+    X_recent = recent[features].astype(np.float32)
+    y_recent = recent[target].to_numpy(dtype=np.float64)
+
+    models = {}
+    if "ridge" in members:
+        history = None if members["ridge"].get("stats") else df[df.index < added.index[0]].dropna(subset=[target])
+        ridge = ridge_state(artifact, history, target, params["ridge"]["alpha"])
+        models["ridge"] = update_ridge(ridge, added[features].to_numpy(dtype=np.float64),
+                                       added[target].to_numpy(dtype=np.float64))
+    if "xgb" in members:
+        models["xgb"] = update_xgb(artifact.member("xgb").booster, X_recent, y_recent, params["xgb"])
+    if "rf" in members:
+        models["rf"] = update_rf(artifact.member("rf"), X_recent, y_recent, params["rf"],
+                                 seed=online["updates"] + 1)
+
+    window_info = artifact.manifest["training_window"]
+    changes = {
+        "training_window": {"start": window_info["start"], "end": str(end),
+                            "n_rows": window_info["n_rows"] + len(added)},
+        "online": {"updates": online["updates"] + 1, "rows_added": online["rows_added"] + len(added),
+                   "last_rows": len(added), "recent_window": len(recent)},
+    }
+    path = update_manifest(city, target, changes, root, models=models)
+    if changes["online"]["updates"] >= MAX_ONLINE_UPDATES:
+        print(f"{city}/{target}: {changes['online']['updates']} online updates since the last full "
+              f"training; consider retraining with 25_ensemble_model.py")
+    return path
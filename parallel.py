@@ -0,0 +1,91 @@
+# Process-pool runner for independent per-city / per-target jobs
+# Used by the training, diagnostics and evaluation scripts (19-23). Each job runs
+# in its own process with a fixed thread budget so XGBoost / RandomForest /
+# BLAS threads from concurrent jobs don't oversubscribe the cores. Output printed
+# by a job is captured and replayed in submission order, and results come back
+# keyed in the same order, so runs are deterministic regardless of scheduling.
+#
+#   results = run_jobs(train_city, [("oslo", ("oslo",)), ("stockholm", ("stockholm",))])
+import contextlib
+import io
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from config import MAX_WORKERS, THREADS_PER_JOB
+
+# Environment variables read by OpenMP / BLAS runtimes when a worker starts
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]
+
+
+def job_threads():
+    # Thread budget of the current job; pass it as n_jobs to the models
+    return int(os.getenv("JOB_THREADS", os.cpu_count() or 1))
+
+
+def _set_thread_env(threads):
+    os.environ["JOB_THREADS"] = str(threads)
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+
+
+def _init_worker(threads):
+    _set_thread_env(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+
+def _run_job(fn, args):
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        result = fn(*args)
+    return result, buf.getvalue()
+
+
+@contextlib.contextmanager
+def _thread_env(threads):
+    # Spawned workers inherit the parent's environment at start-up
+    saved = {var: os.environ.get(var) for var in THREAD_ENV_VARS + ["JOB_THREADS"]}
+    _set_thread_env(threads)
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def run_jobs(fn, jobs, max_workers=None, threads_per_job=None):
+    # jobs: list of (key, args). fn must be importable (module level) so it can be
+    # sent to spawned workers. Returns {key: result} in job order.
+    jobs = list(jobs)
+    if not jobs:
+        return {}
+    workers = max(1, min(max_workers or MAX_WORKERS, len(jobs)))
+    threads = threads_per_job or THREADS_PER_JOB or max(1, (os.cpu_count() or 1) // workers)
+    print(f"Running {len(jobs)} jobs on {workers} worker(s), {threads} thread(s) each")
+
+    results = {}
+    with _thread_env(threads):
+        if workers == 1:
+            for key, args in jobs:
+                result, log = _run_job(fn, args)
+                print(log, end="")
+                results[key] = result
+            return results
+
+        # spawn (not fork) so OpenMP runtimes start clean in every worker
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(threads,)) as pool:
+            futures = [(key, pool.submit(_run_job, fn, args)) for key, args in jobs]
+            for key, future in futures:
+                result, log = future.result()
+                print(log, end="")
+                results[key] = result
+    return results
@@ -0,0 +1,84 @@
+# Stacking: ensemble weights learned from out-of-fold predictions
+# The CV engine keeps every member's out-of-fold (OOF) predictions; here the blend
+# weights for each zone and target are solved from them by non-negative least
+# squares, constrained to sum to one, instead of the fixed 0.2 / 0.3 / 0.5. The
+# OOF arrays are cached in the store (oof_{demand,price}/{city}), so weights can be
+# re-solved later without retraining any member:
+#
+#   python stacking.py            # re-solve from cached OOF, publish new manifests
+import argparse
+import os
+
+import numpy as np
+from scipy.optimize import nnls
+
+import storage
+from artifacts import ARTIFACT_DIR, update_manifest
+from config import CITIES
+from ensemble import ENSEMBLE_WEIGHTS, evaluate_model
+
+# Weight of the extra row that ties the solution to sum(w) = 1, relative to the data
+SUM_PENALTY = 100.0
+
+
+def solve_weights(oof, y_true, sum_to_one=True):
+    # oof: {member name: predictions}. Returns {member name: weight >= 0}
+    names = list(oof)
+    A = np.column_stack([np.asarray(oof[name], dtype=np.float64) for name in names])
+    b = np.asarray(y_true, dtype=np.float64)
+    if sum_to_one:
+        scale = SUM_PENALTY * np.sqrt(len(b)) * max(np.abs(b).max(), 1.0)
+        A = np.vstack([A, np.full(len(names), scale)])
+        b = np.append(b, scale)
+    weights, _ = nnls(A, b)
+    if not weights.any():
+        return {name: ENSEMBLE_WEIGHTS[name] for name in names}
+    if sum_to_one:
+        weights = weights / weights.sum()
+    return {name: float(w) for name, w in zip(names, weights)}
+
+
+def forward_blend(oof, y_true, fold_sizes, sum_to_one=True):
+    # Out-of-sample stacked predictions: every fold after the first blended with
+    # weights solved on the folds before it. Returns (predictions, first row scored).
+    bounds = np.cumsum([0, *fold_sizes])
+    preds = []
+    for lo, hi in zip(bounds[1:-1], bounds[2:]):
+        weights = solve_weights({name: p[:lo] for name, p in oof.items()}, y_true[:lo], sum_to_one)
+        preds.append(sum(w * oof[name][lo:hi] for name, w in weights.items()))
+    return np.concatenate(preds), bounds[1]
+
+
+def oof_dataset(target):
+    # Store dataset holding y_true and each member's OOF predictions for a target
+    return f"oof_{target.replace('_next', '')}"
+
+
+def restack(city, target, root=ARTIFACT_DIR):
+    # Re-solve weights from the cached OOF and publish them in a new manifest version
+    oof = storage.read_frame(oof_dataset(target), city)
+    members = {name: oof[name].to_numpy() for name in oof.columns if name != "y_true"}
+    weights = solve_weights(members, oof["y_true"])
+    blended = sum(w * members[name] for name, w in weights.items())
+    mae, rmse = evaluate_model(oof["y_true"], blended)
+    path = update_manifest(city, target, {"weights": weights, "stacking": {"oof_mae": mae, "oof_rmse": rmse}}, root)
+    return weights, mae, path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-solve ensemble weights from cached OOF predictions.")
+    parser.add_argument("--cities", nargs="+", default=CITIES)
+    parser.add_argument("--model-dir", default="models")
+    args = parser.parse_args()
+
+    from cv_engine import TARGETS  # cv_engine imports this module
+
+    for city in args.cities:
+        for target in TARGETS:
+            try:
+                weights, mae, path = restack(city, target, os.path.join(args.model_dir, "artifacts"))
+            except FileNotFoundError as e:
+                print(f"Skipped {city}/{target}: {e}")
+                continue
+            shown = ", ".join(f"{name}={w:.3f}" for name, w in weights.items())
+            print(f"{city}/{target}: {shown} (in-sample OOF MAE {mae:.2f}) -> {path}")
@@ -0,0 +1,305 @@
+# Columnar storage for every stage of the pipeline
+# Each dataset (demand, price, weather, power, processed, features, forecast) is
+# stored as typed Parquet files partitioned by zone and month:
+#
+#   data/store/{dataset}/zone={zone}/month={YYYY-MM}/part.parquet
+#
+# Frames are indexed by a DatetimeIndex called "datetime". Reads can project
+# columns and push a [start, end) time range down to partition pruning and
+# Parquet row-group filtering, so nothing outside the requested window is parsed.
+#
+# Raw observations are ingested through an append-only log instead:
+#
+#   data/store/{dataset}/zone={zone}/_log/seg-{seq}.parquet
+#
+# append() writes one small segment per delta. compact() later folds segments
+# into the month partitions (last writer wins on duplicate timestamps) and
+# deletes them. read_frame() always merges pending segments on top of the
+# partitions, so readers see a consistent view whether or not compaction ran.
+import itertools
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import DATA_DIR
+
+STORE_DIR = os.path.join(DATA_DIR, "store")
+INDEX_COL = "datetime"
+LOG_DIR = "_log"
+
+_seq = itertools.count()
+_compact_locks = {}
+_compact_locks_guard = threading.Lock()
+
+
+def zone_path(dataset, zone):
+    return os.path.join(STORE_DIR, dataset, f"zone={zone.lower()}")
+
+
+def _partition_file(dataset, zone, month):
+    return os.path.join(zone_path(dataset, zone), f"month={month}", "part.parquet")
+
+
+def _utc_naive(ts):
+    # Month keys and range checks are always computed on naive UTC time
+    ts = pd.Timestamp(ts)
+    return ts.tz_convert("UTC").tz_localize(None) if ts.tz is not None else ts
+
+
+def _month_keys(index):
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return index.strftime("%Y-%m")
+
+
+def list_zones(dataset):
+    root = os.path.join(STORE_DIR, dataset)
+    if not os.path.isdir(root):
+        return []
+    return sorted(d.split("=", 1)[1] for d in os.listdir(root) if d.startswith("zone="))
+
+
+def list_months(dataset, zone):
+    root = zone_path(dataset, zone)
+    if not os.path.isdir(root):
+        return []
+    return sorted(d.split("=", 1)[1] for d in os.listdir(root)
+                  if d.startswith("month=") and os.path.exists(os.path.join(root, d, "part.parquet")))
+
+
+def log_path(dataset, zone):
+    return os.path.join(zone_path(dataset, zone), LOG_DIR)
+
+
+def list_segments(dataset, zone):
+    # Segment names sort in write order, which is what last-writer-wins relies on
+    root = log_path(dataset, zone)
+    if not os.path.isdir(root):
+        return []
+    return sorted(os.path.join(root, f) for f in os.listdir(root)
+                  if f.startswith("seg-") and f.endswith(".parquet"))
+
+
+def exists(dataset, zone):
+    return len(list_months(dataset, zone)) > 0 or len(list_segments(dataset, zone)) > 0
+
+
+def last_modified(dataset, zone):
+    # Latest mtime of the zone's partitions and pending segments (0.0 if empty);
+    # cheap enough to poll for changes
+    paths = [_partition_file(dataset, zone, m) for m in list_months(dataset, zone)] + list_segments(dataset, zone)
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except FileNotFoundError:
+            pass  # compacted away since listing
+    return max(mtimes, default=0.0)
+
+
+def fingerprint(dataset, zone):
+    # {month: "size-mtime_ns"} of the zone's partitions, plus "_log" for pending
+    # segments (which may touch any month); changes whenever a partition is rewritten
+    prints = {}
+    for month in list_months(dataset, zone):
+        try:
+            st = os.stat(_partition_file(dataset, zone, month))
+        except FileNotFoundError:
+            continue
+        prints[month] = f"{st.st_size}-{st.st_mtime_ns}"
+    segments = list_segments(dataset, zone)
+    if segments:
+        prints[LOG_DIR] = ",".join(os.path.basename(p) for p in segments)
+    return prints
+
+
+def _prepare(df):
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError("Frames written to the store must have a DatetimeIndex.")
+    df = df.copy()
+    if df.index.tz is not None:
+        df.index = df.index.tz_convert("UTC")
+    df.index.name = INDEX_COL
+    return df
+
+
+def _write_partition(path, df):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    tmp = f"{path}.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)  # readers never see a half-written partition
+
+
+def _read_partition(path, columns=None, filters=None):
+    cols = None if columns is None else [INDEX_COL] + [c for c in columns if c != INDEX_COL]
+    table = pq.read_table(path, columns=cols, filters=filters)
+    df = table.to_pandas()
+    if INDEX_COL in df.columns:
+        df = df.set_index(INDEX_COL)
+    return df
+
+
+def write_frame(dataset, zone, df, mode="upsert"):
+    # upsert: merge into the months the frame touches (last writer wins on
+    # duplicate timestamps); other months are left untouched.
+    # overwrite: replace everything stored for the zone.
+    if mode not in ("upsert", "overwrite"):
+        raise ValueError(f"Unknown write mode: {mode}")
+    df = _prepare(df)
+
+    if mode == "overwrite" and os.path.isdir(zone_path(dataset, zone)):
+        shutil.rmtree(zone_path(dataset, zone))
+
+    for month, part in df.groupby(_month_keys(df.index), sort=True):
+        path = _partition_file(dataset, zone, month)
+        if mode == "upsert" and os.path.exists(path):
+            part = pd.concat([_read_partition(path), part])
+            part = part[~part.index.duplicated(keep="last")]
+        _write_partition(path, part.sort_index())
+
+
+def _range_filters(path, start, end):
+    # Compare against the stored column type (tz-aware UTC or naive)
+    tz = pq.read_schema(path).field(INDEX_COL).type.tz
+    filters = []
+    for op, ts in ((">=", start), ("<", end)):
+        if ts is None:
+            continue
+        ts = _utc_naive(ts)
+        filters.append((INDEX_COL, op, ts.tz_localize("UTC") if tz else ts))
+    return filters or None
+
+
+def _dedup_last(df):
+    # Stable sort keeps write order among equal timestamps, so keep="last" is LWW
+    df = df.sort_index(kind="stable")
+    return df[~df.index.duplicated(keep="last")]
+
+
+def _read_merged(dataset, zone, columns, start, end):
+    # Segments are listed before partitions are read: a compaction that finishes
+    # in between has already written its rows to the partitions we are about to read
+    segments = list_segments(dataset, zone)
+
+    lo = _utc_naive(start).strftime("%Y-%m") if start is not None else None
+    hi = _utc_naive(end).strftime("%Y-%m") if end is not None else None
+    months = [m for m in list_months(dataset, zone)
+              if (lo is None or m >= lo) and (hi is None or m <= hi)]
+    if not months and not segments:
+        raise FileNotFoundError(f"No data stored for {dataset}/{zone}")
+
+    paths = [_partition_file(dataset, zone, m) for m in months] + segments
+    parts = []
+    for path in paths:
+        filters = _range_filters(path, start, end) if (start is not None or end is not None) else None
+        parts.append(_read_partition(path, columns, filters))
+    df = pd.concat(parts) if len(parts) > 1 else parts[0]
+    if segments:
+        df = _dedup_last(df)
+    df.index.name = INDEX_COL
+    return df
+
+
+def read_frame(dataset, zone, columns=None, start=None, end=None):
+    # Only month partitions overlapping [start, end) are opened, plus any
+    # segments still waiting for compaction
+    for attempt in range(3):
+        try:
+            return _read_merged(dataset, zone, columns, start, end)
+        except FileNotFoundError:
+            # A segment was compacted away while we were reading; the rows are in
+            # the partitions now, so a fresh listing gives the same merged view
+            if attempt == 2 or not exists(dataset, zone):
+                raise
+
+
+def append(dataset, zone, df):
+    # O(len(df)): writes one new segment and never touches existing files
+    df = _prepare(df)
+    if df.empty:
+        return None
+    df = df[~df.index.duplicated(keep="last")]
+    name = f"seg-{time.time_ns():020d}-{os.getpid():07d}-{next(_seq):06d}.parquet"
+    path = os.path.join(log_path(dataset, zone), name)
+    _write_partition(path, df)
+    return path
+
+
+def _zone_lock(dataset, zone):
+    with _compact_locks_guard:
+        return _compact_locks.setdefault((dataset, zone.lower()), threading.Lock())
+
+
+def compact(dataset, zone):
+    # Fold the segments present right now into the month partitions. Segments
+    # appended while this runs are left for the next compaction.
+    lock = _zone_lock(dataset, zone)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        segments = list_segments(dataset, zone)
+        if not segments:
+            return 0
+        delta = _dedup_last(pd.concat([_read_partition(p) for p in segments]))
+
+        for month, part in delta.groupby(_month_keys(delta.index), sort=True):
+            path = _partition_file(dataset, zone, month)
+            if os.path.exists(path):
+                part = _dedup_last(pd.concat([_read_partition(path), part]))
+            _write_partition(path, part)
+
+        for path in segments:
+            os.remove(path)
+        return len(segments)
+    finally:
+        lock.release()
+
+
+def compact_all(datasets, min_segments=1):
+    # Compact every zone of the given datasets that has at least min_segments pending
+    compacted = {}
+    for dataset in datasets:
+        for zone in list_zones(dataset):
+            if len(list_segments(dataset, zone)) >= min_segments:
+                compacted[f"{dataset}/{zone}"] = compact(dataset, zone)
+    return compacted
+
+
+def start_background_compaction(datasets, interval_seconds=300, min_segments=24):
+    # Daemon thread that periodically compacts zones with enough pending segments
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval_seconds):
+            try:
+                compact_all(datasets, min_segments)
+            except Exception as e:
+                print(f"Background compaction failed: {e}")
+
+    threading.Thread(target=_loop, name="store-compaction", daemon=True).start()
+    return stop
+
+
+def replace(source, dataset, zone):
+    # Moves source/{zone} over dataset/{zone} by renaming directories, so readers see
+    # the old or the new zone and never a mix of the two
+    src, dst = zone_path(source, zone), zone_path(dataset, zone)
+    old = os.path.join(os.path.dirname(dst), f".old-{os.path.basename(dst)}")
+    shutil.rmtree(old, ignore_errors=True)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.isdir(dst):
+        os.replace(dst, old)
+    if os.path.isdir(src):
+        os.replace(src, dst)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def delete(dataset, zone):
+    if os.path.isdir(zone_path(dataset, zone)):
+        shutil.rmtree(zone_path(dataset, zone))
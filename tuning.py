@@ -0,0 +1,232 @@
+# Hyperparameter search for the ensemble members, per zone and target
+# Successive halving: many sampled configurations are scored on the most recent
+# time-series fold, the best 1/eta move on to more folds, and so on until the
+# survivors are scored on all folds. Per city the feature matrix comes from the
+# feature store (cv_engine.build_matrix) and is memory-mapped by every trial, and the
+# trials of a rung run in parallel on the process pool. XGBoost trials stop
+# boosting early on a validation tail of their training window, and the number
+# of rounds they reached becomes the tuned n_estimators.
+#
+# Every finished (config, fold) trial is appended to
+# models/tuning/{city}_{demand,price}.jsonl with the feature matrix key (spec
+# version + processed-data fingerprint) and n_splits it was scored with;
+# configurations are sampled from a fixed seed, so a resumed search regenerates
+# the same configs and only runs the trials missing from the log. Records of another
+# matrix or fold layout (e.g. after the nightly data growth) are ignored. Winners go to models/tuning/best_params.json,
+# which run_cv picks up for training.
+#
+#   python tuning.py [--cities oslo] [--models xgb rf] [--configs 27] [--eta 3] [--max-workers 4]
+import argparse
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+from backtest import time_series_folds
+from config import CITIES
+from cv_engine import (N_SPLITS, TARGETS, TUNED_PARAMS_FILE, build_matrix,
+                       load_tuned_params)
+from ensemble import MODEL_PARAMS, evaluate_model, make_model
+from parallel import run_jobs
+
+TUNING_DIR = os.path.dirname(TUNED_PARAMS_FILE)
+
+# Validation tail of each XGBoost training window used for early stopping
+XGB_VALIDATION_FRACTION = 0.2
+XGB_EARLY_STOPPING_ROUNDS = 20
+# Consecutive duplicate draws after which a search space counts as exhausted
+MAX_STALE_DRAWS = 5000
+
+
+def _log_uniform(rng, low, high):
+    return float(np.exp(rng.uniform(np.log(low), np.log(high))))
+
+
+# model -> sampler of one configuration (merged over MODEL_PARAMS)
+SEARCH_SPACES = {
+    'ridge': lambda rng: {'alpha': _log_uniform(rng, 1e-3, 1e3)},
+    'rf': lambda rng: {
+        'n_estimators': int(rng.choice([50, 100, 200, 400])),
+        'max_depth': [None, 4, 6, 8, 12, 16][rng.integers(6)],
+        'min_samples_leaf': int(rng.choice([1, 2, 4, 8])),
+        'max_features': [1.0, 0.5, 'sqrt'][rng.integers(3)],
+    },
+    'xgb': lambda rng: {
+        'n_estimators': 1000,  # upper bound; early stopping picks the real count
+        'learning_rate': _log_uniform(rng, 0.01, 0.3),
+        'max_depth': int(rng.integers(2, 9)),
+        'min_child_weight': float(rng.choice([1, 2, 5, 10])),
+        'subsample': float(rng.uniform(0.6, 1.0)),
+        'colsample_bytree': float(rng.uniform(0.6, 1.0)),
+    },
+}
+
+
+def config_id(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def sample_configs(model_name, n_configs, seed):
+    # Deterministic for a given seed, so resumed searches see the same configs. The
+    # current defaults are always a candidate, so tuning never ends up worse than them.
+    # A discrete space (rf has about 289 configs) may hold fewer than n_configs; the
+    # search stops once MAX_STALE_DRAWS draws in a row found nothing new.
+    rng = np.random.default_rng([seed, list(MODEL_PARAMS).index(model_name)])
+    configs = {config_id(MODEL_PARAMS[model_name]): dict(MODEL_PARAMS[model_name])}
+    stale = 0
+    while len(configs) < n_configs and stale < MAX_STALE_DRAWS:
+        params = {**MODEL_PARAMS[model_name], **SEARCH_SPACES[model_name](rng)}
+        cid = config_id(params)
+        stale = stale + 1 if cid in configs else 0
+        configs[cid] = params
+    if len(configs) < n_configs:
+        print(f"{model_name}: search space exhausted at {len(configs)} configs")
+    return configs
+
+
+def rung_folds(n_splits, eta, n_rungs):
+    # Number of (most recent) folds each rung is scored on: 1, eta, eta^2, ... capped;
+    # rungs that would repeat the same budget are merged
+    return list(dict.fromkeys([min(n_splits, eta ** r) for r in range(n_rungs - 1)] + [n_splits]))
+
+
+def _trial(x_path, y_path, train_idx, test_idx, model_name, params):
+    # Runs in a worker: fit on the fold's training window, score on its test block
+    X = np.load(x_path, mmap_mode="r")
+    y = np.load(y_path, mmap_mode="r")
+    if model_name == 'xgb':
+        n_val = max(1, int(len(train_idx) * XGB_VALIDATION_FRACTION))
+        fit_idx, val_idx = train_idx[:-n_val], train_idx[-n_val:]
+        model = make_model(model_name, {**params, 'early_stopping_rounds': XGB_EARLY_STOPPING_ROUNDS})
+        model.fit(X[fit_idx], y[fit_idx], eval_set=[(X[val_idx], y[val_idx])], verbose=False)
+        best_iteration = int(model.best_iteration) + 1
+    else:
+        model = make_model(model_name, params).fit(X[train_idx], y[train_idx])
+        best_iteration = None
+    mae, rmse = evaluate_model(y[test_idx], model.predict(X[test_idx]))
+    return {"mae": float(mae), "rmse": float(rmse), "best_iteration": best_iteration}
+
+
+def log_path(city, target):
+    return os.path.join(TUNING_DIR, f"{city}_{target.replace('_next', '')}.jsonl")
+
+
+def load_trials(city, target, data_key, n_splits):
+    # {(model, config_id, fold): trial record} of the trials scored on the same
+    # matrix and folds; older records are stale and skipped
+    trials = {}
+    path = log_path(city, target)
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get("data_key") != data_key or record.get("n_splits") != n_splits:
+                        continue
+                    trials[(record["model"], record["config_id"], record["fold"])] = record
+    return trials
+
+
+def append_trials(city, target, records):
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    with open(log_path(city, target), "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def save_best_params(best):
+    # Merge {city: {target: {model: params}}} into best_params.json atomically
+    current = load_tuned_params()
+    for city, per_target in best.items():
+        for target, per_model in per_target.items():
+            current.setdefault(city, {}).setdefault(target, {}).update(per_model)
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    tmp = f"{TUNED_PARAMS_FILE}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(current, f, indent=2)
+    os.replace(tmp, TUNED_PARAMS_FILE)
+
+
+def tune(cities, targets=TARGETS, models=tuple(MODEL_PARAMS), n_configs=27, eta=3,
+         n_splits=N_SPLITS, seed=42, max_workers=None, threads_per_job=None):
+    # Returns {city: {target: {model: {"params", "mae"}}}} and saves the winners
+    n_rungs = max(1, math.floor(math.log(n_configs, eta)) + 1)
+    budgets = rung_folds(n_splits, eta, n_rungs)
+    configs = {name: sample_configs(name, n_configs, seed) for name in models}
+    print(f"Successive halving: {n_configs} configs per model, eta={eta}, folds per rung {budgets}")
+
+    matrices = {city: build_matrix(city, targets) for city in cities}
+    folds = {city: time_series_folds(m["n_rows"], n_splits) for city, m in matrices.items()}
+    trials = {(city, target): load_trials(city, target, matrices[city]["key"], n_splits)
+              for city in cities for target in targets}
+    alive = {(city, target, name): list(configs[name]) for city in cities
+             for target in targets for name in models}
+
+    for rung, n_folds in enumerate(budgets):
+        # Jobs for every surviving config on the rung's folds, minus logged trials
+        jobs = []
+        for (city, target, name), ids in alive.items():
+            for fold in range(n_splits - n_folds, n_splits):
+                for cid in ids:
+                    if (name, cid, fold) in trials[(city, target)]:
+                        continue
+                    train_idx, test_idx = folds[city][fold]
+                    jobs.append(((city, target, name, cid, fold),
+                                 (matrices[city]["paths"]["X"], matrices[city]["paths"][target],
+                                  train_idx, test_idx, name, configs[name][cid])))
+        print(f"\nRung {rung}: {sum(len(ids) for ids in alive.values())} configs on "
+              f"{n_folds} fold(s), {len(jobs)} new trials")
+        outputs = run_jobs(_trial, jobs, max_workers, threads_per_job)
+
+        new_records = {}
+        for (city, target, name, cid, fold), result in outputs.items():
+            record = {"model": name, "config_id": cid, "fold": fold, "data_key": matrices[city]["key"],
+                      "n_splits": n_splits, "params": configs[name][cid], **result}
+            trials[(city, target)][(name, cid, fold)] = record
+            new_records.setdefault((city, target), []).append(record)
+        for (city, target), records in new_records.items():
+            append_trials(city, target, records)
+
+        # Keep the best 1/eta of each (city, target, model) by mean MAE on this rung's folds
+        for key, ids in alive.items():
+            city, target, name = key
+            score = {cid: np.mean([trials[(city, target)][(name, cid, f)]["mae"]
+                                   for f in range(n_splits - n_folds, n_splits)]) for cid in ids}
+            keep = max(1, len(ids) // eta) if rung < len(budgets) - 1 else 1
+            alive[key] = sorted(ids, key=score.get)[:keep]
+
+    best = {}
+    for (city, target, name), (cid,) in alive.items():
+        records = [trials[(city, target)][(name, cid, f)] for f in range(n_splits)]
+        params = dict(configs[name][cid])
+        if name == 'xgb':
+            params['n_estimators'] = int(np.mean([r["best_iteration"] for r in records]))
+        best.setdefault(city, {}).setdefault(target, {})[name] = {
+            "params": params, "mae": float(np.mean([r["mae"] for r in records]))}
+
+    save_best_params({city: {target: {name: b["params"] for name, b in per_model.items()}
+                             for target, per_model in per_target.items()}
+                      for city, per_target in best.items()})
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving search over the ensemble members.")
+    parser.add_argument("--cities", nargs="+", default=CITIES)
+    parser.add_argument("--targets", nargs="+", default=TARGETS)
+    parser.add_argument("--models", nargs="+", default=list(MODEL_PARAMS))
+    parser.add_argument("--configs", type=int, default=27, help="Configurations sampled per model")
+    parser.add_argument("--eta", type=int, default=3, help="Keep the best 1/eta at every rung")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-workers", type=int, default=None, help="Worker processes (default: MAX_WORKERS)")
+    args = parser.parse_args()
+
+    best = tune(args.cities, args.targets, args.models, args.configs, args.eta, seed=args.seed,
+                max_workers=args.max_workers)
+    print(f"\nSaved best parameters to {TUNED_PARAMS_FILE}")
+    for city, per_target in best.items():
+        for target, per_model in per_target.items():
+            for name, b in per_model.items():
+                print(f"{city}/{target}/{name}: MAE {b['mae']:.2f} {b['params']}")
@@ -0,0 +1,257 @@
+# Declarative data-quality validation
+# Every check is one entry of a rule set, {name: {"kind": ..., "severity": ..., ...}}:
+#
+#   continuity  {"freq"}                   timestamps missing at the native frequency
+#                                          (freq None: the median spacing of the index)
+#   duplicates  {}                         repeated timestamps
+#   missing     {"columns"}                NaN values
+#   range       {"bounds": {col: [lo, hi]}} values outside [lo, hi]
+#   outliers    {"method", "k", "columns"} iqr: outside Q1 - k IQR .. Q3 + k IQR;
+#                                          mad: |x - median| > k * 1.4826 MAD
+#   stale       {"min_run", "columns"}     the same value repeated for min_run (a
+#                                          duration, at least 2 rows) or longer
+#   dst         {"tz", "local"}            local days whose row count doesn't match the
+#                                          day length in tz (23 / 24 / 25 hours);
+#                                          local: the index is local time, not UTC
+#
+# validate(df) evaluates all rules in one pass: the numeric columns are converted
+# to a single float matrix once, and quantiles, medians, run lengths and counts are
+# computed for all columns of a rule together. The result is a JSON-serialisable
+# report; "passed" is False when any "error" rule fails ("warn" rules only report).
+# `columns` None means every numeric column.
+#
+#   python validation.py [--dataset processed] [--cities oslo] [--fail-on-error]
+#       -> data/validation/{dataset}.json, exit status 1 on errors with --fail-on-error
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import storage
+from config import CITIES, DATA_DIR, SOURCE_TZ
+
+VALIDATION_DIR = os.path.join(DATA_DIR, "validation")
+MAX_EXAMPLES = 10
+
+# Rules for the processed tables
+VALIDATION_RULES = {
+    "continuity": {"kind": "continuity", "severity": "warn", "freq": None},
+    "duplicates": {"kind": "duplicates", "severity": "error"},
+    "missing": {"kind": "missing", "severity": "warn", "columns": None},
+    "range": {"kind": "range", "severity": "error", "bounds": {
+        "Actual Load": [0, 1e6], "Price": [-500, 4000], "temp_C": [-60, 50],
+        "humidity": [0, 100], "cloudcover": [0, 100], "windspeed": [0, 80]}},
+    "outliers_iqr": {"kind": "outliers", "severity": "warn", "method": "iqr", "k": 1.5,
+                     "columns": ["Actual Load", "Price", "temp_C"]},
+    "outliers_mad": {"kind": "outliers", "severity": "warn", "method": "mad", "k": 3.5,
+                     "columns": ["Actual Load", "Price", "temp_C"]},
+    "stale": {"kind": "stale", "severity": "warn", "min_run": "6h", "columns": ["Actual Load", "Price"]},
+    "dst": {"kind": "dst", "severity": "error", "tz": SOURCE_TZ, "local": False},
+}
+
+# Raw series are stored in local market time
+RAW_RULES = {**{name: rule for name, rule in VALIDATION_RULES.items() if name != "range"},
+             "dst": {"kind": "dst", "severity": "warn", "tz": SOURCE_TZ, "local": True}}
+DATASET_RULES = {"processed": VALIDATION_RULES, "demand": RAW_RULES, "price": RAW_RULES}
+
+
+class ValidationError(ValueError):
+    # An error-severity rule failed; the pipeline stops the zone without writing it
+    pass
+
+
+def _examples(index, mask):
+    return [str(ts) for ts in index[mask][:MAX_EXAMPLES]]
+
+
+def _column_counts(columns, counts):
+    return {col: int(n) for col, n in zip(columns, counts) if n}
+
+
+class _Table:
+    # What the rules share: the sorted index, its spacing and one float matrix
+    def __init__(self, df):
+        df = df.sort_index(kind="stable")
+        self.index = df.index
+        numeric = df.select_dtypes("number")
+        self.columns = list(numeric.columns)
+        self.values = numeric.to_numpy(dtype=np.float64)
+        spacing = np.diff(self.index.asi8)
+        self.step = pd.Timedelta(int(np.median(spacing[spacing > 0]))) if (spacing > 0).any() else None
+
+    def select(self, columns):
+        cols = self.columns if columns is None else [c for c in columns if c in self.columns]
+        return cols, self.values[:, [self.columns.index(c) for c in cols]]
+
+
+def _continuity(t, rule):
+    step = pd.to_timedelta(pd.tseries.frequencies.to_offset(rule["freq"])) if rule.get("freq") else t.step
+    if step is None:
+        return 0, {}
+    unique = np.unique(t.index.asi8)
+    gaps = np.diff(unique) // step.value - 1
+    at = gaps > 0
+    starts = pd.DatetimeIndex(unique[:-1][at] + step.value)
+    details = {"freq": str(step), "missing_steps": int(gaps[at].sum()), "gaps": int(at.sum()),
+               "largest_gap_steps": int(gaps.max(initial=0)), "first_gaps": [str(ts) for ts in starts[:MAX_EXAMPLES]]}
+    return int(gaps[at].sum()), details
+
+
+def _duplicates(t, rule):
+    dup = t.index.duplicated()
+    return int(dup.sum()), {"examples": _examples(t.index, dup)}
+
+
+def _missing(t, rule):
+    cols, values = t.select(rule.get("columns"))
+    counts = np.isnan(values).sum(axis=0)
+    return int(counts.sum()), {"by_column": _column_counts(cols, counts)}
+
+
+def _range(t, rule):
+    cols, values = t.select(list(rule["bounds"]))
+    bounds = np.array([rule["bounds"][c] for c in cols], dtype=np.float64).reshape(-1, 2)
+    with np.errstate(invalid="ignore"):
+        bad = (values < bounds[:, 0]) | (values > bounds[:, 1])
+    counts = bad.sum(axis=0)
+    return int(counts.sum()), {"by_column": _column_counts(cols, counts),
+                               "examples": _examples(t.index, bad.any(axis=1))}
+
+
+def _outliers(t, rule):
+    cols, values = t.select(rule.get("columns"))
+    if not len(values):
+        return 0, {}
+    k = rule["k"]
+    with np.errstate(invalid="ignore"):
+        if rule["method"] == "iqr":
+            q1, q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+            lo, hi = q1 - k * (q3 - q1), q3 + k * (q3 - q1)
+        elif rule["method"] == "mad":
+            median = np.nanmedian(values, axis=0)
+            spread = k * 1.4826 * np.nanmedian(np.abs(values - median), axis=0)
+            lo, hi = median - spread, median + spread
+        else:
+            raise ValueError(f"Unknown outlier method: {rule['method']}")
+        bad = (values < lo) | (values > hi)
+    counts = bad.sum(axis=0)
+    bounds = {c: [float(a), float(b)] for c, a, b in zip(cols, lo, hi)}
+    return int(counts.sum()), {"by_column": _column_counts(cols, counts), "bounds": bounds}
+
+
+def _stale(t, rule):
+    cols, values = t.select(rule.get("columns"))
+    if len(values) < 2 or t.step is None:
+        return 0, {}
+    min_run = max(2, int(np.ceil(pd.Timedelta(rule["min_run"]) / t.step)))
+    # Rows since the value last changed, for every column at once
+    rows = np.arange(len(values))[:, None]
+    changed = np.vstack([np.ones((1, values.shape[1]), bool), values[1:] != values[:-1]])
+    run = rows - np.maximum.accumulate(np.where(changed, rows, 0), axis=0) + 1
+    runs = (run == min_run).sum(axis=0)  # each stale run reaches min_run exactly once
+    longest = run.max(axis=0)
+    return int(runs.sum()), {"min_run_rows": min_run, "runs_by_column": _column_counts(cols, runs),
+                             "longest_run_rows": {c: int(n) for c, n in zip(cols, longest) if n >= min_run}}
+
+
+def _dst(t, rule):
+    if t.step is None or t.step >= pd.Timedelta(days=1) or not len(t.index):
+        return 0, {"skipped": "daily or coarser data"}
+    index = t.index
+    if index.tz is not None:
+        index = index.tz_convert(rule["tz"]).tz_localize(None)
+    elif not rule.get("local"):
+        index = index.tz_localize("UTC").tz_convert(rule["tz"]).tz_localize(None)
+    days, counts = np.unique(index.normalize().asi8, return_counts=True)
+    days = pd.DatetimeIndex(days)
+    # Day length in local time, e.g. 23 h on the spring-forward day
+    start = days.tz_localize(rule["tz"], nonexistent="shift_forward")
+    end = (days + pd.Timedelta(days=1)).tz_localize(rule["tz"], nonexistent="shift_forward")
+    expected = (end - start) // t.step
+    bad = counts != expected
+    bad[[0, -1]] = False  # first and last day may be partial
+    details = {"days": [{"day": str(d.date()), "rows": int(c), "expected": int(e)}
+                        for d, c, e in zip(days[bad][:MAX_EXAMPLES], counts[bad], expected[bad])]}
+    return int(bad.sum()), details
+
+
+CHECKS = {"continuity": _continuity, "duplicates": _duplicates, "missing": _missing, "range": _range,
+          "outliers": _outliers, "stale": _stale, "dst": _dst}
+
+
+def validate(df, rules=VALIDATION_RULES):
+    # Report for one frame: {"rows", "start", "end", "passed", "checks": {name: {...}}}
+    t = _Table(df)
+    checks = {}
+    for name, rule in rules.items():
+        if rule["kind"] not in CHECKS:
+            raise ValueError(f"Unknown check kind: {rule['kind']}")
+        failures, details = CHECKS[rule["kind"]](t, rule)
+        checks[name] = {"kind": rule["kind"], "severity": rule["severity"], "passed": failures == 0,
+                        "failures": failures, **details}
+    return {
+        "rows": len(t.index),
+        "start": str(t.index.min()) if len(t.index) else None,
+        "end": str(t.index.max()) if len(t.index) else None,
+        "passed": all(c["passed"] for c in checks.values() if c["severity"] == "error"),
+        "checks": checks,
+    }
+
+
+def errors(report):
+    return [name for name, check in report["checks"].items() if check["severity"] == "error" and not check["passed"]]
+
+
+def summary(report):
+    # One line per failed check
+    lines = []
+    for name, check in report["checks"].items():
+        if not check["passed"]:
+            lines.append(f"  [{check['severity']}] {name}: {check['failures']}")
+    return "\n".join(lines) or "  all checks passed"
+
+
+def save_report(dataset, reports, validation_dir=VALIDATION_DIR):
+    # Merge {zone: report} into data/validation/{dataset}.json
+    path = os.path.join(validation_dir, f"{dataset}.json")
+    current = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            current = json.load(f)
+    current.update(reports)
+    os.makedirs(validation_dir, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(current, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+    return path
+
+
+def validate_zones(dataset, cities=CITIES, rules=None):
+    # {zone: report} for every stored zone of the dataset
+    rules = rules or DATASET_RULES.get(dataset, VALIDATION_RULES)
+    reports = {}
+    for city in cities:
+        if not storage.exists(dataset, city):
+            print(f"No stored data: {dataset}/{city}")
+            continue
+        reports[city] = validate(storage.read_frame(dataset, city), rules)
+        status = "passed" if reports[city]["passed"] else "FAILED"
+        print(f"{dataset}/{city}: {reports[city]['rows']} rows, {status}\n{summary(reports[city])}")
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate stored datasets and write a JSON report.")
+    parser.add_argument("--dataset", default="processed")
+    parser.add_argument("--cities", nargs="+", default=CITIES)
+    parser.add_argument("--fail-on-error", action="store_true", help="Exit with status 1 if an error rule fails")
+    args = parser.parse_args()
+
+    reports = validate_zones(args.dataset, args.cities)
+    print(f"Report: {save_report(args.dataset, reports)}")
+    if args.fail_on_error and not all(r["passed"] for r in reports.values()):
+        sys.exit(1)
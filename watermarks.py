@@ -0,0 +1,54 @@
+# Persisted high-water marks for incremental ingestion
+# One entry per (zone, series), holding the latest timestamp already stored.
+# Stored as JSON so it survives between scheduled runs.
+import json
+import os
+import threading
+
+import pandas as pd
+
+_lock = threading.Lock()
+
+
+def _key(zone, series):
+    return f"{zone}/{series}"
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_watermark(path, zone, series):
+    with _lock:
+        value = _load(path).get(_key(zone, series))
+    return pd.Timestamp(value) if value else None
+
+
+def advance_watermark(path, zone, series, ts):
+    # Never moves backwards; written atomically so a crash can't corrupt the file
+    ts = pd.Timestamp(ts).tz_convert("UTC")
+    with _lock:
+        marks = _load(path)
+        current = marks.get(_key(zone, series))
+        if current is not None and pd.Timestamp(current) >= ts:
+            return
+        marks[_key(zone, series)] = ts.isoformat()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(marks, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+
+
+def fetch_window(path, zone, series, end, overlap_hours, backfill_days):
+    # Start from the watermark minus a small overlap (to pick up revisions),
+    # or backfill_days before end when nothing is stored yet
+    end = pd.Timestamp(end)
+    mark = get_watermark(path, zone, series)
+    if mark is None:
+        return end - pd.Timedelta(days=backfill_days), end, None
+    start = mark.tz_convert(end.tz) - pd.Timedelta(hours=overlap_hours)
+    return start, end, mark
@@ -0,0 +1,252 @@
+# Async weather collector (OpenWeatherMap)
+# Replaces the one blocking requests.get per city of 1_weather_prefect.py. Every
+# observation of a run is requested concurrently over one pooled aiohttp session,
+# with at most WEATHER_MAX_CONCURRENCY requests in flight, so runtime grows with
+# locations / concurrency rather than with the number of locations. 429 and 5xx
+# responses are retried with exponential backoff; a 429's Retry-After pauses every
+# request of the run, not just the one that hit the limit.
+#
+# Two modes:
+#   current   one observation per location, stored under today's date
+#   backfill  one historical observation (noon UTC) for every day of the last N
+#             that is missing from weather/{city}, all requested in one batch
+#
+# Responses are cached on disk keyed by (lat, lon, timestamp):
+#
+#   data/weather_cache/{lat}_{lon}/{YYYYmmddTHHMM}.json
+#
+# Current weather is keyed by the hour, so repeated runs (and backfills over days
+# already fetched) don't call the API again.
+#
+#   python weather_collector.py                      # current weather, all locations
+#   python weather_collector.py --backfill-days 30
+#   WEATHER_API_URL=http://127.0.0.1:8081 python weather_collector.py   # fake_weather.py
+import argparse
+import asyncio
+import json
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+import pandas as pd
+from dotenv import load_dotenv
+
+import storage
+from config import (WEATHER_API_URL, WEATHER_CACHE_DIR, WEATHER_LOCATIONS, WEATHER_MAX_CONCURRENCY,
+                    WEATHER_RETRIES, WEATHER_RETRY_BACKOFF, WEATHER_TIMEOUT)
+
+load_dotenv(dotenv_path=".env")
+
+CURRENT_PATH = "/data/2.5/weather"
+HISTORY_PATH = "/data/3.0/onecall/timemachine"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+HISTORY_HOUR = pd.Timedelta(hours=12)
+
+
+def current_hour():
+    return pd.Timestamp.now(tz="UTC").tz_localize(None).floor("h")
+
+
+def _retry_after_seconds(value):
+    # Retry-After as delay-seconds or an HTTP date; None if it is neither
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def cache_path(lat, lon, ts, cache_dir=WEATHER_CACHE_DIR):
+    return os.path.join(cache_dir, f"{lat:.4f}_{lon:.4f}", f"{pd.Timestamp(ts):%Y%m%dT%H%M}.json")
+
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_cache(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def parse_observation(data, lat, lon):
+    # One row of the weather dataset from a current-weather or timemachine response
+    if "data" in data:
+        obs = data["data"][0]
+        temp, humidity, pressure = obs.get("temp"), obs.get("humidity"), obs.get("pressure")
+        windspeed, cloudcover, conditions = obs.get("wind_speed"), obs.get("clouds"), obs.get("weather")
+    else:
+        main = data["main"]
+        temp, humidity, pressure = main.get("temp"), main.get("humidity"), main.get("pressure")
+        windspeed, cloudcover = data.get("wind", {}).get("speed"), data.get("clouds", {}).get("all")
+        conditions = data.get("weather")
+    return {
+        "name": f"{lat},{lon}",
+        "temp": round(temp - 273.15, 1) if temp is not None else None,  # Kelvin to °C
+        "humidity": humidity,
+        "pressure": pressure,
+        "description": (conditions or [{}])[0].get("description", ""),
+        "windspeed": windspeed,
+        "cloudcover": cloudcover,
+    }
+
+
+class WeatherCollector:
+    # Pooled session + concurrency limit + retry policy + response cache
+    #
+    #   async with WeatherCollector() as collector:
+    #       row = await collector.observe(59.91, 10.75)                      # now
+    #       row = await collector.observe(59.91, 10.75, pd.Timestamp(...))   # history
+    def __init__(self, api_url=WEATHER_API_URL, api_key=None, max_concurrency=WEATHER_MAX_CONCURRENCY,
+                 retries=WEATHER_RETRIES, backoff=WEATHER_RETRY_BACKOFF, timeout=WEATHER_TIMEOUT,
+                 cache_dir=WEATHER_CACHE_DIR):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.api_url = api_url.rstrip("/")
+        self.api_key = api_key if api_key is not None else os.getenv("OWM_API_KEY", "")
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.calls = 0
+        self.cache_hits = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self.resume_at = 0.0  # loop time before which no request is sent (rate limited)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def _wait_for_rate_limit(self):
+        loop = asyncio.get_running_loop()
+        while loop.time() < self.resume_at:
+            await asyncio.sleep(self.resume_at - loop.time())
+
+    async def _get_json(self, path, params):
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            await self._wait_for_rate_limit()
+            async with self.slots:
+                self.calls += 1
+                try:
+                    async with self.session.get(self.api_url + path, params=params) as resp:
+                        if resp.status not in RETRY_STATUS:
+                            resp.raise_for_status()  # other 4xx: retrying won't help
+                            return await resp.json()
+                        retry_after = resp.headers.get("Retry-After")
+                        error = aiohttp.ClientResponseError(resp.request_info, resp.history,
+                                                            status=resp.status, message=resp.reason)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error = e
+            if attempt == self.retries:
+                raise error
+            delay = _retry_after_seconds(retry_after) if retry_after is not None else None
+            if delay is not None:
+                loop = asyncio.get_running_loop()
+                self.resume_at = max(self.resume_at, loop.time() + delay)
+            else:
+                delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+            await asyncio.sleep(delay)
+
+    async def fetch(self, path, lat, lon, ts, **params):
+        # Raw JSON response for (lat, lon) at ts, from the cache when possible
+        cached = cache_path(lat, lon, ts, self.cache_dir)
+        data = _read_cache(cached)
+        if data is not None:
+            self.cache_hits += 1
+            return data
+        data = await self._get_json(path, {"lat": lat, "lon": lon, "appid": self.api_key, **params})
+        _write_cache(cached, data)
+        return data
+
+    async def observe(self, lat, lon, ts=None):
+        # Row for (lat, lon) at ts (None: current weather, cached by the hour)
+        if ts is None:
+            data = await self.fetch(CURRENT_PATH, lat, lon, current_hour())
+        else:
+            data = await self.fetch(HISTORY_PATH, lat, lon, ts, dt=int(pd.Timestamp(ts).timestamp()))
+        return parse_observation(data, lat, lon)
+
+
+def missing_days(city, backfill_days, today=None):
+    # Days of the last backfill_days (before today) without a stored observation
+    today = today if today is not None else pd.Timestamp.now(tz="UTC").tz_localize(None).normalize()
+    wanted = pd.date_range(today - pd.Timedelta(days=backfill_days), periods=backfill_days, freq="D")
+    if not storage.exists("weather", city):
+        return wanted
+    stored = storage.read_frame("weather", city, columns=["temp"], start=wanted[0], end=today).index
+    return wanted.difference(stored.normalize())
+
+
+def plan_requests(locations=WEATHER_LOCATIONS, backfill_days=0):
+    # [(city, lat, lon, ts)]: ts None for current weather, noon UTC of each missing day otherwise
+    if not backfill_days:
+        return [(city, lat, lon, None) for city, (lat, lon) in locations.items()]
+    return [(city, lat, lon, day + HISTORY_HOUR)
+            for city, (lat, lon) in locations.items()
+            for day in missing_days(city, backfill_days)]
+
+
+async def collect(requests, **collector_args):
+    # Runs every request concurrently; returns ({city: DataFrame}, {city: [errors]}).
+    # A location that still fails after its retries does not stop the others.
+    async with WeatherCollector(**collector_args) as collector:
+        results = await asyncio.gather(*(collector.observe(lat, lon, ts) for _, lat, lon, ts in requests),
+                                       return_exceptions=True)
+    today = pd.Timestamp.now(tz="UTC").tz_localize(None).normalize()
+    rows, errors = {}, {}
+    for (city, _, _, ts), result in zip(requests, results):
+        if isinstance(result, Exception):
+            errors.setdefault(city, []).append(result)
+            continue
+        day = today if ts is None else pd.Timestamp(ts).normalize()
+        rows.setdefault(city, []).append({"datetime": day, **result})
+    frames = {city: pd.DataFrame(r).set_index("datetime").sort_index() for city, r in rows.items()}
+    print(f"{len(requests)} observation(s): {collector.calls} API call(s), {collector.cache_hits} from cache")
+    return frames, errors
+
+
+def run(locations=WEATHER_LOCATIONS, backfill_days=0, **collector_args):
+    # Fetch and append to the weather log (one segment per city; re-runs on the same
+    # day are resolved last-writer-wins by compaction). Returns {city: DataFrame}.
+    frames, errors = asyncio.run(collect(plan_requests(locations, backfill_days), **collector_args))
+    for city, df in frames.items():
+        storage.append("weather", city, df)
+        print(f"✅ {len(df)} row(s) appended to weather/{city.lower()}")
+    for city, errs in errors.items():
+        print(f"Failed for {city}: {len(errs)} request(s), e.g. {errs[0]!r}")
+    return frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect weather for every configured location.")
+    parser.add_argument("--backfill-days", type=int, default=0,
+                        help="Fill missing days of the last N days instead of fetching current weather")
+    parser.add_argument("--cities", nargs="+", default=list(WEATHER_LOCATIONS))
+    parser.add_argument("--max-concurrency", type=int, default=WEATHER_MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    wanted = {city.lower() for city in args.cities}
+    run({city: loc for city, loc in WEATHER_LOCATIONS.items() if city.lower() in wanted}, args.backfill_days,
+        max_concurrency=args.max_concurrency)
@@ -0,0 +1,161 @@
+# Weather forecasts as future covariates
+# The recursive forecaster used to hold temp_C / humidity at their last observed
+# value over the whole forecast. Instead, every run of
+#
+#   python weather_forecast.py            # (or the weather_forecast_flow)
+#
+# stores one vintage per location: the daily forecast issued now, as one wide row
+#
+#   weather_forecast/{city}: index = issued (UTC), columns temp_C_d0 .. temp_C_d7, ...
+#
+# where _dN is the day N days after the issue date. Rows are appended through the
+# store's log like the other raw datasets, fetched with weather_collector (one async
+# batch for all locations, response cache).
+#
+# align() joins each forecast origin to the latest vintage that was available at
+# that origin (pd.merge_asof on the issue time) and gathers the values for
+# origin + 1 .. origin + horizon days in one vectorised take. The recursive
+# backtest (backtest.run_recursive_backtest) feeds every origin the vintage of its
+# time, so it only ever sees forecasts that existed then (leak-free). Origins
+# without a vintage can fall back to the last observed value (persistence), which
+# is what the forecaster did before.
+import argparse
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+
+import storage
+from config import WEATHER_CACHE_DIR, WEATHER_LOCATIONS
+from features import STEP
+from weather_collector import WeatherCollector, current_hour
+
+DATASET = "weather_forecast"
+FORECAST_PATH = "/data/3.0/onecall"
+FORECAST_DAYS = 8  # days per vintage the API returns, issue day included
+# Covariate -> field of a daily forecast entry
+VARIABLES = {"temp_C": "temp", "humidity": "humidity", "pressure": "pressure",
+             "windspeed": "wind_speed", "cloudcover": "clouds"}
+
+
+def lead_columns(var, n_days=FORECAST_DAYS):
+    return [f"{var}_d{lead}" for lead in range(n_days)]
+
+
+def parse_vintage(data, issued):
+    # One wide row from a One Call response: each variable by days after the issue date
+    row = {}
+    for entry in data.get("daily", [])[:FORECAST_DAYS]:
+        lead = (pd.Timestamp(entry["dt"], unit="s").normalize() - issued.normalize()).days
+        if not 0 <= lead < FORECAST_DAYS:
+            continue
+        for var, field in VARIABLES.items():
+            value = entry.get(field)
+            if field == "temp":
+                value = round(value["day"] - 273.15, 1) if value else None  # Kelvin to °C
+            row[f"{var}_d{lead}"] = value
+    columns = [col for var in VARIABLES for col in lead_columns(var)]
+    return pd.DataFrame([row], index=pd.DatetimeIndex([issued], name=storage.INDEX_COL),
+                        columns=columns, dtype=np.float64)
+
+
+async def fetch_vintages(locations, **collector_args):
+    # {city: one-row DataFrame} for the current hour's vintage of every location
+    issued = current_hour()
+    collector_args.setdefault("cache_dir", os.path.join(WEATHER_CACHE_DIR, "forecast"))
+    async with WeatherCollector(**collector_args) as collector:
+        results = await asyncio.gather(
+            *(collector.fetch(FORECAST_PATH, lat, lon, issued, exclude="current,minutely,hourly,alerts")
+              for lat, lon in locations.values()),
+            return_exceptions=True)
+    vintages = {}
+    for city, result in zip(locations, results):
+        if isinstance(result, Exception):
+            print(f"Failed for {city}: {result!r}")
+        else:
+            vintages[city] = parse_vintage(result, issued)
+    return vintages
+
+
+def ingest(locations=WEATHER_LOCATIONS, **collector_args):
+    vintages = asyncio.run(fetch_vintages(locations, **collector_args))
+    for city, row in vintages.items():
+        storage.append(DATASET, city, row)
+        print(f"✅ Vintage {row.index[0]} appended to {DATASET}/{city.lower()}")
+    return vintages
+
+
+def load_vintages(city, start=None, end=None):
+    # Stored vintages of a city issued in [start, end), oldest first (empty if none)
+    if not storage.exists(DATASET, city):
+        return pd.DataFrame(index=pd.DatetimeIndex([], name=storage.INDEX_COL))
+    return storage.read_frame(DATASET, city, start=start, end=end).sort_index()
+
+
+def align(origins, vintages, horizon, variables=tuple(VARIABLES), step=STEP, observed=None):
+    # Future covariates per origin: {var}_fc1 .. {var}_fc{horizon} are the forecasts
+    # for the 1st .. horizon-th day after the origin's date, from the latest vintage
+    # issued before the origin row was complete (origin + step). Leads the vintage
+    # doesn't cover are NaN, or, with `observed` (daily weather indexed by date), the
+    # last value observed by then.
+    origins = pd.DatetimeIndex(origins)
+    order = np.argsort(origins.asi8, kind="stable")
+    available = pd.DataFrame({"at": origins[order] + step})
+    issued = pd.DataFrame({"issued": vintages.index, "row": np.arange(len(vintages))})
+    matched = pd.merge_asof(available, issued, left_on="at", right_on="issued",
+                            allow_exact_matches=False, direction="backward")
+    rows = np.empty(len(origins))
+    rows[order] = matched["row"].to_numpy(dtype=np.float64)
+
+    has_vintage = ~np.isnan(rows)
+    rows = np.where(has_vintage, rows, 0).astype(np.int64)
+    offset = np.zeros(len(origins), dtype=np.int64)
+    if len(vintages):
+        issue_days = vintages.index.normalize()[rows]
+        offset = ((origins.normalize() - issue_days) // pd.Timedelta(days=1)).to_numpy()
+    leads = offset[:, None] + np.arange(1, horizon + 1)[None, :]
+    usable = has_vintage[:, None] & (leads < FORECAST_DAYS)
+
+    out = {}
+    for var in variables:
+        columns = [f"{var}_fc{h}" for h in range(1, horizon + 1)]
+        values = np.full((len(origins), horizon), np.nan)
+        cols = lead_columns(var)
+        if len(vintages) and all(col in vintages.columns for col in cols):
+            table = vintages[cols].to_numpy(dtype=np.float64)
+            picked = table[rows[:, None], np.clip(leads, 0, FORECAST_DAYS - 1)]
+            values = np.where(usable, picked, np.nan)
+        if observed is not None and var in observed.columns:
+            # Persistence: the latest daily observation complete by the origin
+            last = observed[var].dropna()
+            pos = np.searchsorted(last.index.asi8, (origins + step).asi8, side="left") - 1
+            held = np.where(pos >= 0, last.to_numpy(dtype=np.float64)[np.clip(pos, 0, None)], np.nan)
+            values = np.where(np.isnan(values), held[:, None], values)
+        out.update(dict(zip(columns, values.T)))
+    return pd.DataFrame(out, index=origins)
+
+
+def future_covariates(city, origin, n_days, variables=tuple(VARIABLES)):
+    # {var} by date for the n_days after origin, from the vintage available at origin;
+    # NaN where no forecast covers the day (the forecaster then holds the last value)
+    origin = pd.Timestamp(origin)
+    vintages = load_vintages(city, start=origin - pd.Timedelta(days=FORECAST_DAYS), end=origin + STEP)
+    wide = align([origin], vintages, n_days, variables)
+    return covariate_days(wide.iloc[0], origin, n_days, variables)
+
+
+def covariate_days(row, origin, n_days, variables=tuple(VARIABLES)):
+    # One origin's row of align() as {var} by date for the n_days after the origin
+    dates = pd.date_range(pd.Timestamp(origin).normalize() + pd.Timedelta(days=1), periods=n_days, freq="D")
+    return pd.DataFrame({var: row[[f"{var}_fc{h}" for h in range(1, n_days + 1)]].to_numpy(dtype=np.float64)
+                         for var in variables}, index=dates)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store the current weather forecast of every location.")
+    parser.add_argument("--cities", nargs="+", default=list(WEATHER_LOCATIONS))
+    args = parser.parse_args()
+
+    wanted = {city.lower() for city in args.cities}
+    ingest({city: loc for city, loc in WEATHER_LOCATIONS.items() if city.lower() in wanted})